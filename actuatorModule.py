@@ -0,0 +1,237 @@
+"""This module's purpose is to move the turret's servos on their own
+thread, so that the program commanding them never has to sleep while
+waiting for them to get into position.
+"""
+
+import time  # To time how long servos take to settle.
+import threading  # To move the servos in the background.
+# imports the necessary code.
+
+
+class ServoActuator:
+    """Owns a set of servos, taking target pulse widths without
+    blocking and writing them on a background thread. Writes are
+    skipped when the commanded pulse width hasn't changed, and each
+    servo reports when it should have reached its position.
+
+    :param servos: The servos to be controlled by name, each needing
+        a `set_servo_pw` method like class`main.PWMGpio`
+    :type servos: dict
+    :param servo_speed: How many microseconds of pulse width a servo
+        moves through per second, used to work out when it settles,
+        defaults to 3000
+    :type servo_speed: float, optional
+    :param min_settle: The minimum amount of seconds a servo takes to
+        settle after any write, defaults to 0.02
+    :type min_settle: float, optional
+    :param logger: An optional logger addon to log the servos,
+        defaults to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time servo writes into,
+        defaults to None
+    :type metrics: class`metricsModule.Metrics`, optional
+    """
+
+    def __init__(self,
+                 servos: dict,
+                 servo_speed: float = 3000,
+                 min_settle: float = 0.02,
+                 logger=None,
+                 metrics=None):
+        """Constructs the class"""
+        self.servos = servos
+        self.servo_speed = servo_speed
+        self.min_settle = min_settle
+        self.logger = logger
+        self.metrics = metrics
+        self.unknown_travel = 1000
+        # The travel in microseconds assumed when a servo's position
+        # is unknown, such as when it's first homed.
+
+        self.writes = 0
+        self.suppressed = 0
+        # Counters of pulse widths written to the servos and commands
+        # skipped as the servo was already set to them.
+
+        self._targets = {}
+        self._written = {}
+        self._settle_at = {}
+        self._reached_at = {}
+        self._running = False
+        self._thread = None
+        self._cond = threading.Condition()
+        # The commanded and written pulse widths, when each servo is
+        # expected to settle and when it did, all guarded by the
+        # condition.
+
+    def start(self):
+        """Starts the actuator thread.
+
+        :return: The actuator itself, so it can be started on creation
+        :rtype: class`ServoActuator`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='actuator', daemon=True
+        )
+        self._thread.start()
+        if self.logger is not None:
+            self.logger.info(' Servo actuator started.')
+        return self
+
+    def set_target(self, name: str, pulsewidth: int):
+        """Commands a servo to a pulse width without waiting for it to
+        move.
+
+        :param name: The name of the servo
+        :type name: str
+        :param pulsewidth: The pulse width to be sent to the servo
+        :type pulsewidth: int
+        """
+
+        with self._cond:
+            if (self._targets.get(name, self._written.get(name))
+                    == pulsewidth):
+                self.suppressed += 1
+                return
+            self._targets[name] = pulsewidth
+            self._cond.notify()
+        # Ignores the command if the servo is already heading to the
+        # same pulse width, otherwise wakes the actuator thread.
+
+    def target(self, name: str):
+        """Gets the last pulse width a servo was commanded to.
+
+        :param name: The name of the servo
+        :type name: str
+
+        :return: The pulse width, or None if never commanded
+        :rtype: int
+        """
+
+        with self._cond:
+            return self._targets.get(name, self._written.get(name))
+
+    def reached(self, name: str):
+        """Checks if a servo has settled at its commanded pulse width.
+
+        :param name: The name of the servo
+        :type name: str
+
+        :return: True if the servo is in position
+        :rtype: bool
+        """
+
+        with self._cond:
+            return name not in self._targets and name in self._reached_at
+
+    def settled_since(self, *names: str):
+        """Gets the time the given servos were last all in position.
+
+        :param names: The names of the servos, defaults to every servo
+        :type names: str, optional
+
+        :return: The `time.monotonic` time the last of them settled,
+            or None if any of them is still moving
+        :rtype: float
+        """
+
+        names = names or tuple(self.servos)
+        with self._cond:
+            times = []
+            for name in names:
+                if name in self._targets or name not in self._reached_at:
+                    return None
+                times.append(self._reached_at[name])
+        return max(times)
+
+    def wait_reached(self, *names: str, timeout: float = None):
+        """Waits until the given servos are in position. Mostly used
+        when homing, the control loop should use `settled_since`.
+
+        :param names: The names of the servos, defaults to every servo
+        :type names: str, optional
+        :param timeout: The maximum amount of seconds to wait, defaults
+            to None which waits forever
+        :type timeout: float, optional
+
+        :return: True if the servos are in position
+        :rtype: bool
+        """
+
+        names = names or tuple(self.servos)
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: all(name not in self._targets
+                            and name in self._reached_at
+                            for name in names),
+                timeout
+            )
+
+    def _run(self):
+        """Writes new targets to the servos and marks them as reached
+        once they have had time to settle.
+        """
+
+        while self._running:
+            with self._cond:
+                now = time.monotonic()
+                for name, settle_at in list(self._settle_at.items()):
+                    if settle_at <= now:
+                        del self._settle_at[name]
+                        self._reached_at[name] = settle_at
+                        self._cond.notify_all()
+                # Marks any servo whose settle time has passed as
+                # reached.
+
+                pending = dict(self._targets)
+                self._targets.clear()
+                for name, pulsewidth in pending.items():
+                    if self._written.get(name) != pulsewidth:
+                        self._reached_at.pop(name, None)
+                if not pending:
+                    timeout = (min(self._settle_at.values()) - now
+                               if self._settle_at else None)
+                    self._cond.wait(timeout)
+                    continue
+                # Takes every new target, or sleeps until the next
+                # servo settles or a new target arrives.
+
+            for name, pulsewidth in pending.items():
+                previous = self._written.get(name)
+                if previous == pulsewidth:
+                    with self._cond:
+                        self.suppressed += 1
+                    continue
+                write_start = time.perf_counter()
+                self.servos[name].set_servo_pw(pulsewidth, sleep_time=0)
+                self.writes += 1
+                if self.metrics is not None:
+                    self.metrics.observe('servo',
+                                         time.perf_counter() - write_start)
+
+                if not pulsewidth:
+                    travel = 0
+                elif not previous:
+                    travel = self.unknown_travel
+                else:
+                    travel = abs(pulsewidth - previous)
+                settle = self.min_settle + travel / self.servo_speed
+                with self._cond:
+                    self._written[name] = pulsewidth
+                    self._settle_at[name] = time.monotonic() + settle
+            # Writes each changed pulse width and works out how long
+            # the servo will take to travel there. A pulse width of 0
+            # stops the servo so it settles straight away, and a servo
+            # with an unknown position is given the longest travel.
+
+    def stop(self):
+        """Stops the actuator thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
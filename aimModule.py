@@ -0,0 +1,401 @@
+"""This module's purpose is to work out how far to move the turret's
+servos to centre a target, from how many pixels the target is off
+centre, instead of inching towards it by a fixed amount every scan.
+"""
+
+import random  # For the noise in the simulation.
+# imports the necessary code.
+
+
+class StepController:
+    """Moves a fixed amount towards the target whenever it's outside
+    the leeway, the way the turret originally aimed.
+
+    :param jump: The pulse width moved each update, defaults to 50
+    :type jump: int, optional
+    """
+
+    def __init__(self, jump: int = 50):
+        """Constructs the class"""
+        self.jump = jump
+
+    def update(self, error: float, dt: float, saturated: bool = False):
+        """Works out the pulse width change for a pixel error.
+
+        :param error: How many pixels the target is off centre
+        :type error: float
+        :param dt: The seconds since the last update
+        :type dt: float
+        :param saturated: If the last change was cut short by the
+            servo's range, defaults to False
+        :type saturated: bool, optional
+
+        :return: The change in pulse width
+        :rtype: float
+        """
+
+        return self.jump if error > 0 else -self.jump
+
+    def reset(self):
+        """Forgets any state, used when the target is lost."""
+
+
+class ProportionalController:
+    """Moves in proportion to how far off centre the target is, so a
+    well set gain lands on the target in one move.
+
+    :param kp: The pulse width moved per pixel of error, defaults to
+        0.9
+    :type kp: float, optional
+    """
+
+    def __init__(self, kp: float = 0.9):
+        """Constructs the class"""
+        self.kp = kp
+
+    def update(self, error: float, dt: float, saturated: bool = False):
+        """Works out the pulse width change for a pixel error.
+
+        :param error: How many pixels the target is off centre
+        :type error: float
+        :param dt: The seconds since the last update
+        :type dt: float
+        :param saturated: If the last change was cut short by the
+            servo's range, defaults to False
+        :type saturated: bool, optional
+
+        :return: The change in pulse width
+        :rtype: float
+        """
+
+        return self.kp * error
+
+    def reset(self):
+        """Forgets any state, used when the target is lost."""
+
+
+class PIDController:
+    """Moves by a proportional, integral and derivative amount of the
+    pixel error. The integral stops growing while the servo is against
+    the end of its range and is capped, so it can't wind up and
+    overshoot once the target comes back within reach.
+
+    :param kp: The pulse width moved per pixel of error, defaults to
+        0.8
+    :type kp: float, optional
+    :param ki: The pulse width moved per pixel second of built up
+        error, defaults to 0.5
+    :type ki: float, optional
+    :param kd: The pulse width moved per pixel per second of change in
+        error, defaults to 0.02
+    :type kd: float, optional
+    :param integral_limit: The largest pulse width the integral can
+        add, defaults to 100
+    :type integral_limit: float, optional
+    """
+
+    def __init__(self,
+                 kp: float = 0.8,
+                 ki: float = 0.5,
+                 kd: float = 0.02,
+                 integral_limit: float = 100):
+        """Constructs the class"""
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+
+        self.integral = 0.0
+        self.last_error = None
+
+    def update(self, error: float, dt: float, saturated: bool = False):
+        """Works out the pulse width change for a pixel error.
+
+        :param error: How many pixels the target is off centre
+        :type error: float
+        :param dt: The seconds since the last update
+        :type dt: float
+        :param saturated: If the last change was cut short by the
+            servo's range, defaults to False
+        :type saturated: bool, optional
+
+        :return: The change in pulse width
+        :rtype: float
+        """
+
+        if not saturated and dt > 0:
+            self.integral += error * dt
+            if self.ki:
+                limit = self.integral_limit / self.ki
+                self.integral = min(max(self.integral, -limit), limit)
+        # Only builds the integral when the servo can still move, and
+        # caps what it can add.
+
+        derivative = 0.0
+        if self.last_error is not None and dt > 0:
+            derivative = (error - self.last_error) / dt
+        self.last_error = error
+
+        return (self.kp * error
+                + self.ki * self.integral
+                + self.kd * derivative)
+
+    def reset(self):
+        """Forgets the built up error, used when the target is lost."""
+        self.integral = 0.0
+        self.last_error = None
+
+
+class TableController:
+    """Moves by the pulse width change a calibration table says shifts
+    the view by the pixel error, landing on the target in one move
+    without searching for it.
+
+    :param table: A loaded calibration table
+    :type table: class`calibrationModule.CalibrationTable`
+    :param axis: The axis of the table to use, `x` or `y`
+    :type axis: str
+    """
+
+    def __init__(self, table, axis: str):
+        """Constructs the class"""
+        self.table = table
+        self.axis = axis
+
+    def update(self, error: float, dt: float, saturated: bool = False):
+        """Works out the pulse width change for a pixel error.
+
+        :param error: How many pixels the target is off centre
+        :type error: float
+        :param dt: The seconds since the last update
+        :type dt: float
+        :param saturated: If the last change was cut short by the
+            servo's range, defaults to False
+        :type saturated: bool, optional
+
+        :return: The change in pulse width
+        :rtype: float
+        """
+
+        return self.table.pulse_for(self.axis, error)
+
+    def reset(self):
+        """Forgets any state, used when the target is lost."""
+
+
+def make_controller(kind: str, **kwargs):
+    """Makes an aim controller by name.
+
+    :param kind: One of `step`, `proportional`, `pid` or `table`
+    :type kind: str
+    :param kwargs: The settings passed to the controller
+
+    :raises ValueError: If the kind isn't known
+    :return: The controller
+    :rtype: class`PIDController`
+    """
+
+    controllers = {
+        'step': StepController,
+        'proportional': ProportionalController,
+        'pid': PIDController,
+        'table': TableController
+    }
+    if kind not in controllers:
+        raise ValueError(f'Unknown aim controller {kind}.')
+    return controllers[kind](**kwargs)
+
+
+class TurretAimer:
+    """Turns the target's pixel error into pulse widths for the x and y
+    servos using a controller per axis, keeping them within the servos'
+    safe ranges.
+
+    :param x_controller: The controller of the x-axis
+    :type x_controller: class`PIDController`
+    :param y_controller: The controller of the y-axis
+    :type y_controller: class`PIDController`
+    :param x_pulsewidth: The starting x pulse width
+    :type x_pulsewidth: int
+    :param y_pulsewidth: The starting y pulse width
+    :type y_pulsewidth: int
+    :param x_range: The lowest and highest safe x pulse width,
+        defaults to (750, 2250)
+    :type x_range: tuple, optional
+    :param y_range: The lowest and highest safe y pulse width,
+        defaults to (1750, 2250)
+    :type y_range: tuple, optional
+    """
+
+    def __init__(self,
+                 x_controller,
+                 y_controller,
+                 x_pulsewidth: int,
+                 y_pulsewidth: int,
+                 x_range: tuple = (750, 2250),
+                 y_range: tuple = (1750, 2250)):
+        """Constructs the class"""
+        self.x_controller = x_controller
+        self.y_controller = y_controller
+        self.x_range = x_range
+        self.y_range = y_range
+        self.x_pulsewidth = x_pulsewidth
+        self.y_pulsewidth = y_pulsewidth
+
+        self._x_saturated = False
+        self._y_saturated = False
+
+    def aim(self, error_x: float, error_y: float, dt: float,
+            x_leeway: float, y_leeway: float):
+        """Works out the new pulse widths for a target's pixel error.
+        A positive error means the target is left of or above the
+        crosshair, which raises the pulse width.
+
+        :param error_x: How many pixels the target is left of centre
+        :type error_x: float
+        :param error_y: How many pixels the target is above centre
+        :type error_y: float
+        :param dt: The seconds since the last aim
+        :type dt: float
+        :param x_leeway: How many pixels off centre still counts as
+            on target on the x-axis
+        :type x_leeway: float
+        :param y_leeway: How many pixels off centre still counts as
+            on target on the y-axis
+        :type y_leeway: float
+
+        :return: The x pulse width, the y pulse width, and if the
+            target is within the leeway on each axis
+        :rtype: tuple
+        """
+
+        x_on = abs(error_x) <= x_leeway
+        y_on = abs(error_y) <= y_leeway
+        # Within the leeway the servos are left alone, so they don't
+        # jitter around small errors.
+
+        if not x_on:
+            self.x_pulsewidth, self._x_saturated = self._move(
+                self.x_controller, error_x, dt, self.x_pulsewidth,
+                self.x_range, self._x_saturated
+            )
+        if not y_on:
+            self.y_pulsewidth, self._y_saturated = self._move(
+                self.y_controller, error_y, dt, self.y_pulsewidth,
+                self.y_range, self._y_saturated
+            )
+        return self.x_pulsewidth, self.y_pulsewidth, x_on, y_on
+
+    @staticmethod
+    def _move(controller, error: float, dt: float, pulsewidth: int,
+              limits: tuple, saturated: bool):
+        """Moves one axis, clamping it to its range.
+
+        :return: The new pulse width and if it was clamped
+        :rtype: tuple
+        """
+
+        wanted = pulsewidth + controller.update(error, dt, saturated)
+        clamped = int(round(min(max(wanted, limits[0]), limits[1])))
+        return clamped, clamped != int(round(wanted))
+
+    def reset(self):
+        """Forgets the controllers' state, used when the target is
+        lost.
+        """
+
+        self.x_controller.reset()
+        self.y_controller.reset()
+        self._x_saturated = False
+        self._y_saturated = False
+
+
+def simulate(controller, start_error: float = 200,
+             pixels_per_us: float = 1.0, leeway: float = 25,
+             scan_time: float = 0.15, servo_speed: float = 3000,
+             noise: float = 3, max_steps: int = 100, seed: int = 0):
+    """Simulates one axis of the turret centring a still target,
+    scanning, moving, waiting for the servo to settle and scanning
+    again until the target is within the leeway.
+
+    :param controller: The controller to be simulated
+    :type controller: class`PIDController`
+    :param start_error: How many pixels off centre the target starts,
+        defaults to 200
+    :type start_error: float, optional
+    :param pixels_per_us: How many pixels the target moves in the
+        frame per microsecond of pulse width, defaults to 1.0
+    :type pixels_per_us: float, optional
+    :param leeway: How many pixels off centre counts as on target,
+        defaults to 25
+    :type leeway: float, optional
+    :param scan_time: The seconds a detector scan takes, defaults to
+        0.15
+    :type scan_time: float, optional
+    :param servo_speed: The microseconds of pulse width the servo moves
+        per second, defaults to 3000
+    :type servo_speed: float, optional
+    :param noise: The standard deviation of the detector's error in
+        pixels, defaults to 3
+    :type noise: float, optional
+    :param max_steps: The most scans before giving up, defaults to 100
+    :type max_steps: int, optional
+    :param seed: The seed of the detector noise, defaults to 0
+    :type seed: int, optional
+
+    :return: The amount of scans and the simulated seconds it took to
+        get on target, and the largest overshoot in pixels
+    :rtype: tuple
+    """
+
+    rng = random.Random(seed)
+    aimer = TurretAimer(controller, StepController(0), 1500, 2000,
+                        x_range=(0, 3000))
+    error = start_error
+    elapsed = 0.0
+    overshoot = 0.0
+    for step in range(1, max_steps + 1):
+        elapsed += scan_time
+        measured = error + rng.gauss(0, noise)
+        if abs(measured) <= leeway:
+            return step, elapsed, overshoot
+        # Scans the frame, stopping once the target is centred.
+
+        before = aimer.x_pulsewidth
+        aimer.aim(measured, 0, scan_time, leeway, leeway)
+        travel = aimer.x_pulsewidth - before
+        error -= travel * pixels_per_us
+        elapsed += abs(travel) / servo_speed
+        if error * start_error < 0:
+            overshoot = max(overshoot, abs(error))
+        # Moves the servo, the target moves the other way across the
+        # frame, then waits for the servo to settle.
+
+    return max_steps, elapsed, overshoot
+
+
+def main():
+    """Starts some module tests, simulating how quickly each controller
+    centres a target compared to the original fixed steps.
+    """
+
+    controllers = {
+        'step (original)': lambda: StepController(50),
+        'proportional': lambda: ProportionalController(0.9),
+        'pid': lambda: PIDController()
+    }
+    print(f'{"controller":<18}{"error":>7}{"scans":>7}'
+          f'{"seconds":>9}{"overshoot":>11}')
+    for start_error in (60, 150, 300):
+        for name, factory in controllers.items():
+            steps, elapsed, overshoot = simulate(
+                factory(), start_error=start_error
+            )
+            print(f'{name:<18}{start_error:>7}{steps:>7}'
+                  f'{elapsed:>9.2f}{overshoot:>11.1f}')
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
@@ -0,0 +1,515 @@
+"""This module's purpose is to send the security alert emails from a
+background outbox, so a slow mail server never holds up the turret.
+"""
+
+import os  # For getting the names of attached files.
+import cv2  # For encoding images.
+import time  # To time sends and back off between retries.
+import queue  # To hold alerts waiting to be sent.
+import threading  # To send alerts in the background.
+# imports the necessary code. smtplib and the email MIME modules are
+# only imported once an email is sent, as together they take a good
+# part of a second to import on the Pi and aren't needed to start up.
+
+
+_IMAGE_SUBTYPES = {'.jpg': 'jpeg', '.jpeg': 'jpeg',
+                   '.png': 'png', '.webp': 'webp'}
+# The email image type of each supported image extension.
+
+_SEVERITY = ('Human', 'Door', 'Motion')
+# Words in alert subjects from the most to the least serious, so a
+# merged email's subject leads with the most serious alert.
+
+
+def _severity(subject: str):
+    """Ranks an alert subject, lower being more serious."""
+    for rank, word in enumerate(_SEVERITY):
+        if word in subject:
+            return rank
+    return len(_SEVERITY)
+
+
+def merge_subjects(subjects: list):
+    """Merges the subjects of alerts sent as one email, naming each
+    distinct kind of alert, the most serious first.
+
+    :param subjects: The subject of each alert, such as
+        `Security Alert: Door Opened`
+    :type subjects: list
+
+    :return: The subject of the email, such as `Security Alert: Human
+        Detected on cam0, Door Opened (+1 more)`
+    :rtype: str
+    """
+
+    if len(subjects) == 1:
+        return subjects[0]
+    distinct = sorted(dict.fromkeys(subjects), key=_severity)
+    head, _, _ = distinct[0].rpartition(': ')
+    kinds = [subject[len(head) + 2:] if head and subject.startswith(
+                 f'{head}: ') else subject
+             for subject in distinct]
+    merged = f'{head}: {", ".join(kinds)}' if head else ', '.join(kinds)
+    # Kinds sharing the most serious subject's prefix are only named
+    # after it.
+
+    return f'{merged} (+{len(subjects) - 1} more)'
+
+
+def encode_snapshot(img, image_format: str = '.jpg', quality: int = 90,
+                    scale: float = 1.0):
+    """Encodes an image into memory once, so the same bytes can be
+    attached to an email and saved to disk.
+
+    :param img: The image to be encoded
+    :type img: class`numpy.ndarray`
+    :param image_format: The extension of the image format, one of
+        `.jpg`, `.png` or `.webp`, defaults to `.jpg`
+    :type image_format: str, optional
+    :param quality: The quality from 0 to 100, for png a higher
+        quality means less compression, defaults to 90
+    :type quality: int, optional
+    :param scale: How much to resize the image by before encoding,
+        defaults to 1.0
+    :type scale: float, optional
+
+    :raises ValueError: If the image format isn't supported or the
+        image couldn't be encoded
+    :return: The encoded image
+    :rtype: bytes
+    """
+
+    image_format = image_format.lower()
+    if image_format not in _IMAGE_SUBTYPES:
+        raise ValueError(f'Unsupported snapshot format {image_format}.')
+
+    if scale != 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale,
+                         interpolation=cv2.INTER_AREA)
+    # Shrinks the image, area interpolation keeps it from aliasing.
+
+    if image_format == '.png':
+        params = [cv2.IMWRITE_PNG_COMPRESSION,
+                  9 - min(max(quality, 0), 100) * 9 // 100]
+    elif image_format == '.webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    # Turns the quality into the format's own setting.
+
+    success, buffer = cv2.imencode(image_format, img, params)
+    if not success:
+        raise ValueError(f'Unable to encode snapshot as {image_format}.')
+    return buffer.tobytes()
+
+
+def compose_email(email_address: str, email_receiver: str,
+                  subject: str, body: str, images: list = ()):
+    """Builds an email with any amount of images attached.
+
+    :param email_address: The sender email address
+    :type email_address: str
+    :param email_receiver: The email address that the email will be
+        sent to
+    :type email_receiver: str
+    :param subject: The text subject header of the email
+    :type subject: str
+    :param body: The text body of the email
+    :type body: str
+    :param images: The file name and encoded bytes of each image
+        that'll be added as an attachment within the email, defaults
+        to none
+    :type images: list, optional
+
+    :return: The composed email
+    :rtype: class`email.mime.multipart.MIMEMultipart`
+    """
+
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.mime.image import MIMEImage
+    # For formatting emails, email message, and email images.
+
+    msg = MIMEMultipart()
+    msg['Subject'] = subject
+    msg['From'] = email_address
+    msg['To'] = email_receiver
+
+    msg.attach(MIMEText(body))
+    for image_name, image_data in images:
+        subtype = _IMAGE_SUBTYPES.get(
+            os.path.splitext(image_name)[1].lower(), 'png'
+        )
+        msg.attach(MIMEImage(image_data, _subtype=subtype, name=image_name))
+    return msg
+
+
+class Alert:
+    """A single alert waiting in the outbox.
+
+    :param subject: The text subject header of the alert
+    :type subject: str
+    :param body: The text body of the alert
+    :type body: str
+    :param images: The file name and encoded bytes of each image to
+        be attached
+    :type images: list
+    """
+
+    __slots__ = ('subject', 'body', 'images', 'queued_at')
+
+    def __init__(self, subject: str, body: str, images: list):
+        """Constructs the class"""
+        self.subject = subject
+        self.body = body
+        self.images = images
+        self.queued_at = time.monotonic()
+
+
+class AlertOutbox:
+    """Queues alert emails and sends them from a background thread
+    over one reused connection, reconnecting whenever the server drops
+    it. Alerts queued within `coalesce_window` seconds of each other
+    are merged into one email, and failed sends are retried with an
+    increasing wait between each attempt.
+
+    :param email_address: The sender email address
+    :type email_address: str
+    :param email_password: The password (or app password) of the
+        sender email address, no login is done if empty
+    :type email_password: str
+    :param email_receiver: The email address that the alerts will be
+        sent to
+    :type email_receiver: str
+    :param domain: The domain of the smtp server, defaults to
+        `smtp.gmail.com`
+    :type domain: str, optional
+    :param port: The port of the smtp server, defaults to 465
+    :type port: int, optional
+    :param use_ssl: If the connection uses SSL, turn off to test
+        against a local smtp server, defaults to True
+    :type use_ssl: bool, optional
+    :param coalesce_window: The amount of seconds to wait for more
+        alerts to merge into the same email, defaults to 5
+    :type coalesce_window: float, optional
+    :param max_retries: The amount of times a failed send is retried
+        before the email is dropped, defaults to 5
+    :type max_retries: int, optional
+    :param backoff: The seconds waited after the first failed send,
+        doubling with every retry, defaults to 2
+    :type backoff: float, optional
+    :param logger: An optional logger addon to log the outbox,
+        defaults to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time smtp sends into, defaults
+        to None
+    :type metrics: class`metricsModule.Metrics`, optional
+    """
+
+    def __init__(self,
+                 email_address: str,
+                 email_password: str,
+                 email_receiver: str,
+                 domain: str = 'smtp.gmail.com',
+                 port: int = 465,
+                 use_ssl: bool = True,
+                 coalesce_window: float = 5,
+                 max_retries: int = 5,
+                 backoff: float = 2,
+                 logger=None,
+                 metrics=None):
+        """Constructs the class"""
+        self.email_address = email_address
+        self.email_password = email_password
+        self.email_receiver = email_receiver
+        self.domain = domain
+        self.port = port
+        self.use_ssl = use_ssl
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.logger = logger
+        self.metrics = metrics
+
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+        self.connects = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+        # Counters of emails sent, emails given up on, alerts merged
+        # into another alert's email and connections opened. The
+        # latencies are the seconds from an alert being queued to it
+        # being sent.
+
+        self._queue = queue.Queue()
+        self._unsent = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Starts the outbox thread.
+
+        :return: The outbox itself, so it can be started on creation
+        :rtype: class`AlertOutbox`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='alert-outbox', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def send(self, subject: str, body: str, images: list = ()):
+        """Queues an alert to be sent, returning straight away.
+
+        :param subject: The text subject header of the alert
+        :type subject: str
+        :param body: The text body of the alert
+        :type body: str
+        :param images: The file name and encoded bytes of each image
+            that'll be added as an attachment, defaults to none
+        :type images: list, optional
+        """
+
+        with self._lock:
+            self._unsent += 1
+        self._queue.put(Alert(subject, body, list(images)))
+
+    def queue_depth(self):
+        """Gets the amount of alerts that haven't been sent yet.
+
+        :return: The amount of alerts queued or being sent
+        :rtype: int
+        """
+
+        return self._unsent
+
+    def stats(self):
+        """Returns the outbox's counters.
+
+        :return: The queue depth, the sent, failed, merged and connect
+            counts and the last and average send latency in seconds
+        :rtype: dict
+        """
+
+        return {
+            'queue_depth': self.queue_depth(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'merged': self.merged,
+            'connects': self.connects,
+            'last_latency': self.last_latency,
+            'avg_latency': (self.total_latency / self.sent
+                            if self.sent else None)
+        }
+
+    def flush(self, timeout: float = None):
+        """Waits until every queued alert has been sent or given up on.
+
+        :param timeout: The maximum amount of seconds to wait, defaults
+            to None which waits forever
+        :type timeout: float, optional
+
+        :return: True if the outbox is empty
+        :rtype: bool
+        """
+
+        end_time = None if timeout is None else time.monotonic() + timeout
+        while self.queue_depth():
+            if end_time is not None and time.monotonic() > end_time:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        """Collects alerts into batches and sends them for as long as
+        the outbox is running.
+        """
+
+        while self._running:
+            try:
+                alert = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [alert]
+            # Waits for the first alert of a batch.
+
+            deadline = alert.queued_at + self.coalesce_window
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    alert = (self._queue.get(timeout=remaining)
+                             if remaining > 0
+                             else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                batch.append(alert)
+            # Gathers every alert that arrives within the coalesce
+            # window so that bursts go out as one email.
+
+            self.merged += len(batch) - 1
+            try:
+                self._deliver(batch)
+            except Exception:
+                self._disconnect()
+                self.failed += 1
+                if self.logger is not None:
+                    self.logger.exception(' Alert email dropped after an '
+                                          'unexpected error.')
+            finally:
+                with self._lock:
+                    self._unsent -= len(batch)
+            # Anything else going wrong, such as an image that can't be
+            # attached, only drops this batch rather than the thread.
+        self._disconnect()
+
+    def _deliver(self, batch: list):
+        """Sends a batch of alerts as one email, retrying on failure.
+
+        :param batch: The alerts to be sent
+        :type batch: list
+        """
+
+        subject = merge_subjects([alert.subject for alert in batch])
+        body = '\n\n'.join(alert.body for alert in batch)
+        images = [image for alert in batch for image in alert.images]
+        # Merges the alerts, the subject naming every kind of alert so
+        # a person seen after a door opening isn't hidden.
+
+        import smtplib as smtp  # For the smtp errors.
+
+        msg = compose_email(
+            self.email_address, self.email_receiver,
+            subject, body, images
+        ).as_string()
+
+        attempt = 0
+        while attempt <= self.max_retries:
+            send_start = time.perf_counter()
+            reused = self._connection is not None
+            try:
+                self._connect().sendmail(
+                    from_addr=self.email_address,
+                    to_addrs=self.email_receiver, msg=msg
+                )
+            except (smtp.SMTPException, OSError) as error:
+                self._disconnect()
+                if reused and isinstance(error, smtp.SMTPServerDisconnected):
+                    continue
+                # A kept connection the server has since closed is
+                # reopened straight away, without using up a retry.
+
+                if self.logger is not None:
+                    self.logger.warning(
+                        f' Alert email failed, attempt {attempt + 1} of '
+                        f'{self.max_retries + 1}.', exc_info=True
+                    )
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            # Drops the connection on any failure so the next attempt
+            # starts on a fresh one, and waits longer each time.
+
+            if self.metrics is not None:
+                self.metrics.observe('smtp',
+                                     time.perf_counter() - send_start)
+            now = time.monotonic()
+            self.sent += 1
+            self.last_latency = now - batch[0].queued_at
+            self.total_latency += self.last_latency
+            if self.logger is not None:
+                self.logger.debug(
+                    f' Alert email sent with {len(batch)} alerts in '
+                    f'{self.last_latency:.2f} seconds.'
+                )
+            return
+
+        self.failed += 1
+        if self.logger is not None:
+            self.logger.error(f' Alert email dropped: {subject}.')
+
+    def _connect(self):
+        """Returns the open connection, opening and logging in a new
+        one if there isn't one or the server has closed it.
+
+        :return: A connection to the smtp server
+        :rtype: class`smtplib.SMTP`
+        """
+
+        import smtplib as smtp  # For emailing
+
+        if self._connection is not None:
+            try:
+                if self._connection.noop()[0] == 250:
+                    return self._connection
+            except (smtp.SMTPException, OSError):
+                pass
+            self._disconnect()
+        # Checks a kept connection is still alive, as alerts are often
+        # minutes apart and servers close idle connections well before.
+        if self.use_ssl:
+            connection = smtp.SMTP_SSL(self.domain, self.port, timeout=30)
+        else:
+            connection = smtp.SMTP(self.domain, self.port, timeout=30)
+        if self.email_password:
+            connection.login(self.email_address, self.email_password)
+        self._connection = connection
+        self.connects += 1
+        return connection
+
+    def _disconnect(self):
+        """Closes the connection if there is one."""
+        import smtplib as smtp  # For the smtp errors.
+
+        if self._connection is None:
+            return
+        try:
+            self._connection.quit()
+        except (smtp.SMTPException, OSError):
+            self._connection.close()
+        self._connection = None
+
+    def stop(self, timeout: float = 10):
+        """Sends what's left in the outbox then stops the thread.
+
+        :param timeout: The maximum amount of seconds to wait for the
+            outbox to empty, defaults to 10
+        :type timeout: float, optional
+        """
+
+        self.flush(timeout)
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+def main():
+    """Starts some module tests, sending a burst of alerts to a local
+    smtp server such as `python -m aiosmtpd -n -l localhost:1025`.
+    """
+
+    outbox = AlertOutbox(
+        'turret@localhost', '', 'owner@localhost',
+        domain='localhost', port=1025, use_ssl=False,
+        coalesce_window=1
+    ).start()
+    for trigger in ('Door Opened', 'Motion Detected', 'Human Detected'):
+        outbox.send(f'Security Alert: {trigger}', f'ALERT: {trigger}.')
+        print(f'Queue depth: {outbox.queue_depth()}')
+    # Sends three alerts at once, which should merge into one email.
+
+    outbox.stop()
+    print(outbox.stats())
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
@@ -0,0 +1,666 @@
+"""This module's purpose is to measure how long parts of the turret's
+pipeline take on the machine it's run on, so changes can be compared
+by their cost per frame.
+
+Run from the project folder, for example:
+`python benchmarkModule.py display`
+`python benchmarkModule.py detector --frames footage.mp4 --threads 1,2,4`
+`python benchmarkModule.py models --frames footage.mp4 --labels people.json`
+"""
+
+import os  # To check for a display.
+import json  # For the detector reports and the labels.
+import time  # To time each run.
+import argparse  # For the command line options.
+import platform  # To note the machine in the detector reports.
+import itertools  # To go through the detector grid.
+import tracemalloc  # To measure the memory allocated per frame.
+import cv2  # For drawing and showing frames.
+import numpy as np  # For the test frames.
+
+from objectDetectionModule import (
+    ObjectDetector, DetectionSet, MODEL_VARIANTS, draw_detections
+)
+from preprocessModule import Preprocessor
+from replayModule import ReplayStream, percentiles
+# imports the necessary code.
+
+
+def time_per_frame(func, frames: int = 300, warmup: int = 10):
+    """Times a function run once per frame.
+
+    :param func: The function to be timed, taking the frame number
+    :type func: function
+    :param frames: The amount of frames timed, defaults to 300
+    :type frames: int, optional
+    :param warmup: The amount of untimed runs first, defaults to 10
+    :type warmup: int, optional
+
+    :return: The average and the 95th percentile in milliseconds
+    :rtype: tuple
+    """
+
+    for i in range(warmup):
+        func(i)
+    timings = []
+    for i in range(frames):
+        start_time = time.perf_counter()
+        func(i)
+        timings.append(time.perf_counter() - start_time)
+    timings.sort()
+    return (sum(timings) / frames * 1000,
+            timings[int(frames * 0.95) - 1] * 1000)
+
+
+def allocated_per_frame(func, frames: int = 50):
+    """Measures the most memory a function has allocated at once while
+    running, including images it makes and throws away, per frame.
+
+    :param func: The function to be measured, taking the frame number
+    :type func: function
+    :param frames: The amount of frames measured, defaults to 50
+    :type frames: int, optional
+
+    :return: The average kilobytes allocated per frame
+    :rtype: float
+    """
+
+    func(0)
+    tracemalloc.start()
+    total = 0
+    for i in range(frames):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        func(i)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / frames / 1024
+
+
+def preprocess_benchmark(frames: int = 300, input_size: tuple = (320, 320)):
+    """Times preparing an upside down frame for the detector, the old
+    way of flipping and converting the whole frame for the model to
+    shrink, against the preprocessor shrinking first into reused
+    buffers.
+
+    :param frames: The amount of frames timed, defaults to 300
+    :type frames: int, optional
+    :param input_size: The model's input size, defaults to (320, 320)
+    :type input_size: tuple, optional
+
+    :return: The average and 95th percentile milliseconds and the
+        kilobytes allocated per frame of each way
+    :rtype: dict
+    """
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    preprocessor = Preprocessor(input_size, flip=True)
+
+    def legacy(i):
+        """Flips and converts the whole frame then shrinks it, as the
+        model did inside detect.
+        """
+        flipped = cv2.flip(img, -1)
+        rgb_img = cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+        return cv2.resize(rgb_img, input_size)
+
+    def fused(i):
+        """Prepares the frame with the preprocessor."""
+        return preprocessor.prepare(img)
+
+    results = {}
+    for name, func in (('flip + cvtColor', legacy), ('preprocessor', fused)):
+        results[name] = (time_per_frame(func, frames)
+                         + (allocated_per_frame(func),))
+    return results
+
+
+def display_benchmark(frames: int = 300, show: bool = None):
+    """Times the per-frame display work of `main.main`, drawing the
+    detected objects and the fps counter onto a copy of each frame and
+    showing it, against headless mode which does none of it.
+
+    :param frames: The amount of frames timed, defaults to 300
+    :type frames: int, optional
+    :param show: If the window is opened, defaults to only when there
+        is a display
+    :type show: bool, optional
+
+    :return: The average and 95th percentile milliseconds per frame of
+        each mode
+    :rtype: dict
+    """
+
+    if show is None:
+        show = bool(os.environ.get('DISPLAY'))
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    detected = DetectionSet(
+        np.array([0, 0, 56]), np.array(['person', 'person', 'chair']),
+        np.array([0.81, 0.64, 0.55]),
+        np.array([[120, 80, 140, 300], [400, 120, 90, 250],
+                  [40, 300, 120, 150]], dtype=np.int32)
+    )
+    # A noisy frame with a few objects found, like a busy room.
+
+    def overlay(i):
+        """Draws the window's overlay like the loop does."""
+        view = img.copy()
+        draw_detections(view, detected)
+        cv2.putText(view, f'FPS = {i % 30:.1f} Scan every 3.0 frames',
+                    (24, 20), cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 255), 1)
+        return view
+
+    def window(i):
+        """Draws the overlay and shows it."""
+        cv2.imshow('Benchmark', overlay(i))
+        cv2.waitKey(1)
+
+    def headless(i):
+        """Does nothing, like the loop without a monitor."""
+
+    results = {'overlay': time_per_frame(overlay, frames)}
+    if show:
+        results['overlay + window'] = time_per_frame(window, frames)
+        cv2.destroyAllWindows()
+    results['headless'] = time_per_frame(headless, frames)
+    return results
+
+
+def load_frames(source: str, limit: int = None, upright: bool = False):
+    """Reads recorded footage into memory, as the turret's camera
+    would hand it over, so reading it isn't part of any timing.
+
+    :param source: The path of a video file or of a folder of images
+    :type source: str
+    :param limit: The most frames read, defaults to None for all of
+        them
+    :type limit: int, optional
+    :param upright: If the footage is already the right way up,
+        defaults to False for footage recorded by the turret
+    :type upright: bool, optional
+
+    :return: The frames' images
+    :rtype: list
+    """
+
+    stream = ReplayStream(source, realtime=False, upright=upright).start()
+    images = []
+    try:
+        while limit is None or len(images) < limit:
+            images.append(stream.read().img)
+    except KeyboardInterrupt:
+        pass
+    # The replay stream raises KeyboardInterrupt once the footage has
+    # run out.
+    stream.stop()
+    return images
+
+
+def box_agreement(reference: DetectionSet, detected: DetectionSet,
+                  min_iou: float = 0.5):
+    """Counts the detections two scans of the same frame agree on, a
+    pair agreeing when their labels match and their boxes overlap by
+    at least min_iou of their combined area.
+
+    :param reference: The detections of the reference scan
+    :type reference: class`objectDetectionModule.DetectionSet`
+    :param detected: The detections being compared
+    :type detected: class`objectDetectionModule.DetectionSet`
+    :param min_iou: The least intersection over union of two boxes for
+        them to agree, defaults to 0.5
+    :type min_iou: float, optional
+
+    :return: The amount of detections paired up
+    :rtype: int
+    """
+
+    if not len(reference) or not len(detected):
+        return 0
+    ref = reference.boxes.astype(float)[:, None, :]
+    box = detected.boxes.astype(float)[None, :, :]
+    width = (np.minimum(ref[..., 0] + ref[..., 2], box[..., 0] + box[..., 2])
+             - np.maximum(ref[..., 0], box[..., 0]))
+    height = (np.minimum(ref[..., 1] + ref[..., 3], box[..., 1] + box[..., 3])
+              - np.maximum(ref[..., 1], box[..., 1]))
+    overlap = np.clip(width, 0, None) * np.clip(height, 0, None)
+    union = (ref[..., 2] * ref[..., 3] + box[..., 2] * box[..., 3]
+             - overlap)
+    iou = np.where(union > 0, overlap / np.maximum(union, 1e-9), 0.0)
+    iou[reference.labels[:, None] != detected.labels[None, :]] = 0.0
+    # The overlap of every reference box with every compared box, only
+    # counting boxes of the same label.
+
+    matched = 0
+    while iou.size and iou.max() >= min_iou:
+        row, column = np.unravel_index(iou.argmax(), iou.shape)
+        iou[row, :] = 0.0
+        iou[:, column] = 0.0
+        matched += 1
+    # Pairs the most overlapping boxes first, each box pairing once.
+
+    return matched
+
+
+def run_detector(images: list, warmup: int = 3, **settings):
+    """Scans every frame with a detector made from the settings, the
+    way the turret does, and times each `find_object` and
+    `find_position` call.
+
+    :param images: The frames as captured
+    :type images: list
+    :param warmup: The amount of untimed scans first, as the first
+        inference is much slower, defaults to 3
+    :type warmup: int, optional
+    :param settings: The settings passed to the detector
+
+    :return: The detections of each frame, each scan's latency in
+        seconds, and the wall and CPU seconds spent scanning
+    :rtype: tuple
+    """
+
+    height, width = images[0].shape[:2]
+    detector = ObjectDetector(size=(width, height), flip=True, **settings)
+    for img in images[:warmup]:
+        detector.find_object(img)
+
+    detections = []
+    latencies = []
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for img in images:
+        start_time = time.perf_counter()
+        detector.find_object(img)
+        detector.find_position()
+        latencies.append(time.perf_counter() - start_time)
+        detections.append(detector.detected)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    # The CPU time is the whole process's, so it includes every thread
+    # the model runs on.
+
+    return detections, latencies, wall, cpu
+
+
+def detector_grid(images: list,
+                  models: list = ('./models/efficientdet_lite0.tflite',),
+                  input_sizes: list = ((320, 320),),
+                  num_threads: list = (4,),
+                  max_results: list = (3,),
+                  score_thresholds: list = (0.5,),
+                  warmup: int = 3):
+    """Runs the detector over recorded frames with every combination
+    of the settings. The first value of each setting makes up the
+    reference run the others' detections are compared against.
+
+    :param images: The frames as captured
+    :type images: list
+    :param models: The paths of the models, defaults to
+        efficientdet_lite0 only
+    :type models: list, optional
+    :param input_sizes: The sizes frames are shrunk to before being
+        handed over, None for full size, defaults to (320, 320) only
+    :type input_sizes: list, optional
+    :param num_threads: The CPU threads the model runs on, defaults to
+        4 only
+    :type num_threads: list, optional
+    :param max_results: The most objects kept per scan, defaults to 3
+        only
+    :type max_results: list, optional
+    :param score_thresholds: The least score for an object to be kept,
+        defaults to 0.5 only
+    :type score_thresholds: list, optional
+    :param warmup: The amount of untimed scans per run, defaults to 3
+    :type warmup: int, optional
+
+    :return: The machine, the frames and the results of each run
+    :rtype: dict
+    """
+
+    combinations = list(itertools.product(
+        models, input_sizes, num_threads, max_results, score_thresholds
+    ))
+    reference = None
+    results = []
+    for model, input_size, threads, results_kept, score in combinations:
+        settings = {
+            'model': model,
+            'input_size': list(input_size) if input_size else None,
+            'num_threads': threads,
+            'max_results': results_kept,
+            'score_threshold': score
+        }
+        detections, latencies, wall, cpu = run_detector(
+            images, warmup, **settings
+        )
+        if reference is None:
+            reference = detections
+        # The first combination is the reference run.
+
+        matched = sum(box_agreement(ref, found)
+                      for ref, found in zip(reference, detections))
+        found_total = sum(len(found) for found in detections)
+        total = sum(len(found) for found in reference) + found_total
+        person_frames = sum(('person' in ref) == ('person' in found)
+                            for ref, found in zip(reference, detections))
+        # Agreement is how many detections paired up with the reference
+        # run's, out of the average amount found by the two, and how
+        # many frames both agreed on whether a person is in.
+
+        results.append(dict(
+            settings,
+            fps=len(images) / wall,
+            latency_ms=percentiles([latency * 1000
+                                    for latency in latencies]),
+            cpu_percent=cpu / wall * 100,
+            cpu_ms_per_frame=cpu / len(images) * 1000,
+            detections=found_total,
+            agreement=2 * matched / total if total else 1.0,
+            person_agreement=person_frames / len(images)
+        ))
+
+    return dict(_machine(images), results=results)
+
+
+def _machine(images: list):
+    """Describes the machine and the frames a report was made with.
+
+    :return: The machine's details and the amount and size of frames
+    :rtype: dict
+    """
+
+    return {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'frames': len(images),
+        'frame_size': list(images[0].shape[1::-1])
+    }
+
+
+def print_detector_grid(report: dict):
+    """Prints the detector grid's results in a readable form.
+
+    :param report: The report made by `detector_grid`
+    :type report: dict
+    """
+
+    print(f'{report["frames"]} frames of {report["frame_size"]} on '
+          f'{report["machine"]} with {report["cpu_count"]} cores, the '
+          f'first run is the reference.')
+    print(f'{"model":<24}{"input":>9}{"thr":>4}{"max":>4}{"score":>6}'
+          f'{"fps":>7}{"p50":>8}{"p95":>8}{"p99":>8}{"cpu%":>7}'
+          f'{"agree":>7}{"person":>7}')
+    for result in report['results']:
+        input_size = ('full' if result['input_size'] is None
+                      else 'x'.join(map(str, result['input_size'])))
+        latency = result['latency_ms']
+        print(f'{os.path.splitext(os.path.basename(result["model"]))[0]:<24}'
+              f'{input_size:>9}{result["num_threads"]:>4}'
+              f'{result["max_results"]:>4}'
+              f'{result["score_threshold"]:>6.2f}{result["fps"]:>7.1f}'
+              f'{latency["p50"]:>8.1f}{latency["p95"]:>8.1f}'
+              f'{latency["p99"]:>8.1f}{result["cpu_percent"]:>7.0f}'
+              f'{result["agreement"]:>7.2f}'
+              f'{result["person_agreement"]:>7.2f}')
+
+
+def load_labels(path: str):
+    """Reads hand made person labels for recorded frames, a json list
+    with an entry per frame holding the x, y, width and height of each
+    person in the upright frame, such as [[], [[120, 80, 140, 300]]].
+
+    :param path: The path of the labels
+    :type path: str
+
+    :return: The people of each frame
+    :rtype: list
+    """
+
+    with open(path) as infile:
+        frames = json.load(infile)
+    return [DetectionSet(
+        np.zeros(len(boxes), dtype=np.int16),
+        np.array(['person'] * len(boxes)),
+        np.ones(len(boxes), dtype=np.float32),
+        np.array(boxes, dtype=np.int32).reshape(-1, 4)
+    ) for boxes in frames]
+
+
+def model_comparison(images: list, models: list = tuple(MODEL_VARIANTS),
+                     labels: list = None, num_threads: int = 4,
+                     warmup: int = 3):
+    """Runs each model over recorded frames, reporting how much
+    quicker it is than the first and how many of the people it still
+    finds, either those in the labels or those the first model found.
+
+    :param images: The frames as captured
+    :type images: list
+    :param models: The names of model variants or paths of models,
+        defaults to every known variant
+    :type models: list, optional
+    :param labels: The people in each frame, as read by `load_labels`,
+        defaults to None which uses the first model's people
+    :type labels: list, optional
+    :param num_threads: The CPU threads each model runs on, defaults
+        to 4
+    :type num_threads: int, optional
+    :param warmup: The amount of untimed scans per model, defaults to 3
+    :type warmup: int, optional
+
+    :return: The machine, the frames and the results of each model
+    :rtype: dict
+    """
+
+    truth = labels
+    reference_p50 = None
+    results = []
+    for model in models:
+        detections, latencies, wall, cpu = run_detector(
+            images, warmup, model=model, num_threads=num_threads
+        )
+        people = [found.select('person') for found in detections]
+        if truth is None:
+            truth = people
+        # Without labels the first model's people are taken as there.
+
+        latency_ms = percentiles([latency * 1000 for latency in latencies])
+        if reference_p50 is None:
+            reference_p50 = latency_ms['p50']
+        variant = MODEL_VARIANTS.get(model)
+
+        present = [len(expected) > 0 for expected in truth]
+        found = [len(person) > 0 for person in people]
+        present_frames = sum(present)
+        empty_frames = len(images) - present_frames
+        expected_boxes = sum(len(expected) for expected in truth)
+        matched = sum(box_agreement(expected, person)
+                      for expected, person in zip(truth, people))
+        # Recall counts the frames with a person in that the model
+        # found someone in, and the people whose boxes it matched.
+        # False alarms are frames without anyone that it found
+        # someone in.
+
+        results.append({
+            'model': model,
+            'path': variant.path if variant is not None else model,
+            'input_size': (list(variant.input_size)
+                           if variant is not None else None),
+            'quantized': variant.quantized if variant is not None else None,
+            'fps': len(images) / wall,
+            'latency_ms': latency_ms,
+            'cpu_ms_per_frame': cpu / len(images) * 1000,
+            'speedup': reference_p50 / latency_ms['p50'],
+            'person_recall': (sum(p and f for p, f in zip(present, found))
+                              / present_frames if present_frames else None),
+            'box_recall': (matched / expected_boxes
+                           if expected_boxes else None),
+            'false_alarms': (sum(f and not p for p, f in zip(present, found))
+                             / empty_frames if empty_frames else None)
+        })
+
+    return dict(_machine(images), truth='labels' if labels else models[0],
+                results=results)
+
+
+def print_model_comparison(report: dict):
+    """Prints the model comparison's results in a readable form.
+
+    :param report: The report made by `model_comparison`
+    :type report: dict
+    """
+
+    def ratio(value):
+        """Formats a ratio that may not be known."""
+        return f'{value:>8.2f}' if value is not None else f'{"-":>8}'
+
+    print(f'{report["frames"]} frames of {report["frame_size"]} on '
+          f'{report["machine"]} with {report["cpu_count"]} cores, people '
+          f'taken from {report["truth"]}.')
+    print(f'{"model":<26}{"fps":>7}{"p50":>8}{"p95":>8}{"speedup":>8}'
+          f'{"recall":>8}{"boxes":>8}{"false":>8}')
+    for result in report['results']:
+        latency = result['latency_ms']
+        print(f'{os.path.splitext(os.path.basename(result["model"]))[0]:<26}'
+              f'{result["fps"]:>7.1f}{latency["p50"]:>8.1f}'
+              f'{latency["p95"]:>8.1f}{result["speedup"]:>7.2f}x'
+              f'{ratio(result["person_recall"])}'
+              f'{ratio(result["box_recall"])}'
+              f'{ratio(result["false_alarms"])}')
+
+
+def _list_of(kind):
+    """Makes a command line option type that reads a comma separated
+    list of values.
+    """
+
+    def parse(text: str):
+        """Reads the values."""
+        return [kind(value) for value in text.split(',')]
+    return parse
+
+
+def _input_size(text: str):
+    """Reads an input size such as 320x320, or full for None."""
+    if text == 'full':
+        return None
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    """Runs the benchmarks named on the command line, or all but the
+    detector grid and the model comparison, which need recorded frames
+    and models.
+    """
+
+    benchmarks = {
+        'display': display_benchmark,
+        'preprocess': preprocess_benchmark,
+        'detector': None,
+        'models': None
+    }
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help=f'the benchmarks to run, {", ".join(benchmarks)}')
+    detector_options = parser.add_argument_group(
+        'detector grid and model comparison'
+    )
+    detector_options.add_argument(
+        '--frames', help='a video file or a folder of images to scan'
+    )
+    detector_options.add_argument(
+        '--limit', type=int, default=100,
+        help='the most frames scanned, defaults to 100'
+    )
+    detector_options.add_argument(
+        '--upright', action='store_true',
+        help='the frames are already the right way up'
+    )
+    detector_options.add_argument(
+        '--models', type=_list_of(str),
+        default=['./models/efficientdet_lite0.tflite'],
+        help='comma separated model paths'
+    )
+    detector_options.add_argument(
+        '--input-sizes', type=_list_of(_input_size), default=[(320, 320)],
+        help='comma separated input sizes, such as 320x320,full'
+    )
+    detector_options.add_argument(
+        '--threads', type=_list_of(int), default=[4],
+        help='comma separated CPU thread counts'
+    )
+    detector_options.add_argument(
+        '--max-results', type=_list_of(int), default=[3],
+        help='comma separated most objects kept per scan'
+    )
+    detector_options.add_argument(
+        '--scores', type=_list_of(float), default=[0.5],
+        help='comma separated score thresholds'
+    )
+    detector_options.add_argument(
+        '--variants', type=_list_of(str), default=list(MODEL_VARIANTS),
+        help='comma separated models compared, names or paths'
+    )
+    detector_options.add_argument(
+        '--labels', help='a json file of the people in each frame'
+    )
+    detector_options.add_argument(
+        '--json', metavar='PATH',
+        help='also write the report as json, - to print it instead'
+    )
+    args = parser.parse_args()
+    names = args.names or [name for name in benchmarks
+                           if benchmarks[name] is not None]
+    for name in names:
+        if name not in benchmarks:
+            parser.error(f'unknown benchmark {name}')
+
+    for name in names:
+        if benchmarks[name] is None:
+            if not args.frames:
+                parser.error(f'the {name} benchmark needs --frames')
+            images = load_frames(args.frames, args.limit, args.upright)
+            if name == 'detector':
+                report = detector_grid(
+                    images, args.models, args.input_sizes, args.threads,
+                    args.max_results, args.scores
+                )
+                printer = print_detector_grid
+            else:
+                report = model_comparison(
+                    images, args.variants,
+                    load_labels(args.labels)[:len(images)]
+                    if args.labels else None, args.threads[0]
+                )
+                printer = print_model_comparison
+            if args.json == '-':
+                print(json.dumps(report, indent=2))
+            else:
+                printer(report)
+            if args.json and args.json != '-':
+                with open(args.json, 'w') as outfile:
+                    json.dump(report, outfile, indent=2)
+            # The first values or model given make up the reference,
+            # and the json can be kept to compare releases.
+        else:
+            print(f'{name}:')
+            results = benchmarks[name]()
+            baseline = max(result[0] for result in results.values())
+            for mode, result in results.items():
+                average, p95 = result[:2]
+                line = (f'  {mode:<18}{average:>8.3f}ms avg '
+                        f'{p95:>8.3f}ms p95 '
+                        f'saves {baseline - average:>7.3f}ms per frame')
+                if len(result) > 2:
+                    line += f', {result[2]:.0f}KiB allocated'
+                print(line)
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
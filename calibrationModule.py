@@ -0,0 +1,253 @@
+"""This module's purpose is to measure how far the camera's view moves
+for each change in the servos' pulse widths, storing it as a lookup
+table so the turret can aim straight at a target in one move.
+"""
+
+import json  # For storing the table on disk.
+import time  # To wait between camera frames.
+from bisect import bisect_left  # For searching the table.
+# imports the necessary code.
+
+
+class CalibrationTable:
+    """Holds, for each axis, how many pixels the view moves for a set
+    of pulse width changes, and interpolates between them to find the
+    pulse width change that moves a target by a given amount of pixels.
+
+    :param axes: For each axis name, a list of (pixel shift, pulse
+        width change) pairs
+    :type axes: dict
+    :param frame_size: The width and height of the frames the table
+        was measured on, defaults to (640, 480)
+    :type frame_size: tuple, optional
+    """
+
+    def __init__(self, axes: dict, frame_size: tuple = (640, 480)):
+        """Constructs the class"""
+        self.frame_size = tuple(frame_size)
+        self.axes = {}
+        for axis, pairs in axes.items():
+            pairs = sorted(pairs)
+            self.axes[axis] = (
+                [float(shift) for shift, _ in pairs],
+                [float(change) for _, change in pairs]
+            )
+        # Keeps each axis as two lists sorted by pixel shift, so a
+        # lookup is a binary search and an interpolation.
+
+    def pulse_for(self, axis: str, pixels: float):
+        """Finds the pulse width change that moves the view by an
+        amount of pixels.
+
+        :param axis: The axis name
+        :type axis: str
+        :param pixels: The pixels the view should move
+        :type pixels: float
+
+        :return: The pulse width change
+        :rtype: float
+        """
+
+        shifts, changes = self.axes[axis]
+        index = bisect_left(shifts, pixels)
+        index = min(max(index, 1), len(shifts) - 1)
+        # Picks the two points either side of the shift, using the
+        # outermost two when it's beyond the table.
+
+        low_shift, high_shift = shifts[index - 1], shifts[index]
+        low_change, high_change = changes[index - 1], changes[index]
+        if high_shift == low_shift:
+            return low_change
+        return low_change + (pixels - low_shift) * (
+            (high_change - low_change) / (high_shift - low_shift)
+        )
+
+    def save(self, path: str):
+        """Stores the table as json.
+
+        :param path: The path of the file
+        :type path: str
+        """
+
+        data = {
+            'frame_size': list(self.frame_size),
+            'upright': True,
+            'axes': {
+                axis: [list(pair) for pair in zip(shifts, changes)]
+                for axis, (shifts, changes) in self.axes.items()
+            }
+        }
+        with open(path, 'w') as outfile:
+            json.dump(data, outfile, indent=2)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a table stored by `save`.
+
+        :param path: The path of the file
+        :type path: str
+
+        :raises ValueError: If the table wasn't measured on upright
+            frames, as the turret aims on
+
+        :return: The table
+        :rtype: class`CalibrationTable`
+        """
+
+        with open(path) as infile:
+            data = json.load(infile)
+        if not data.get('upright'):
+            raise ValueError(f'{path} was not measured on upright frames, '
+                             'rerun calibrationModule.py')
+        return cls(data['axes'], data['frame_size'])
+
+
+def measure_shift(before, after):
+    """Measures how far the view moved between two frames.
+
+    :param before: The frame before the move
+    :type before: class`numpy.ndarray`
+    :param after: The frame after the move
+    :type after: class`numpy.ndarray`
+
+    :return: The x and y shift in pixels, and how confident the match
+        is from 0 to 1
+    :rtype: tuple
+    """
+
+    import cv2
+    # Only needed when calibrating.
+
+    grey_before = cv2.cvtColor(before, cv2.COLOR_BGR2GRAY).astype('float32')
+    grey_after = cv2.cvtColor(after, cv2.COLOR_BGR2GRAY).astype('float32')
+    window = cv2.createHanningWindow(grey_before.shape[::-1], cv2.CV_32F)
+    (shift_x, shift_y), response = cv2.phaseCorrelate(
+        grey_before, grey_after, window
+    )
+    return shift_x, shift_y, response
+
+
+def calibrate(camera, actuator, axis: str, home: int, changes: list,
+              min_response: float = 0.1, flip: bool = True, logger=None):
+    """Moves one servo through a set of pulse width changes from its
+    home, measuring how far the view shifts for each.
+
+    :param camera: A started camera stream
+    :type camera: class`cameraModule.CameraStream`
+    :param actuator: A started actuator owning the servo
+    :type actuator: class`actuatorModule.ServoActuator`
+    :param axis: The servo's name, `x` or `y`
+    :type axis: str
+    :param home: The pulse width each change is made from
+    :type home: int
+    :param changes: The pulse width changes to measure
+    :type changes: list
+    :param min_response: The least confidence a measurement needs to
+        be kept, defaults to 0.1
+    :type min_response: float, optional
+    :param flip: If the camera's frames are upside down, as captured by
+        the turret's camera, and are turned upright before measuring,
+        defaults to True
+    :type flip: bool, optional
+    :param logger: An optional logger addon to log the measurements,
+        defaults to None
+    :type logger: class`logging.logger`, optional
+
+    :raises RuntimeError: If the camera gives no frames
+    :return: The (pixel shift, pulse width change) pairs, measured on
+        upright frames
+    :rtype: list
+    """
+
+    import cv2
+    # Only needed when calibrating.
+
+    def settled_frame(attempts: int = 3):
+        """Waits for the servos to stop then grabs a fresh frame,
+        turned upright, giving the camera a few read timeouts.
+        """
+        actuator.wait_reached(axis, timeout=5)
+        settled_at = time.monotonic()
+        for _ in range(attempts):
+            frame = camera.read()
+            while frame is not None and frame.timestamp < settled_at:
+                frame = camera.read()
+            if frame is not None:
+                return cv2.flip(frame.img, -1) if flip else frame.img
+        raise RuntimeError(
+            'Unable to read from webcam while calibrating. '
+            'Please verify your webcam in config.py.'
+        )
+
+    pairs = [(0.0, 0.0)]
+    for change in changes:
+        actuator.set_target(axis, home)
+        before = settled_frame()
+        actuator.set_target(axis, home + change)
+        after = settled_frame()
+        # Takes a frame at home and one after the move, both only
+        # once the servo has stopped.
+
+        shift_x, shift_y, response = measure_shift(before, after)
+        shift = shift_x if axis == 'x' else shift_y
+        if logger is not None:
+            logger.info(f' Calibrating {axis}: {change:+d} us moved the '
+                        f'view {shift:+.1f} px ({response:.2f}).')
+        if response >= min_response:
+            pairs.append((shift, change))
+        # A target moves across the frame with the view, so the shift
+        # is how far the change corrects a target's pixel error. The
+        # frames are upright as the aim errors are, an upside down
+        # frame would have every shift the wrong way round. Poor
+        # matches, such as on a blank wall, are thrown away.
+
+    actuator.set_target(axis, home)
+    return pairs
+
+
+def main():
+    """Calibrates the turret, storing the table at
+    `config.calibration_file`. Point the turret at a still, detailed
+    scene before running.
+    """
+
+    import pigpio
+    import config
+    from main import PWMGpio
+    from actuatorModule import ServoActuator
+    from cameraModule import CameraStream
+    # Only needed when calibrating on the turret.
+
+    pwm = pigpio.pi()
+    actuator = ServoActuator(
+        {'x': PWMGpio(pwm, 18, 50), 'y': PWMGpio(pwm, 27, 50)},
+        servo_speed=config.servo_speed
+    ).start()
+    camera = CameraStream(config.camera_id, (640, 480)).start()
+
+    try:
+        axes = {
+            'x': calibrate(camera, actuator, 'x', 1500,
+                           list(range(-300, 301, 50))),
+            'y': calibrate(camera, actuator, 'y', 2000,
+                           list(range(-200, 201, 25)))
+        }
+        # Measures both axes from the middle of their safe ranges.
+    finally:
+        camera.stop()
+        actuator.stop()
+        pwm.stop()
+
+    table = CalibrationTable(axes, camera.size)
+    table.save(config.calibration_file)
+    for axis, (shifts, changes) in table.axes.items():
+        print(f'{axis}: ' + ', '.join(
+            f'{shift:+.0f}px={change:+.0f}us'
+            for shift, change in zip(shifts, changes)
+        ))
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
@@ -0,0 +1,215 @@
+"""This module's purpose is to read the camera on its own thread so
+that the newest frame is always ready, no matter how slow the program
+consuming the frames is.
+"""
+
+import cv2  # For camera functionality.
+import time  # To get the time frames were captured.
+import threading  # To read the camera in the background.
+# imports the necessary code.
+
+
+class Frame:
+    """Holds a single captured image alongside when it was captured
+    and its place in the capture order.
+
+    :param img: The captured image
+    :type img: class`numpy.ndarray`
+    :param timestamp: The `time.monotonic` time the frame was read
+    :type timestamp: float
+    :param seq: The sequence number of the frame, starting at 1
+    :type seq: int
+    """
+
+    __slots__ = ('img', 'timestamp', 'seq')
+
+    def __init__(self, img, timestamp: float, seq: int):
+        """Constructs the class"""
+        self.img = img
+        self.timestamp = timestamp
+        self.seq = seq
+
+
+class CameraStream:
+    """Continuously reads a camera on a background thread, only ever
+    holding onto the newest frame so that consumers never work on a
+    stale image.
+
+    :param camera_id: The id of the camera to be opened
+    :type camera_id: int
+    :param size: The width and height of the capture, defaults to
+        (640, 480)
+    :type size: tuple, optional
+    :param max_failures: The amount of reads in a row that can fail
+        before the stream gives up, defaults to 30
+    :type max_failures: int, optional
+    :param logger: An optional logger addon to log the stream, defaults
+        to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time camera reads into,
+        defaults to None
+    :type metrics: class`metricsModule.Metrics`, optional
+    :param name: The name the camera's timings are labelled with,
+        defaults to None
+    :type name: str, optional
+    """
+
+    def __init__(self,
+                 camera_id: int,
+                 size: tuple = (640, 480),
+                 max_failures: int = 30,
+                 logger=None,
+                 metrics=None,
+                 name: str = None):
+        """Constructs the class"""
+        self.camera_id = camera_id
+        self.name = name
+        self.size = size
+        self.max_failures = max_failures
+        self.logger = logger
+        self.metrics = metrics
+
+        self.captured = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.overruns = 0
+        self.failed_reads = 0
+        # Counters, captured and consumed count frames read from the
+        # camera and handed out. dropped counts frames that were
+        # replaced before anything read them, and overruns counts the
+        # times a consumer fell behind and missed at least one frame.
+
+        self._frame = None
+        self._last_seq = 0
+        self._error = None
+        self._running = False
+        self._thread = None
+        self._cond = threading.Condition()
+        # The newest frame and the state shared with the capture
+        # thread, all guarded by the condition.
+
+        self.cap = cv2.VideoCapture(self.camera_id)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # Sets the camera up for opencv, limits the camera resolution
+        # for resource usage and asks the driver to keep as few frames
+        # buffered as possible.
+
+    def start(self):
+        """Starts the capture thread.
+
+        :return: The stream itself, so it can be started on creation
+        :rtype: class`CameraStream`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._update, name=f'camera-{self.camera_id}',
+            daemon=True
+        )
+        self._thread.start()
+        if self.logger is not None:
+            self.logger.info(f' Camera {self.camera_id} capture started.')
+        return self
+
+    def _update(self):
+        """Reads the camera for as long as the stream is running,
+        replacing the held frame every time.
+        """
+
+        failures = 0
+        while self._running:
+            read_start = time.perf_counter()
+            success, img = self.cap.read()
+            timestamp = time.monotonic()
+            if self.metrics is not None:
+                self.metrics.observe('capture',
+                                     time.perf_counter() - read_start,
+                                     self.name)
+
+            if not success:
+                failures += 1
+                self.failed_reads += 1
+                if failures >= self.max_failures:
+                    with self._cond:
+                        self._error = RuntimeError(
+                            'Unable to read from webcam. '
+                            'Please verify your webcam in config.py.'
+                        )
+                        self._running = False
+                        self._cond.notify_all()
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            # Gives the camera a few chances before raising the same
+            # error the program used to raise on a bad read.
+
+            with self._cond:
+                self.captured += 1
+                if (self._frame is not None
+                        and self._frame.seq > self._last_seq):
+                    self.dropped += 1
+                self._frame = Frame(img, timestamp, self.captured)
+                self._cond.notify_all()
+            # Swaps in the newest frame, counting the previous one as
+            # dropped if it was never read.
+
+        if self.logger is not None:
+            self.logger.info(f' Camera {self.camera_id} capture stopped.')
+
+    def read(self, timeout: float = 2.0):
+        """Waits for a frame newer than the last one read and returns
+        it.
+
+        :param timeout: The maximum amount of seconds to wait for a new
+            frame, defaults to 2.0
+        :type timeout: float, optional
+
+        :raises RuntimeError: If the camera stopped working
+        :return: The newest frame, or None if none arrived in time
+        :rtype: class`Frame`
+        """
+
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: (self._error is not None
+                             or (self._frame is not None
+                                 and self._frame.seq > self._last_seq)),
+                    timeout):
+                return None
+            if self._error is not None:
+                raise self._error
+
+            frame = self._frame
+            if frame.seq - self._last_seq > 1 and self._last_seq != 0:
+                self.overruns += 1
+            self._last_seq = frame.seq
+            self.consumed += 1
+        return frame
+
+    def stats(self):
+        """Returns the stream's counters.
+
+        :return: The captured, consumed, dropped, overrun and failed
+            read counts
+        :rtype: dict
+        """
+
+        return {
+            'captured': self.captured,
+            'consumed': self.consumed,
+            'dropped': self.dropped,
+            'overruns': self.overruns,
+            'failed_reads': self.failed_reads
+        }
+
+    def stop(self):
+        """Stops the capture thread and releases the camera."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.cap.release()
@@ -0,0 +1,386 @@
+"""This module's purpose is to keep the last few seconds of frames in
+memory, shrunk and compressed, so an alert can show what happened
+before and after its trigger without the turret pausing to wait for
+the intruder to walk into frame.
+"""
+
+import cv2  # For shrinking, encoding and tiling frames.
+import math  # To lay out the contact sheet.
+import time  # To time encoding and to wait for the frames after a trigger.
+import threading  # To encode and assemble in the background.
+from collections import deque  # For the ring of frames.
+import numpy as np  # For the contact sheet.
+# imports the necessary code.
+
+
+def contact_sheet(frames: list, trigger_time: float, columns: int = 4,
+                  max_tiles: int = 12):
+    """Tiles frames into one image, each labelled with its time from the
+    trigger, the frame closest to the trigger outlined in red.
+
+    :param frames: The timestamp and encoded image of each frame, oldest
+        first
+    :type frames: list
+    :param trigger_time: The monotonic time of the trigger
+    :type trigger_time: float
+    :param columns: The most tiles per row, defaults to 4
+    :type columns: int, optional
+    :param max_tiles: The most frames shown, picked evenly from the
+        frames given, defaults to 12
+    :type max_tiles: int, optional
+
+    :return: The contact sheet, or None if there were no frames
+    :rtype: class`numpy.ndarray`
+    """
+
+    if not frames:
+        return None
+    if len(frames) > max_tiles:
+        step = (len(frames) - 1) / (max_tiles - 1)
+        frames = [frames[round(i * step)] for i in range(max_tiles)]
+    # Spreads the tiles evenly over the whole window, keeping the first
+    # and last frames.
+
+    tiles = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+             for _, data in frames]
+    tile_h, tile_w = tiles[0].shape[:2]
+    columns = min(columns, len(tiles))
+    rows = math.ceil(len(tiles) / columns)
+    sheet = np.zeros((rows * tile_h, columns * tile_w, 3), dtype=np.uint8)
+    closest = min(range(len(frames)),
+                  key=lambda i: abs(frames[i][0] - trigger_time))
+
+    for i, (tile, (timestamp, _)) in enumerate(zip(tiles, frames)):
+        x = i % columns * tile_w
+        y = i // columns * tile_h
+        sheet[y:y + tile_h, x:x + tile_w] = cv2.resize(
+            tile, (tile_w, tile_h)
+        ) if tile.shape[:2] != (tile_h, tile_w) else tile
+        cv2.putText(sheet, f'{timestamp - trigger_time:+.1f}s',
+                    (x + 6, y + 18), cv2.FONT_HERSHEY_PLAIN, 1.2,
+                    (0, 0, 255), 1)
+        if i == closest:
+            cv2.rectangle(sheet, (x, y), (x + tile_w - 1, y + tile_h - 1),
+                          (0, 0, 255), 2)
+    # Places each frame in reading order with how long before or after
+    # the trigger it was taken.
+
+    return sheet
+
+
+class FrameRing:
+    """Keeps recent frames as small JPEGs within a memory budget. The
+    loop hands over a frame every `interval` seconds without waiting,
+    the frame being shrunk, turned upright and encoded on a background
+    thread. A capture asked for on a trigger is assembled into a
+    contact sheet on the same thread once the frames after the trigger
+    have arrived, so the loop never pauses for it.
+
+    :param max_bytes: The most memory the encoded frames may take up,
+        the oldest being dropped first, defaults to 4MiB
+    :type max_bytes: int, optional
+    :param interval: The seconds between frames kept, defaults to 0.25
+    :type interval: float, optional
+    :param before: The seconds of frames before a trigger shown,
+        defaults to 3
+    :type before: float, optional
+    :param after: The seconds of frames after a trigger shown, defaults
+        to 3
+    :type after: float, optional
+    :param scale: How much frames are shrunk by before being kept,
+        defaults to 0.5
+    :type scale: float, optional
+    :param quality: The JPEG quality frames are kept at, defaults to 70
+    :type quality: int, optional
+    :param columns: The most tiles per row of a contact sheet, defaults
+        to 4
+    :type columns: int, optional
+    :param logger: An optional logger addon to log captures, defaults
+        to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time encoding and assembling
+        into, defaults to None
+    :type metrics: class`metricsModule.Metrics`, optional
+    """
+
+    def __init__(self,
+                 max_bytes: int = 4 * 1024 * 1024,
+                 interval: float = 0.25,
+                 before: float = 3,
+                 after: float = 3,
+                 scale: float = 0.5,
+                 quality: int = 70,
+                 columns: int = 4,
+                 logger=None,
+                 metrics=None):
+        """Constructs the class"""
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.before = before
+        self.after = after
+        self.scale = scale
+        self.quality = quality
+        self.columns = columns
+        self.logger = logger
+        self.metrics = metrics
+
+        self.total_bytes = 0
+        self.added = 0
+        self.skipped = 0
+        self.evicted = 0
+        self.sheets = 0
+        # The size of the kept frames, and counters of frames handed
+        # over, frames replaced before they were encoded, frames
+        # dropped to stay within the budget and sheets assembled.
+
+        self._frames = deque()
+        self._pending = None
+        self._captures = []
+        self._last_added = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        # The kept frames as (timestamp, JPEG) oldest first, the frame
+        # waiting to be encoded and the captures waiting for their
+        # frames after the trigger.
+
+    def start(self):
+        """Starts the background thread.
+
+        :return: The ring itself, so it can be started on creation
+        :rtype: class`FrameRing`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='frame-ring', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def add(self, img, timestamp: float, flip: bool = False):
+        """Hands over a frame to be kept, never waiting. Frames within
+        `interval` of the last one kept are ignored. The image mustn't
+        be written to afterwards, as it's encoded later.
+
+        :param img: The frame as captured
+        :type img: class`numpy.ndarray`
+        :param timestamp: The monotonic time the frame was captured
+        :type timestamp: float
+        :param flip: If the frame is upside down, defaults to False
+        :type flip: bool, optional
+
+        :return: True if the frame is kept
+        :rtype: bool
+        """
+
+        with self._cond:
+            if (self._last_added is not None
+                    and timestamp - self._last_added < self.interval):
+                return False
+            self._last_added = timestamp
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = (img, timestamp, flip)
+            self.added += 1
+            self._cond.notify()
+        return True
+
+    def capture(self, trigger_time: float, callback):
+        """Asks for a contact sheet of the frames around a trigger,
+        returning straight away.
+
+        :param trigger_time: The monotonic time of the trigger
+        :type trigger_time: float
+        :param callback: Called from the ring's thread with the contact
+            sheet once the frames after the trigger are kept, or with
+            None if there are no frames at all
+        :type callback: function
+        """
+
+        with self._cond:
+            self._captures.append((trigger_time, callback))
+            self._cond.notify()
+
+    def _encode(self, img, flip: bool):
+        """Shrinks, turns upright and encodes a frame.
+
+        :return: The encoded frame
+        :rtype: bytes
+        """
+
+        if self.scale != 1.0:
+            img = cv2.resize(img, None, fx=self.scale, fy=self.scale,
+                             interpolation=cv2.INTER_AREA)
+        if flip:
+            img = cv2.flip(img, -1)
+        success, buffer = cv2.imencode(
+            '.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        )
+        return buffer.tobytes() if success else None
+
+    def _keep(self, timestamp: float, data: bytes):
+        """Adds an encoded frame, dropping the oldest ones past the
+        memory budget or too old to be shown, call with the lock held.
+        """
+
+        self._frames.append((timestamp, data))
+        self.total_bytes += len(data)
+        while self._frames and (
+                self.total_bytes > self.max_bytes
+                or timestamp - self._frames[0][0]
+                > self.before + self.after + self.interval):
+            self.total_bytes -= len(self._frames.popleft()[1])
+            self.evicted += 1
+
+    def _ready(self, stopping: bool):
+        """Takes the captures whose frames after the trigger are all
+        kept, along with their frames, call with the lock held.
+
+        :return: The trigger time, callback and frames of each capture
+        :rtype: list
+        """
+
+        newest = self._frames[-1][0] if self._frames else None
+        now = time.monotonic()
+        ready = []
+        waiting = []
+        for trigger_time, callback in self._captures:
+            end = trigger_time + self.after
+            if (stopping or (newest is not None and newest >= end)
+                    or now >= end + 1):
+                frames = [frame for frame in self._frames
+                          if trigger_time - self.before <= frame[0] <= end]
+                if not frames and self._frames:
+                    frames = [self._frames[-1]]
+                ready.append((trigger_time, callback, frames))
+            else:
+                waiting.append((trigger_time, callback))
+        # A capture gives up waiting a second after its window has
+        # passed, in case the camera stopped, and uses the newest frame
+        # if none fall within its window.
+
+        self._captures = waiting
+        return ready
+
+    def _run(self):
+        """Encodes frames and assembles contact sheets for as long as
+        the ring is running.
+        """
+
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: (not self._running or self._pending is not None
+                             or self._captures), timeout=0.5
+                )
+                pending = self._pending
+                self._pending = None
+                stopping = not self._running
+
+            if pending is not None:
+                img, timestamp, flip = pending
+                encode_start = time.perf_counter()
+                data = self._encode(img, flip)
+                if self.metrics is not None:
+                    self.metrics.observe(
+                        'ring_encode', time.perf_counter() - encode_start
+                    )
+                if data is not None:
+                    with self._cond:
+                        self._keep(timestamp, data)
+
+            with self._cond:
+                ready = self._ready(stopping)
+            for trigger_time, callback, frames in ready:
+                sheet_start = time.perf_counter()
+                sheet = contact_sheet(frames, trigger_time, self.columns)
+                if self.metrics is not None:
+                    self.metrics.observe(
+                        'contact_sheet', time.perf_counter() - sheet_start
+                    )
+                if sheet is not None:
+                    self.sheets += 1
+                try:
+                    callback(sheet)
+                except Exception:
+                    if self.logger is not None:
+                        self.logger.exception(' Unable to handle a '
+                                              'contact sheet.')
+            # Assembles sheets outside the lock so frames keep being
+            # handed over meanwhile.
+
+            if stopping:
+                break
+
+    def stats(self):
+        """Returns the ring's counters.
+
+        :return: The frames and bytes kept, the budget, the frames
+            handed over, skipped and dropped, and the sheets assembled
+        :rtype: dict
+        """
+
+        with self._cond:
+            return {
+                'frames': len(self._frames),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'added': self.added,
+                'skipped': self.skipped,
+                'evicted': self.evicted,
+                'sheets': self.sheets
+            }
+
+    def stop(self, timeout: float = 5):
+        """Assembles the captures still waiting with the frames already
+        kept, then stops the thread.
+        """
+
+        if self._thread is None:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+
+
+def main():
+    """Starts some module tests, keeping a few seconds of a box moving
+    across upside down frames and writing the contact sheet of a
+    trigger halfway through to `contact-sheet-test.jpg`.
+    """
+
+    ring = FrameRing(interval=0.2, before=1, after=1).start()
+    done = threading.Event()
+
+    def save(sheet):
+        """Writes the contact sheet."""
+        cv2.imwrite('contact-sheet-test.jpg', sheet)
+        print(f'Contact sheet {sheet.shape[1]}x{sheet.shape[0]} written '
+              f'{time.monotonic() - trigger_time:.2f}s after the trigger.')
+        done.set()
+
+    trigger_time = None
+    for i in range(60):
+        img = np.full((480, 640, 3), 40, dtype=np.uint8)
+        cv2.rectangle(img, (600 - i * 10, 150), (660 - i * 10, 330),
+                      (255, 255, 255), -1)
+        ring.add(img, time.monotonic(), flip=True)
+        if i == 30:
+            trigger_time = time.monotonic()
+            ring.capture(trigger_time, save)
+        time.sleep(1 / 15)
+        # 4 seconds at 15 fps, triggering 2 seconds in.
+
+    done.wait(5)
+    ring.stop()
+    print(ring.stats())
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
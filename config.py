@@ -1,14 +1,145 @@
 camera_id: int = 0
 # What camera will be scanning for object detection.
 
+extra_cameras: list = []
+flipped_cameras: list = []
+# The ids of any fixed cameras watched for people alongside the
+# turret's own, such as [1, 2], and which of them are mounted upside
+# down. They raise alerts tagged with their name, cam1 onwards in the
+# order listed, while the turret's camera is cam0.
+
+detector_pool_size: int = 0
+# How many object detectors the cameras share, each scanning on its
+# own thread and taking the cameras in turn. 0 uses one per camera up
+# to one per CPU core, and the cores are split between them.
+
 capture_folder: str = './captures'
 # The folder where images will be stored
 
+snapshot_format: str = '.jpg'
+snapshot_quality: int = 90
+snapshot_scale: float = 1.0
+# The format (.jpg, .png or .webp), quality (0-100) and resize scale
+# of the alert images. The image is encoded once and the same bytes
+# are emailed and saved.
+
+capture_max_files: int = 20
+capture_max_bytes: int = 0
+capture_max_age: float = 0
+# The limits of the capture folder by image count, total size in
+# bytes and image age in seconds, the oldest images are removed when
+# any is passed. 0 turns a limit off.
+
+incident_db: str = './incidents.db'
+incident_batch_size: int = 50
+incident_flush_interval: float = 1.0
+# The SQLite database every alert is recorded in, '' to not record
+# them. Incidents are written in the background, up to
+# incident_batch_size in one transaction after waiting at most
+# incident_flush_interval seconds for others. Query it with
+# `python incidentModule.py count --by day --since 7d`.
+
 email_receiver: str = ''
 email_addr: str = ''
 email_passwd: str = ''
 # What email will receive the security alerts and the credentials
 # of the sender email.
 
+smtp_domain: str = 'smtp.gmail.com'
+smtp_port: int = 465
+smtp_ssl: bool = True
+# The smtp server the alerts are sent through, SSL can be turned off
+# to test against a local smtp server.
+
+alert_coalesce_window: float = 5
+# Alerts raised within this many seconds of each other are merged
+# into one email.
+
+motion_threshold: int = 25
+motion_min_changed: float = 0.01
+detector_keep_alive: float = 30
+# The object detector only runs when at least motion_min_changed of
+# the scene changes by more than motion_threshold (out of 255), or
+# every detector_keep_alive seconds when nothing is changing.
+
+detector_latency_budget: float = 0.2
+detector_max_interval: float = 2.0
+# The target amount of seconds between detector scans while a person
+# is tracked, and the longest wait between scans when nobody is.
+
+roi_scans: bool = True
+roi_full_scan_every: int = 5
+# While a person is followed only the area around them is scanned,
+# with a full frame scan at least every roi_full_scan_every scans.
+
+aim_controller: str = 'pid'
+aim_x_settings: dict = {}
+aim_y_settings: dict = {}
+# How the turret aims, 'pid', 'proportional', 'table' or 'step', the
+# original fixed jumps, which default to {'jump': 50} on x and
+# {'jump': 20} on y. The settings are passed to the controller of each
+# axis, such as {'kp': 0.9}.
+
+calibration_file: str = './calibration.json'
+# The calibration table used by the 'table' aim controller, made by
+# running calibrationModule.py on the turret.
+
+aim_x_range: tuple = (750, 2250)
+aim_y_range: tuple = (1750, 2250)
+# The safe pulse width ranges the x and y servos are kept within.
+
 turret_active: bool = True
 # Used to activate the turret, less laggy with it off (mainly for fun).
+
+servo_speed: float = 3000
+# How many microseconds of pulse width the servos move through per
+# second, used to know when the turret has settled without sleeping.
+
+detector_model: str = 'efficientdet_lite0'
+detector_input_size: tuple = None
+# The detection model, either a name from MODEL_VARIANTS in
+# objectDetectionModule.py such as 'efficientdet_lite0_int8' for the
+# quicker quantized model, or the path of a .tflite file. Frames are
+# shrunk to the model's input size before being handed over and boxes
+# are scaled back up to the full frame. detector_input_size overrides
+# the input size, None uses the variant's own or hands frames over at
+# full size for a model given by path. Compare the variants with
+# `python benchmarkModule.py models --frames footage.mp4`.
+
+headless: bool = False
+# Skips the camera window and the overlays drawn onto every frame for
+# it, for a turret running without a monitor. Boxes are still drawn
+# onto the copies attached to alerts.
+
+clip_ring_bytes: int = 4 * 1024 * 1024
+clip_interval: float = 0.25
+clip_before: float = 3
+clip_after: float = 3
+clip_scale: float = 0.5
+clip_quality: int = 70
+# Door and motion alerts carry a contact sheet of the frames from
+# clip_before seconds before the trigger to clip_after seconds after
+# it, put together in the background while the turret carries on. A
+# frame is kept every clip_interval seconds, shrunk by clip_scale and
+# compressed at clip_quality, the oldest being dropped once they take
+# up clip_ring_bytes of memory. 0 bytes sends only the frame at the
+# trigger instead.
+
+input_debounce: float = 0.05
+# The seconds the door and motion sensor pins have to settle for
+# before another change on them counts, filtering out switch bounce.
+
+log_folder: str = './logs'
+log_rate_limit: float = 1.0
+# The folder where logs will be stored, and the minimum amount of
+# seconds between two of the same message logged from the loop.
+
+metrics_port: int = 9464
+metrics_file: str = ''
+metrics_interval: float = 10
+# The localhost port the per-stage timings and counters are served on
+# at /metrics in the Prometheus text format, None to not serve them.
+# Avoid 9100, node_exporter's port on many Pis. A port already in use
+# is logged and the turret carries on without serving. If a
+# metrics_file path is set they're also written there every
+# metrics_interval seconds.
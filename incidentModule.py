@@ -0,0 +1,469 @@
+"""This module's purpose is to keep a record of every alert in an
+SQLite database, written in batches from a background thread so the
+turret never waits on the disk, and to answer questions about them
+from the command line.
+
+Run from the project folder, for example:
+`python incidentModule.py list --trigger person --since 7d`
+`python incidentModule.py count --by day --since 30d`
+`python incidentModule.py count --by trigger --since 2026-10-01`
+"""
+
+import json  # To store the detections of an incident.
+import time  # To timestamp incidents and to time writes.
+import queue  # To hold incidents waiting to be written.
+import sqlite3  # For the incident database.
+import argparse  # For the command line options.
+import threading  # To write incidents in the background.
+# imports the necessary code.
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY,
+    trigger TEXT NOT NULL,
+    camera TEXT,
+    wall_time REAL NOT NULL,
+    monotonic REAL,
+    people INTEGER NOT NULL DEFAULT 0,
+    detections TEXT,
+    snapshot TEXT
+);
+CREATE INDEX IF NOT EXISTS incidents_wall_time
+    ON incidents (wall_time);
+CREATE INDEX IF NOT EXISTS incidents_trigger_wall_time
+    ON incidents (trigger, wall_time);
+CREATE INDEX IF NOT EXISTS incidents_camera_wall_time
+    ON incidents (camera, wall_time);
+'''
+# Incidents are nearly always looked up by time, on their own or
+# within a trigger type or camera, so each index ends in the time.
+
+GROUPS = {
+    'trigger': 'trigger',
+    'camera': "COALESCE(camera, '-')",
+    'day': "strftime('%Y-%m-%d', wall_time, 'unixepoch', 'localtime')",
+    'hour': "strftime('%H', wall_time, 'unixepoch', 'localtime')",
+    'week': "strftime('%Y-W%W', wall_time, 'unixepoch', 'localtime')"
+}
+# What incidents can be counted by, the hour being the hour of the day
+# to show when incidents tend to happen.
+
+
+def connect(path: str):
+    """Opens the incident database, creating it if needed.
+
+    :param path: The path of the database file
+    :type path: str
+
+    :return: The connection
+    :rtype: class`sqlite3.Connection`
+    """
+
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    # Write ahead logging lets the command line read while the turret
+    # writes, and only syncs to disk at checkpoints.
+
+    return connection
+
+
+def detection_rows(detected):
+    """Turns detections into something that can be stored as json.
+
+    :param detected: The detections of a scan
+    :type detected: class`objectDetectionModule.DetectionSet`
+
+    :return: The label, score and box of each detection
+    :rtype: list
+    """
+
+    return [
+        {'label': str(label), 'score': round(float(score), 3), 'box': box}
+        for label, score, box in zip(detected.labels, detected.scores,
+                                     detected.boxes.tolist())
+    ]
+
+
+class IncidentStore:
+    """Records incidents into the database from a background thread.
+    Recording only queues the incident, the thread then writes whatever
+    has queued up within `flush_interval` seconds, up to `batch_size`
+    incidents, in a single transaction.
+
+    :param path: The path of the database file
+    :type path: str
+    :param batch_size: The most incidents written in one transaction,
+        defaults to 50
+    :type batch_size: int, optional
+    :param flush_interval: The most seconds an incident waits for
+        others to be written with, defaults to 1.0
+    :type flush_interval: float, optional
+    :param logger: An optional logger addon to log failed writes,
+        defaults to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time writes into, defaults to
+        None
+    :type metrics: class`metricsModule.Metrics`, optional
+    """
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int = 50,
+                 flush_interval: float = 1.0,
+                 logger=None,
+                 metrics=None):
+        """Constructs the class"""
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger
+        self.metrics = metrics
+
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        # Counters of incidents queued, incidents written, transactions
+        # and incidents lost to a failed write.
+
+        self._jobs = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Starts the background thread, which opens the database.
+
+        :return: The store itself, so it can be started on creation
+        :rtype: class`IncidentStore`
+        """
+
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(
+            target=self._run, name='incidents', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def record(self, trigger: str, wall_time: float = None,
+               monotonic: float = None, camera: str = None,
+               detected=None, snapshot: str = None):
+        """Queues an incident to be written, returning straight away.
+
+        :param trigger: What set the incident off, such as `door`,
+            `motion` or `person`
+        :type trigger: str
+        :param wall_time: The time since the epoch it happened, defaults
+            to now
+        :type wall_time: float, optional
+        :param monotonic: The monotonic time it happened, defaults to
+            now
+        :type monotonic: float, optional
+        :param camera: The name of the camera involved, defaults to None
+        :type camera: str, optional
+        :param detected: The detections involved, defaults to None
+        :type detected: class`objectDetectionModule.DetectionSet`,
+            optional
+        :param snapshot: The path of the alert's image, defaults to None
+        :type snapshot: str, optional
+        """
+
+        rows = detection_rows(detected) if detected is not None else []
+        self._jobs.put((
+            trigger, camera,
+            wall_time if wall_time is not None else time.time(),
+            monotonic if monotonic is not None else time.monotonic(),
+            sum(row['label'] == 'person' for row in rows),
+            json.dumps(rows) if rows else None,
+            snapshot
+        ))
+        self.recorded += 1
+
+    def _run(self):
+        """Writes queued incidents in batches until the store is
+        stopped, then writes whatever is left.
+        """
+
+        try:
+            connection = connect(self.path)
+        except sqlite3.Error:
+            if self.logger is not None:
+                self.logger.exception(f' Unable to open {self.path}.')
+            connection = None
+        # Incidents are still taken off the queue without a database so
+        # stopping never hangs, they're counted as failed instead.
+
+        stopping = False
+        while not stopping:
+            job = self._jobs.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._jobs.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            # Gathers whatever else arrives shortly after the first
+            # incident, None is queued last when stopping.
+
+            self._write(connection, batch)
+
+        if connection is not None:
+            connection.close()
+
+    def _write(self, connection, batch: list):
+        """Writes a batch of incidents in one transaction."""
+        write_start = time.perf_counter()
+        try:
+            if connection is None:
+                raise sqlite3.OperationalError('no database')
+            with connection:
+                connection.executemany(
+                    'INSERT INTO incidents (trigger, camera, wall_time, '
+                    'monotonic, people, detections, snapshot) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', batch
+                )
+        except sqlite3.Error:
+            self.failed += len(batch)
+            if self.logger is not None:
+                self.logger.exception(
+                    f' Unable to record {len(batch)} incidents.'
+                )
+            return
+        self.written += len(batch)
+        self.batches += 1
+        if self.metrics is not None:
+            self.metrics.observe('incident_write',
+                                 time.perf_counter() - write_start)
+
+    def stats(self):
+        """Returns the store's counters.
+
+        :return: The incidents queued, written and failed, the
+            transactions and the incidents waiting to be written
+        :rtype: dict
+        """
+
+        return {
+            'recorded': self.recorded,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'queued': self._jobs.qsize()
+        }
+
+    def stop(self, timeout: float = 5):
+        """Writes the incidents still queued then stops the thread."""
+        if self._thread is None:
+            return
+        self._jobs.put(None)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+
+def _where(trigger: str = None, camera: str = None, since: float = None,
+           until: float = None):
+    """Builds the conditions shared by the queries.
+
+    :return: The WHERE clause and its parameters
+    :rtype: tuple
+    """
+
+    conditions = []
+    params = []
+    for column, operator, value in (('trigger', '=', trigger),
+                                    ('camera', '=', camera),
+                                    ('wall_time', '>=', since),
+                                    ('wall_time', '<', until)):
+        if value is not None:
+            conditions.append(f'{column} {operator} ?')
+            params.append(value)
+    clause = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    return clause, params
+
+
+def query(connection, trigger: str = None, camera: str = None,
+          since: float = None, until: float = None, limit: int = 50):
+    """Gets incidents, newest first.
+
+    :param connection: The incident database
+    :type connection: class`sqlite3.Connection`
+    :param trigger: Only incidents set off by this, defaults to any
+    :type trigger: str, optional
+    :param camera: Only incidents on this camera, defaults to any
+    :type camera: str, optional
+    :param since: Only incidents from this time since the epoch on,
+        defaults to None
+    :type since: float, optional
+    :param until: Only incidents before this time since the epoch,
+        defaults to None
+    :type until: float, optional
+    :param limit: The most incidents returned, defaults to 50
+    :type limit: int, optional
+
+    :return: The incidents as dictionaries
+    :rtype: list
+    """
+
+    clause, params = _where(trigger, camera, since, until)
+    cursor = connection.execute(
+        'SELECT id, trigger, camera, wall_time, monotonic, people, '
+        f'detections, snapshot FROM incidents{clause} '
+        'ORDER BY wall_time DESC LIMIT ?', params + [limit]
+    )
+    columns = [column[0] for column in cursor.description]
+    incidents = []
+    for row in cursor:
+        incident = dict(zip(columns, row))
+        incident['detections'] = json.loads(incident['detections'] or '[]')
+        incidents.append(incident)
+    return incidents
+
+
+def aggregate(connection, by: str = 'trigger', trigger: str = None,
+              camera: str = None, since: float = None, until: float = None):
+    """Counts incidents in groups.
+
+    :param connection: The incident database
+    :type connection: class`sqlite3.Connection`
+    :param by: What to group by, one of `GROUPS`, defaults to `trigger`
+    :type by: str, optional
+    :param trigger: Only incidents set off by this, defaults to any
+    :type trigger: str, optional
+    :param camera: Only incidents on this camera, defaults to any
+    :type camera: str, optional
+    :param since: Only incidents from this time since the epoch on,
+        defaults to None
+    :type since: float, optional
+    :param until: Only incidents before this time since the epoch,
+        defaults to None
+    :type until: float, optional
+
+    :raises ValueError: If the grouping isn't known
+    :return: The group, incident count, people seen and first and last
+        time of each group, in group order
+    :rtype: list
+    """
+
+    if by not in GROUPS:
+        raise ValueError(f'Unknown grouping {by}.')
+    clause, params = _where(trigger, camera, since, until)
+    return connection.execute(
+        f'SELECT {GROUPS[by]} AS grouped, COUNT(*), SUM(people), '
+        f'MIN(wall_time), MAX(wall_time) FROM incidents{clause} '
+        'GROUP BY grouped ORDER BY grouped', params
+    ).fetchall()
+
+
+def parse_time(text: str):
+    """Turns a time given on the command line into seconds since the
+    epoch.
+
+    :param text: A time ago such as `7d`, `12h` or `30m`, or a local
+        date and optional time such as `2026-10-01` or
+        `2026-10-01 18:30`
+    :type text: str
+
+    :raises argparse.ArgumentTypeError: If the time couldn't be read
+    :return: The time since the epoch
+    :rtype: float
+    """
+
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    if text[-1:] in units:
+        try:
+            return time.time() - float(text[:-1]) * units[text[-1]]
+        except ValueError:
+            pass
+    for time_format in ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M'):
+        try:
+            return time.mktime(time.strptime(text, time_format))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f'unreadable time {text}')
+
+
+def _local(wall_time: float):
+    """Formats a time since the epoch as the alerts do."""
+    return time.strftime('%b %d %Y %H:%M:%S', time.localtime(wall_time))
+
+
+def main():
+    """Lists or counts the incidents matching the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('action', choices=('list', 'count'),
+                        help='list incidents or count them in groups')
+    parser.add_argument('--db', default=None,
+                        help="the database, defaults to the config's")
+    parser.add_argument('--trigger',
+                        help='only incidents set off by door, motion or '
+                             'person')
+    parser.add_argument('--camera', help='only incidents on this camera')
+    parser.add_argument('--since', type=parse_time,
+                        help='only incidents from then on, such as 7d or '
+                             '2026-10-01')
+    parser.add_argument('--until', type=parse_time,
+                        help='only incidents before then')
+    parser.add_argument('--by', choices=tuple(GROUPS), default='trigger',
+                        help='what incidents are counted by')
+    parser.add_argument('--limit', type=int, default=50,
+                        help='the most incidents listed, defaults to 50')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as json')
+    args = parser.parse_args()
+
+    if args.db is None:
+        import config
+        args.db = config.incident_db
+    # Only imports the config when needed, so the command line works
+    # against any database without it.
+
+    connection = connect(args.db)
+    filters = dict(trigger=args.trigger, camera=args.camera,
+                   since=args.since, until=args.until)
+    if args.action == 'list':
+        incidents = query(connection, limit=args.limit, **filters)
+        if args.json:
+            print(json.dumps(incidents, indent=2))
+        else:
+            for incident in incidents:
+                labels = ', '.join(
+                    f'{row["label"]} {row["score"]:.2f}'
+                    for row in incident['detections']
+                )
+                print(f'{incident["id"]:>6}  '
+                      f'{_local(incident["wall_time"])}  '
+                      f'{incident["trigger"]:<8}'
+                      f'{incident["camera"] or "-":<6}'
+                      f'{labels or "-":<28}{incident["snapshot"] or ""}')
+    else:
+        groups = aggregate(connection, args.by, **filters)
+        if args.json:
+            print(json.dumps([
+                {args.by: group, 'incidents': count, 'people': people,
+                 'first': first, 'last': last}
+                for group, count, people, first, last in groups
+            ], indent=2))
+        else:
+            for group, count, people, first, last in groups:
+                print(f'{group:<12}{count:>8} incidents{people:>8} people'
+                      f'  last {_local(last)}')
+            print(f'{"total":<12}{sum(group[1] for group in groups):>8} '
+                  'incidents')
+    connection.close()
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
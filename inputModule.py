@@ -0,0 +1,395 @@
+"""This module's purpose is to watch the door and motion sensor pins
+for changes as they happen, instead of reading them once per frame,
+so a pulse shorter than a frame is never missed and the control loop
+only has to collect the changes queued since it last looked.
+"""
+
+import time  # To timestamp changes.
+import threading  # To guard the queue shared with the callback thread.
+from collections import deque  # For the queue of changes.
+# imports the necessary code.
+
+
+class InputEvent:
+    """A change of an input pin.
+
+    :param name: The name of the input, such as `door`
+    :type name: str
+    :param pin: The pin's number
+    :type pin: int
+    :param active: If the input became active, such as the door opening
+    :type active: bool
+    :param timestamp: The monotonic time the change was seen
+    :type timestamp: float
+    :param wall_time: The time since the epoch the change was seen
+    :type wall_time: float
+    """
+
+    __slots__ = ('name', 'pin', 'active', 'timestamp', 'wall_time')
+
+    def __init__(self, name: str, pin: int, active: bool, timestamp: float,
+                 wall_time: float):
+        """Constructs the class"""
+        self.name = name
+        self.pin = pin
+        self.active = active
+        self.timestamp = timestamp
+        self.wall_time = wall_time
+
+
+class EdgeInputs:
+    """Has the GPIO library call back on every change of the input
+    pins, queueing each change with the time it happened. Switch bounce
+    is filtered by the library's bouncetime and by ignoring callbacks
+    that don't change the pin's level soon after the last change. A
+    callback long after the last change with the level unchanged means
+    the pin went and came back quicker than it could be read, which is
+    queued as a pulse of two changes rather than lost. The first drain
+    after a pin has settled reads it again, catching a change back that
+    the bouncetime dropped.
+
+    :param gpio: The GPIO library, `RPi.GPIO` or class`FakeGPIO`, with
+        the pins already set up as inputs
+    :type gpio: module
+    :param pins: The pin number and active level of each named input,
+        such as {'door': (22, 0)}
+    :type pins: dict
+    :param debounce: The seconds a pin has to settle for before another
+        change on it counts, defaults to 0.05
+    :type debounce: float, optional
+    :param logger: An optional logger addon to log the inputs, defaults
+        to None
+    :type logger: class`logging.logger`, optional
+    """
+
+    def __init__(self, gpio, pins: dict, debounce: float = 0.05,
+                 logger=None):
+        """Constructs the class"""
+        self.gpio = gpio
+        self.pins = dict(pins)
+        self.debounce = debounce
+        self.logger = logger
+
+        self.events = 0
+        self.bounces = 0
+        self.pulses = 0
+        # Counters of changes queued, callbacks ignored as bounce and
+        # pulses caught that were over before the pin could be read.
+
+        self._names = {pin: name for name, (pin, _) in self.pins.items()}
+        self._levels = {}
+        self._changed_at = {}
+        self._queue = deque()
+        self._unsettled = {}
+        self._lock = threading.Lock()
+        # The name of each pin, its last level and when that changed,
+        # the changes waiting to be drained and when each pin waiting
+        # to be read again last had a callback, all guarded by the lock
+        # as callbacks come from the library's own thread.
+
+    def start(self):
+        """Reads each pin's level and starts watching it for changes.
+        An input that is already active is queued as a change, so a
+        door left open is noticed straight away.
+
+        :return: The inputs themselves, so they can be started on
+            creation
+        :rtype: class`EdgeInputs`
+        """
+
+        now = time.monotonic()
+        for name, (pin, active_level) in self.pins.items():
+            level = self.gpio.input(pin)
+            with self._lock:
+                self._levels[pin] = level
+                self._changed_at[pin] = now
+                if level == active_level:
+                    self._push(pin, True, now)
+            self.gpio.add_event_detect(
+                pin, self.gpio.BOTH, callback=self._on_edge,
+                bouncetime=max(1, int(self.debounce * 1000))
+            )
+            if self.logger is not None:
+                self.logger.info(f' GPIO PIN {pin} watched for {name} '
+                                 f'changes.')
+        return self
+
+    def _push(self, pin: int, active: bool, timestamp: float):
+        """Queues a change, call with the lock held."""
+        self._queue.append(InputEvent(
+            self._names[pin], pin, active, timestamp,
+            time.time() - (time.monotonic() - timestamp)
+        ))
+        self.events += 1
+
+    def _on_edge(self, pin: int):
+        """Queues a pin's change, called by the GPIO library.
+
+        :param pin: The pin that changed
+        :type pin: int
+        """
+
+        timestamp = time.monotonic()
+        level = self.gpio.input(pin)
+        active_level = self.pins[self._names[pin]][1]
+        with self._lock:
+            settled = timestamp - self._changed_at[pin] >= self.debounce
+            if level != self._levels[pin]:
+                self._levels[pin] = level
+                self._changed_at[pin] = timestamp
+                self._push(pin, level == active_level, timestamp)
+            elif settled:
+                self._changed_at[pin] = timestamp
+                self._push(pin, level != active_level, timestamp)
+                self._push(pin, level == active_level, timestamp)
+                self.pulses += 1
+            else:
+                self.bounces += 1
+            self._unsettled[pin] = timestamp
+        # Reads the level as soon as possible, the library only says
+        # that the pin changed.
+
+    def _settle(self, now: float):
+        """Reads the pins again that have settled since their last
+        callback, queuing a change the library dropped as bounce.
+
+        :param now: The monotonic time to check for settling by
+        :type now: float
+        """
+
+        with self._lock:
+            pins = [pin for pin, timestamp in self._unsettled.items()
+                    if now - timestamp >= self.debounce]
+        for pin in pins:
+            level = self.gpio.input(pin)
+            active_level = self.pins[self._names[pin]][1]
+            with self._lock:
+                if now - self._unsettled.get(pin, now) < self.debounce:
+                    continue
+                del self._unsettled[pin]
+                if level != self._levels[pin]:
+                    timestamp = time.monotonic()
+                    self._levels[pin] = level
+                    self._changed_at[pin] = timestamp
+                    self._push(pin, level == active_level, timestamp)
+        # Skips a pin that had another callback while it was being read,
+        # the next drain reading it once that has settled.
+
+    def drain(self):
+        """Takes every change queued since the last drain, never
+        waiting.
+
+        :return: The changes in the order they happened
+        :rtype: list
+        """
+
+        self._settle(time.monotonic())
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+        return events
+
+    def active(self, name: str):
+        """Checks if an input is active right now.
+
+        :param name: The name of the input
+        :type name: str
+
+        :return: True if the input's last level is its active level
+        :rtype: bool
+        """
+
+        pin, active_level = self.pins[name]
+        return self._levels.get(pin) == active_level
+
+    def stats(self):
+        """Returns the inputs' counters.
+
+        :return: The changes queued, the bounces ignored, the pulses
+            caught and the changes waiting to be drained
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {
+                'events': self.events,
+                'bounces': self.bounces,
+                'pulses': self.pulses,
+                'queued': len(self._queue)
+            }
+
+    def stop(self):
+        """Stops watching the pins."""
+        for pin, _ in self.pins.values():
+            self.gpio.remove_event_detect(pin)
+
+
+class FakeGPIO:
+    """Stands in for `RPi.GPIO` off the Pi. Input pins are changed with
+    `set_input`, which calls back any watched pin like the real module,
+    including dropping changes within a pin's bouncetime.
+
+    :param levels: The starting level of each input pin, defaults to
+        none which reads every pin as low
+    :type levels: dict, optional
+    """
+
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    PUD_DOWN = 21
+    PUD_UP = 22
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    # The same values as the real module.
+
+    def __init__(self, levels: dict = None):
+        """Constructs the class"""
+        self.levels = dict(levels or {})
+        self.changed_at = {}
+        self.history = []
+        self.detections = {}
+        self._lock = threading.Lock()
+        # The level of each pin, the monotonic time each pin last
+        # changed, the monotonic time, pin and level of every change,
+        # and the edge, callback, bouncetime and last callback time of
+        # each watched pin.
+
+    def setmode(self, mode):
+        """Does nothing, pins are only ever looked up by number."""
+
+    def setwarnings(self, flag):
+        """Does nothing, there are no warnings to turn off."""
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        """Does nothing, any pin can be read or written."""
+
+    def output(self, pin, state):
+        """Sets an output pin's level."""
+        self.levels[pin] = int(state)
+
+    def input(self, pin):
+        """Reads a pin.
+
+        :return: The pin's level
+        :rtype: int
+        """
+
+        return self.levels.get(pin, 0)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        """Watches a pin for changes.
+
+        :param pin: The pin to be watched
+        :type pin: int
+        :param edge: `RISING`, `FALLING` or `BOTH`
+        :type edge: int
+        :param callback: Called with the pin on every change, defaults
+            to None
+        :type callback: function, optional
+        :param bouncetime: The milliseconds after a callback in which
+            changes are dropped, defaults to None
+        :type bouncetime: int, optional
+        """
+
+        self.detections[pin] = [edge, callback, bouncetime, None]
+
+    def remove_event_detect(self, pin):
+        """Stops watching a pin."""
+        self.detections.pop(pin, None)
+
+    def set_input(self, pin, level):
+        """Changes an input pin's level, calling back if the pin is
+        watched for the edge. Callbacks run on the calling thread,
+        which stands in for the real module's callback thread.
+
+        :param pin: The pin to be changed
+        :type pin: int
+        :param level: The new level
+        :type level: int
+        """
+
+        with self._lock:
+            if self.levels.get(pin, 0) == level:
+                return
+            self.levels[pin] = level
+            now = time.monotonic()
+            self.changed_at[pin] = now
+            self.history.append((now, pin, level))
+            detection = self.detections.get(pin)
+            if detection is None:
+                return
+            edge, callback, bouncetime, last_call = detection
+            if edge != self.BOTH and edge != (self.RISING if level
+                                              else self.FALLING):
+                return
+            if (bouncetime and last_call is not None
+                    and now - last_call < bouncetime / 1000):
+                return
+            detection[3] = now
+        if callback is not None:
+            callback(pin)
+
+    def cleanup(self):
+        """Does nothing, there's no hardware to reset."""
+
+
+def main():
+    """Starts some module tests, showing a short pulse on each input
+    and a bouncing switch being caught by the callbacks, where reading
+    the pins once per frame misses them.
+    """
+
+    gpio = FakeGPIO({22: 1, 18: 0})
+    inputs = EdgeInputs(gpio, {'door': (22, 0), 'motion': (18, 1)}).start()
+
+    polled = []
+    events = []
+    stopped = threading.Event()
+
+    def poll():
+        """Reads the pins once per frame, as the turret used to, and
+        drains the changes once per frame, as the turret does now.
+        """
+        while not stopped.wait(0.1):
+            polled.append((gpio.input(22), gpio.input(18)))
+            events.extend(inputs.drain())
+
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+    time.sleep(0.05)
+
+    gpio.set_input(18, 1)
+    time.sleep(0.01)
+    gpio.set_input(18, 0)
+    # A motion pulse of 10ms, well within one frame.
+
+    time.sleep(0.1)
+    for level in (0, 1, 0, 1, 0):
+        gpio.set_input(22, level)
+        time.sleep(0.002)
+    time.sleep(0.06)
+    gpio.set_input(22, 1)
+    # The door opening with a few bounces, then closing again.
+
+    time.sleep(0.15)
+    stopped.set()
+    poller.join()
+    inputs.stop()
+
+    for event in events + inputs.drain():
+        state = 'active' if event.active else 'inactive'
+        print(f'{event.name:<8}{state:<10}{event.timestamp:.3f}')
+    print(f'Polled door opens: {sum(door == 0 for door, _ in polled)}, '
+          f'motion: {sum(motion == 1 for _, motion in polled)}')
+    print(inputs.stats())
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
@@ -4,18 +4,124 @@ external logging feature to the logging module.
 
 
 import os  # For manipulating the operating system.
+import time  # For timing rate limited messages.
+import queue  # For passing records to the background writer.
+import atexit  # For stopping the background writer on exit.
 import logging  # For logging functionality.
+import threading  # For guarding the rate limit counters.
 from datetime import datetime  # For getting the current date and time.
 from logging.handlers import RotatingFileHandler  # For external logs.
+from logging.handlers import QueueHandler, QueueListener
+# For handing records to a background writer.
+
+
+class RateLimitFilter(logging.Filter):
+    """Limits how often hot-loop messages are logged. Only records
+    logged with a `rate_key` extra, for example
+    `log.debug('Aiming', extra={'rate_key': 'aim'})`, are limited, each
+    key being limited on its own. Every other record passes through.
+
+    :param interval: The minimum amount of seconds between two records
+        of the same key, 0 to turn off, defaults to 1.0
+    :type interval: float, optional
+    :param sample_every: Only lets every nth record of a key through,
+        0 to turn off, defaults to 0
+    :type sample_every: int, optional
+    """
+
+    def __init__(self, interval: float = 1.0, sample_every: int = 0):
+        """Constructs the class"""
+        super().__init__()
+        self.interval = interval
+        self.sample_every = sample_every
+        self._last = {}
+        self._seen = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+        # The last time each key was let through, how many records of
+        # each key were seen, and how many were held back since the
+        # last one let through.
+
+    def filter(self, record):
+        """Decides if a record should be logged, noting in its message
+        how many records of its key were held back before it.
+
+        :param record: The record to be checked
+        :type record: class`logging.LogRecord`
+
+        :return: True if the record should be logged
+        :rtype: bool
+        """
+
+        key = getattr(record, 'rate_key', None)
+        if key is None:
+            return True
+
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+            now = time.monotonic()
+            if ((self.sample_every and seen % self.sample_every)
+                    or (self.interval
+                        and now - self._last.get(key, -self.interval)
+                        < self.interval)):
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f'{record.msg} [{suppressed} similar suppressed]'
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """A queue handler that leaves formatting the message to the
+    background writer, keeping the logging thread's work to a minimum.
+    Arguments should not be changed after being logged.
+    """
+
+    def prepare(self, record):
+        """Hands the record over without formatting it."""
+        return record
+
+
+def _prune_logs(log_folder: str, max_logs: int):
+    """Deletes the oldest logs in the log folder until there are only
+    max_logs left, sorting them by age once.
+
+    :param log_folder: The path to the log folder
+    :type log_folder: str
+    :param max_logs: The maximum amount of logs to be kept
+    :type max_logs: int
+    """
+
+    logs_timed = []
+    with os.scandir(log_folder) as entries:
+        for entry in entries:
+            if (entry.is_file()
+                    and (entry.name.endswith('.log')
+                         or '.log.' in entry.name)):
+                logs_timed.append((entry.stat().st_mtime, entry.path))
+    # Gets every log, including rotated backups like `.log.1`, with
+    # its modification time.
+
+    if len(logs_timed) > max_logs:
+        logs_timed.sort()
+        for _, log_path in logs_timed[:len(logs_timed) - max_logs]:
+            os.remove(log_path)
+    # Sorts the logs oldest first and deletes every log over the
+    # max_logs.
 
 
 def init_outfile_logging(
         log_name: str, log_folder: str = './logs',
-        max_logs: int = 10, log_level=logging.DEBUG):
+        max_logs: int = 10, log_level=logging.DEBUG,
+        use_queue: bool = False, rate_limit: float = 0,
+        sample_every: int = 0):
     """Initializes the python logging function with the added feature
     of an external folder with temporary log files, used for personal
     use.
-    
+
     :param log_name: The name of the file to be logged usually
         `__name__` should be passed through by the main file
     :type log_name: str
@@ -24,44 +130,29 @@ def init_outfile_logging(
     :param max_logs: The maximum amount of logs to be present within
         the logs folder at a time, defaults to 10
     :type max_logs: int, optional
-    :param log_level: 
+    :param log_level:
     :type log_level: class`logging.logger`, optional
-    
+    :param use_queue: If records are written to the file by a
+        background thread instead of the logging thread, defaults to
+        False
+    :type use_queue: bool, optional
+    :param rate_limit: The minimum amount of seconds between two
+        records with the same `rate_key`, defaults to 0
+    :type rate_limit: float, optional
+    :param sample_every: Only logs every nth record with the same
+        `rate_key`, defaults to 0
+    :type sample_every: int, optional
+
     :return: The initialized logging class
     :rtype: `logging.logger`
     """
-    
+
     if not os.path.exists(log_folder):
         # Checks if the logs folder exists and if not create it.
-        os.mkdir(log_folder)
+        os.makedirs(log_folder)
     else:
-        logs_dir = os.listdir(log_folder)
-        # Gets every file in the log folder.
-
-        logs_in_dir = []
-        for i in logs_dir:
-            if '.log' in i:
-                logs_in_dir.append(i)
-        # Creates an empty list and places every file that ends in .log
-        # into it.
-
-        if len(logs_in_dir) > max_logs:
-            # If too many logs in log folder execute code which will
-            # delete old logs.
-
-            logs_timed = {}
-            for i in logs_in_dir:
-                logs_timed[i] = os.path.getmtime(f'{log_folder}/{i}')
-            # Gets each log and checks it modification time and adds
-            # it into a dictionary.
-
-            for i in range(len(logs_in_dir) - max_logs):
-                oldest_log = min(logs_timed, key=logs_timed.get)
-                os.remove(
-                    f'{log_folder}/{oldest_log}')
-                del logs_timed[oldest_log]
-            # For every file over the max_logs delete the oldest
-            # log file.
+        _prune_logs(log_folder, max_logs)
+        # If too many logs in log folder delete the old logs.
 
     log = logging.getLogger(log_name)
     log.setLevel(log_level)
@@ -75,13 +166,27 @@ def init_outfile_logging(
 
     dt_string = datetime.now().strftime('%Y-%m-%d-%H%M%S')
     handler = RotatingFileHandler(
-        f'logs/{dt_string}.log', mode='w',
+        os.path.join(log_folder, f'{dt_string}.log'), mode='w',
         maxBytes=5 * 1024 * 1024, backupCount=5,
         delay=False
     )
     # Sets the name of each log file.
 
     handler.setFormatter(formatter)
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = _DeferredQueueHandler(log_queue)
+    # Puts a queue in front of the file so the logging thread never
+    # waits on the disk, a background listener formats and writes
+    # the records and is stopped, writing what's left, on exit.
+
+    if rate_limit or sample_every:
+        handler.addFilter(RateLimitFilter(rate_limit, sample_every))
+    # Limits how often messages tagged with a `rate_key` are logged.
+
     log.addHandler(handler)
     # Finalises the log instance and then returns it to be used.
 
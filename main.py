@@ -7,22 +7,40 @@ __version__ = '1.02'
 __author__ = 'Fvern Witherial'
 
 import RPi.GPIO as GPIO  # To control GPIO inputs and outputs.
+import os  # To count the CPU cores shared by the detectors.
 import time  # To get the date or time, and to halt the program.
+from concurrent.futures import ThreadPoolExecutor  # For parallel startup.
 import cv2  # For camera functionality.
-import os  # For manipulating the operating system.
 import pigpio  # To control servos more smoothly.
-import smtplib as smtp  # For emailing
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-# For formatting emails, email message, and email images.
 
 import logger
 import config
-from objectDetectionModule import ObjectDetector
+from cameraModule import CameraStream
+from actuatorModule import ServoActuator
+from alertModule import AlertOutbox, encode_snapshot
+from clipModule import FrameRing
+from retentionModule import RetentionManager
+from incidentModule import IncidentStore
+from motionModule import MotionGate
+from schedulerModule import DetectionScheduler
+from trackerModule import ObjectTracker
+from aimModule import TurretAimer, make_controller
+from calibrationModule import CalibrationTable
+from inputModule import EdgeInputs
+from metricsModule import (
+    Metrics, MetricsServer, MetricsFile, StartupTimer
+)
+from preprocessModule import UprightFrame
+from objectDetectionModule import (
+    ObjectDetector, DetectorPool, RoiSelector, EMPTY_DETECTIONS,
+    draw_detections
+)
 # Imports the local logging module for additional logging features.
 # Imports the config file which is just user set variables.
-# Allows for object detection.
+# Allows for threaded camera capture, servo movement, alert emails,
+# contact sheets of recent frames, capture folder upkeep, incident
+# records, door and motion sensor callbacks, motion gating, detection
+# scheduling, object detection, tracking, aiming and timing every stage.
 
 
 # Imports all the necessary modules used for noted reasons.
@@ -134,7 +152,7 @@ class PWMGpio:
         self.pwm.set_PWM_frequency(self.pin, self.freq)
         if self.logger is not None:
             self.logger.info(f' GPIO PIN {self.pin} setup for PWM, '
-                             'at {self.freq}Hz.')
+                             f'at {self.freq}Hz.')
 
     def set_servo_pw(self, pulsewidth: int, sleep_time: float = 0.5):
         """Sets the pulsewidth of the pin for servo use.
@@ -148,10 +166,102 @@ class PWMGpio:
         """
         self.pwm.set_servo_pulsewidth(self.pin, pulsewidth)
         if self.logger is not None:
-            self.logger.info(f' GPIO PIN {self.pin} pulsewidth set as {pulsewidth}.')
+            self.logger.debug(' GPIO PIN %s pulsewidth set as %s.',
+                              self.pin, pulsewidth,
+                              extra={'rate_key': f'servo-{self.pin}'})
         time.sleep(sleep_time)
 
 
+class CameraChannel:
+    """Watches a fixed camera for people alongside the turret's own,
+    handing its frames to the shared detector pool when the scene
+    changes and keeping track of what the pool last found on it.
+
+    :param name: The name the camera's frames and alerts are tagged
+        with
+    :type name: str
+    :param stream: The camera's started stream
+    :type stream: class`cameraModule.CameraStream`
+    :param upright: Turns the camera's frames upright for alerts and
+        the window
+    :type upright: class`preprocessModule.UprightFrame`
+    :param logger: An optional logger addon to log the camera's alert
+        timer, defaults to None
+    :type logger: class`logging.logger`, optional
+    """
+
+    def __init__(self,
+                 name: str,
+                 stream,
+                 upright,
+                 logger=None):
+        """Constructs the class"""
+        self.name = name
+        self.stream = stream
+        self.upright = upright
+        self.motion_gate = MotionGate(
+            threshold=config.motion_threshold,
+            min_changed=config.motion_min_changed,
+            keep_alive=config.detector_keep_alive
+        )
+        self.scheduler = DetectionScheduler(
+            latency_budget=config.detector_latency_budget,
+            max_interval=config.detector_max_interval
+        )
+        self.human_detected = TimedBool(logger=logger)
+        # Each camera has its own motion gate, scan timing and alert
+        # timer, as its scene has nothing to do with the others.
+
+        self.frame = None
+        self.detected = EMPTY_DETECTIONS
+        self.last_result_seq = 0
+        # The newest frame read, what was last found on the camera and
+        # which result that was.
+
+    def poll(self, pool, max_result_age: float, metrics=None):
+        """Reads the camera's newest frame without waiting, hands it to
+        the pool if a scan is due and the scene changed, then picks up
+        the camera's newest result.
+
+        :param pool: The shared detector pool
+        :type pool: class`objectDetectionModule.DetectorPool`
+        :param max_result_age: The oldest a result can be, in seconds,
+            to still be used
+        :type max_result_age: float
+        :param metrics: Optional metrics to count the camera's frames
+            into, defaults to None
+        :type metrics: class`metricsModule.Metrics`, optional
+
+        :return: If a new result was picked up
+        :rtype: bool
+        """
+
+        frame = self.stream.read(timeout=0)
+        if frame is not None:
+            self.frame = frame
+            if metrics is not None:
+                metrics.inc('frames', camera=self.name)
+            self.scheduler.tick(frame.timestamp)
+            tracking = 'person' in self.detected
+            if (self.scheduler.due(tracking, frame.timestamp)
+                    and self.motion_gate.check(frame.img, force=tracking)):
+                pool.submit(self.name, frame.img, frame.timestamp,
+                            frame.seq)
+                self.scheduler.scheduled(frame.timestamp)
+        # The turret's camera sets the loop's pace, so the other
+        # cameras are only read when they already have a new frame.
+
+        result = pool.latest(self.name, max_result_age)
+        self.detected = (result.detected if result is not None
+                         else EMPTY_DETECTIONS)
+        if result is None or result.seq == self.last_result_seq:
+            return False
+        self.last_result_seq = result.seq
+        self.scheduler.record_result('person' in self.detected,
+                                     result.latency)
+        return True
+
+
 def gpio_pin_setup(
         pin: int, in_out: classmethod,
         pud: classmethod = None, start_state: bool = False,
@@ -182,109 +292,97 @@ def gpio_pin_setup(
         )
 
 
-def send_email(email_address: str, email_password: str, email_receiver: str,
-               subject: str, body: str, image_path: str = None,
-               domain: str = 'smtp.gmail.com', port: int = 465,
-               logger=None):
-    """Helps compose an email to be sent with an option image addon.
-    
-    :param email_address: The sender email address
-    :type email_address: str
-    :param email_password: The password (or app password) of the
-        sender email address
-    :type email_password: str
-    :param email_receiver: The email address that the email will be
-        sent to
-    :type email_receiver: str
-    :param subject: The text subject header of the email to be sent
-    :type subject: str
-    :param body: The text body of the email to be sent
-    :type body: str
-    :param image_path: The path to an optional image that'll be
-        added as an attachment within the email, defaults to None
-    :type image_path: str, optional
-    :param domain: The domain of the smtp server, defaults to
-        `smtp.gmail.com`
-    :type domain: str, optional
-    :param port: The port of the smtp server, defaults to 465
-    :type port: int, optional
-    :param logger: An optional logger addon to log switches, defaults
-        to None
-    :type logger: class`logging.logger`, optional
-    """
-
-    if logger is not None:
-        logger.debug(f' Composing email to {email_receiver} from '
-                     '{email_address} of:\n{subject}\n{body}.')
-    msg = MIMEMultipart()
-    msg['Subject'] = subject
-    msg['From'] = email_address
-    msg['To'] = email_receiver
-
-    msg.attach(MIMEText(body))
-    if image_path is not None:
-        with open(image_path, 'rb') as infile:
-            image_data = infile.read()
-        msg.attach(MIMEImage(image_data, name=os.path.basename(image_path)))
-        if logger is not None:
-            logger.debug(f' Attaching image to email.')
-
-    with smtp.SMTP_SSL(domain, port) as connection:
-        connection.login(email_address, email_password)
-        connection.sendmail(from_addr=email_address, to_addrs=email_receiver,
-                            msg=msg.as_string())
-    if logger is not None:
-        logger.debug(f' Email sent.')
-
-
-def temp_folder_cleaner(extension: str, folder: str, max_items: int = 20):
-    """Checks a folder to ensure that it doesn't become overloaded
-    with files of a certain extension by deleting the older files over
-    the max_items variable.
-    
-    :param extension: The extension of the files needed to be kept in
-        check done like this to avoid the accidental deletions of
-        misplaced files
-    :type extension: str
-    :param folder: The path to the folder to be kept in check
-    :type folder: str
-    :param max_items: The maximum amount of files of the extension
-        allowed within the folder hen scanned, defaults to 20
-    :type max_items: int, optional
-    """
-
-    folder_dir = os.listdir(folder)
-    items_in_dir = []
-    for i in folder_dir:
-        if extension in i:
-            items_in_dir.append(i)
-    if len(items_in_dir) > max_items:
-        items_timed = {}
-        for i in items_in_dir:
-            items_timed[i] = os.path.getmtime(f'{folder}/{i}')
-        for i in range(len(items_in_dir) - max_items):
-            oldest_item = min(items_timed, key=items_timed.get)
-            os.remove(
-                f'{folder}/{oldest_item}')
-            del items_timed[oldest_item]
-
-
 def main():
     """Starts the turret security system."""
-    log = logger.init_outfile_logging(log_name=__name__)
+    startup = StartupTimer()
+    # Times each phase of starting up, printed once the turret is
+    # armed.
+
+    with startup.phase('logging'):
+        log = logger.init_outfile_logging(
+            log_name=__name__, log_folder=config.log_folder,
+            use_queue=True, rate_limit=config.log_rate_limit
+        )
     log.debug(' Logging initiated.')
     # Creates and initialises the custom logger
-    # passing through this program's identity.
+    # passing through this program's identity. Records are written
+    # by a background thread, and messages from the loop are limited
+    # to one per log_rate_limit seconds.
 
-    if not os.path.exists(config.capture_folder):
-        os.mkdir(config.capture_folder)
-    # Ensures that the capture folder, used for storing images, is
-    # present.
+    metrics = Metrics()
+    # Times every stage of the pipeline and counts detections and
+    # alerts, served or written out once everything is set up.
 
     img_w = 640
     img_h = 480
     # The pixel measurements of the width and height of the capture.
 
+    cores = os.cpu_count() or 1
+    pool_size = (config.detector_pool_size
+                 or min(1 + len(config.extra_cameras), cores))
+    camera_names = ['cam0'] + [f'cam{index}' for index in
+                               range(1, len(config.extra_cameras) + 1)]
+
+    def load_detectors():
+        """Loads the detection model, importing TFLite on first use,
+        and runs a warm-up inference with each detector.
+        """
+
+        with startup.phase('model load'):
+            detectors = [
+                ObjectDetector(
+                    config.detector_model,
+                    num_threads=max(1, cores // pool_size),
+                    input_size=config.detector_input_size, metrics=metrics
+                ) for _ in range(pool_size)
+            ]
+        with startup.phase('warm-up'):
+            for detector in detectors:
+                detector.warm_up()
+        return detectors
+
+    def open_camera(camera_id: int, name: str):
+        """Opens a camera and starts reading it."""
+        with startup.phase(f'open {name}'):
+            return CameraStream(
+                camera_id, (img_w, img_h), logger=log, metrics=metrics,
+                name=name
+            ).start()
+
+    loader = ThreadPoolExecutor(thread_name_prefix='startup')
+    detectors_loading = loader.submit(load_detectors)
+    cameras_opening = [
+        loader.submit(open_camera, camera_id, name) for camera_id, name
+        in zip([config.camera_id] + list(config.extra_cameras), camera_names)
+    ]
+    loader.shutdown(wait=False)
+    # Loads the model, warms it up and opens the cameras on background
+    # threads while the capture folder, the GPIO pins and the servos
+    # are set up, as those are the slowest parts of starting up. The
+    # detectors share the CPU cores, one per camera up to one per core.
+
+    with startup.phase('capture folder'):
+        retention = RetentionManager(
+            config.capture_folder,
+            max_files=config.capture_max_files,
+            max_bytes=config.capture_max_bytes,
+            max_age=config.capture_max_age,
+            logger=log,
+            metrics=metrics
+        ).start()
+    # Ensures that the capture folder, used for storing images, is
+    # present and indexes it once so old images can be removed in the
+    # background without rescanning the folder.
+
+    incidents = IncidentStore(
+        config.incident_db,
+        batch_size=config.incident_batch_size,
+        flush_interval=config.incident_flush_interval,
+        logger=log,
+        metrics=metrics
+    ).start() if config.incident_db else None
+    # Records every alert in the incident database from the background.
+
     GPIO.setmode(GPIO.BOARD)
     log.info(' mode set as board.')
     GPIO.setwarnings(False)
@@ -293,7 +391,8 @@ def main():
     # program can run if previous pins have been active but not
     # deactivated.
 
-    pwm = pigpio.pi()
+    with startup.phase('pigpio'):
+        pwm = pigpio.pi()
     # Creates and initialises pigpio which is used for Pulse Width
     # Modulation.
 
@@ -303,6 +402,15 @@ def main():
     # they'll be input pins and GPIO.PUD_DOWN to steer the inputs
     # to a known state.
 
+    inputs = EdgeInputs(
+        GPIO, {'door': (22, GPIO.LOW), 'motion': (18, GPIO.HIGH)},
+        debounce=config.input_debounce, logger=log
+    ).start()
+    # Watches the door, open when pin 22 drops low, and the motion
+    # sensor, sensing when pin 18 goes high, with callbacks that queue
+    # every change as it happens so even a short pulse during a slow
+    # frame is caught.
+
     # Servo controlling the y-axis max cycle 2.5 to 5
     # Servo controlling the x-axis max cycle 2.5 to 12.5
     # Servo controlling the firing speed
@@ -327,12 +435,10 @@ def main():
     # The starting pulse width of the servos.
 
     x_servo = PWMGpio(pwm, 18, 50, logger=log)
-    x_servo.set_servo_pw(xpulsewidth)
     # pigpio registers pin 12 as 18
     # 500-2500 == 180
     # 750-2250 recommended
     y_servo = PWMGpio(pwm, 27, 50, logger=log)
-    y_servo.set_servo_pw(ypulsewidth)
     # pigpio registers pin 13 as 27
     # 1750-2250 recommended
     f_servo = PWMGpio(pwm, 17, 50, logger=log)
@@ -341,21 +447,84 @@ def main():
     # clockwise: higher == slower, counter: lower = slower
     # 1520 recommended
 
-    cap = cv2.VideoCapture(config.camera_id)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, img_w)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, img_h)
-    # Sets the camera up for opencv, limits the camera resolution for
-    # resource usage.
-
-    detector = ObjectDetector()
-    detector_scan_step = 5
-    lm_dict = {}
-    # Initiates the object detection module. Sets when the detector
-    # will scan the image, for better resource usage, and sets
-    # lm_dict to empty.
-
-    entity_in_xrange = False
-    entity_in_yrange = False
+    actuator = ServoActuator(
+        {'x': x_servo, 'y': y_servo, 'fire': f_servo},
+        servo_speed=config.servo_speed, logger=log, metrics=metrics
+    ).start()
+    actuator.set_target('x', xpulsewidth)
+    actuator.set_target('y', ypulsewidth)
+    actuator.set_target('fire', 0)
+    # Hands the servos to the actuator which moves them on its own
+    # thread, skipping writes that wouldn't change anything, then
+    # homes the turret.
+
+    with startup.phase('wait cameras'):
+        streams = [opening.result() for opening in cameras_opening]
+    camera = streams[0]
+    # Waits for the cameras to start being read on their own threads,
+    # limiting the camera resolution for resource usage. Only the
+    # newest frame is kept so slow loops never work on a stale image.
+
+    with startup.phase('wait model'):
+        pool = DetectorPool(detectors_loading.result(), logger=log,
+                            metrics=metrics)
+    log.info(f' Detecting with {pool.detectors[0].model} at '
+             f'{pool.detectors[0].preprocessor.input_size or "full size"}.')
+    pool.add_camera('cam0', RoiSelector(
+        (img_w, img_h), full_scan_every=config.roi_full_scan_every
+    ) if config.roi_scans else None, flip=True)
+    max_result_age = 1.0
+    last_result_seq = 0
+    detected = EMPTY_DETECTIONS
+    # Initiates the warmed up object detectors on their own threads so
+    # the loop never waits on inference, only scanning around the last
+    # seen person while one is being followed. Results older than
+    # max_result_age seconds are ignored, last_result_seq remembers
+    # which result was last aimed at, and sets detected to empty.
+    # The detectors are handed frames as captured, turning only their
+    # small input upright, and their boxes are in the upright frame.
+
+    upright = UprightFrame()
+    # Turns the whole frame upright into one reused buffer, only for
+    # the frames that are shown or attached to an alert.
+
+    channels = []
+    for camera_id, name, stream in zip(config.extra_cameras,
+                                       camera_names[1:], streams[1:]):
+        flip = camera_id in config.flipped_cameras
+        channels.append(CameraChannel(name, stream, UprightFrame(flip),
+                                      logger=log))
+        pool.add_camera(name, RoiSelector(
+            (img_w, img_h), full_scan_every=config.roi_full_scan_every
+        ) if config.roi_scans else None, flip=flip)
+    pool.start()
+    # Starts any fixed cameras watched alongside the turret's own,
+    # which share the detectors and take turns with it.
+
+    motion_gate = MotionGate(
+        threshold=config.motion_threshold,
+        min_changed=config.motion_min_changed,
+        keep_alive=config.detector_keep_alive
+    )
+    # Only wakes the detector when the scene changes, or every
+    # detector_keep_alive seconds, so an empty room costs next to
+    # nothing.
+
+    scheduler = DetectionScheduler(
+        latency_budget=config.detector_latency_budget,
+        max_interval=config.detector_max_interval
+    )
+    # Picks how often the detector runs from how long inference takes,
+    # scanning often while tracking and backing off when nothing is
+    # present.
+
+    tracker = ObjectTracker()
+    view_settled = None
+    # Follows each detected object between scans with a stable id and
+    # velocity, so the turret can aim at a predicted position, and the
+    # time the turret settled that the tracks last lined up with.
+
+    on_target = False
     # Used later to check when to shoot.
 
     y_height_bias = 140
@@ -365,25 +534,37 @@ def main():
     # but found it was a slight too taxing.
 
     y_leeway = 25
-    y_margins = {
-        'up': int((img_h / 2)
-                  - y_leeway
-                  + y_height_bias),
-        'down': int((img_h / 2)
-                    + y_leeway
-                    + y_height_bias
-                    - 1)
-    }
-    # Stores the y margins calculated by getting the centre point of
-    # the image, and then applying the leeway.
+    x_centre = img_w / 2
+    y_centre = img_h / 2 + y_height_bias
+    # Stores the crosshair's centre point of the image, moved down by
+    # the y_height_bias.
     # This is up here to save up on calculation resources.
 
-    xpw_jumps = 50
-    ypw_jumps = 20
-    # This will be used to +/- the pulse width to move it left/right
-    # up/down larger jumps mean less accurate but faster to aim,
-    # smaller the opposite. Could be dynamically set but found it
-    # was a slight too taxing.
+    aim_x_settings = dict(config.aim_x_settings)
+    aim_y_settings = dict(config.aim_y_settings)
+    if config.aim_controller == 'table':
+        table = CalibrationTable.load(config.calibration_file)
+        aim_x_settings.update(table=table, axis='x')
+        aim_y_settings.update(table=table, axis='y')
+        log.info(f' Calibration table loaded from '
+                 f'{config.calibration_file}.')
+    elif config.aim_controller == 'step':
+        aim_x_settings.setdefault('jump', 50)
+        aim_y_settings.setdefault('jump', 20)
+    # Loads the precomputed calibration table, made by running
+    # calibrationModule.py, when aiming by table lookup. The step
+    # controller defaults to the original jumps, smaller on the y axis
+    # as its range is only 500us.
+
+    aimer = TurretAimer(
+        make_controller(config.aim_controller, **aim_x_settings),
+        make_controller(config.aim_controller, **aim_y_settings),
+        xpulsewidth, ypulsewidth,
+        x_range=config.aim_x_range, y_range=config.aim_y_range
+    )
+    last_aim_time = None
+    # Works out how far to move the servos from how many pixels the
+    # target is off centre, keeping them within their safe ranges.
 
     counter, fps = 0, 0
     start_time = time.time()
@@ -402,6 +583,153 @@ def main():
     # the human_multiplier is to increase time due to higher proof of
     # a break in.
 
+    outbox = AlertOutbox(
+        email_address=config.email_addr,
+        email_password=config.email_passwd,
+        email_receiver=config.email_receiver,
+        domain=config.smtp_domain,
+        port=config.smtp_port,
+        use_ssl=config.smtp_ssl,
+        coalesce_window=config.alert_coalesce_window,
+        logger=log,
+        metrics=metrics
+    ).start()
+    # Sends the alert emails in the background over one connection,
+    # merging alerts that happen close together.
+
+    ring = FrameRing(
+        max_bytes=config.clip_ring_bytes,
+        interval=config.clip_interval,
+        before=config.clip_before,
+        after=config.clip_after,
+        scale=config.clip_scale,
+        quality=config.clip_quality,
+        logger=log,
+        metrics=metrics
+    ).start() if config.clip_ring_bytes else None
+    # Keeps a few seconds of shrunk and compressed frames in memory so
+    # a sensor alert can show the moments before and after its trigger.
+
+    metrics.watch('frames_captured', lambda: camera.captured, 'counter')
+    metrics.watch('frames_dropped', lambda: camera.dropped, 'counter')
+    metrics.watch('scans_dropped', lambda: pool.dropped, 'counter')
+    metrics.watch('servo_writes', lambda: actuator.writes, 'counter')
+    metrics.watch('emails_sent', lambda: outbox.sent, 'counter')
+    metrics.watch('emails_failed', lambda: outbox.failed, 'counter')
+    metrics.watch('alert_queue_depth', outbox.queue_depth)
+    metrics.watch('detection_cadence', lambda: scheduler.cadence)
+    if ring is not None:
+        metrics.watch('frame_ring_bytes', lambda: ring.total_bytes)
+    metrics_server = MetricsServer(
+        metrics, config.metrics_port, logger=log
+    ).start() if config.metrics_port else None
+    metrics_file = MetricsFile(
+        metrics, config.metrics_file, config.metrics_interval, logger=log
+    ).start() if config.metrics_file else None
+    # Counters already kept by the threads are only read when the
+    # metrics are scraped or written, costing the loop nothing.
+
+    def snapshot_name(file_prefix: str, ctime: str):
+        """Gets the file name of an alert's image."""
+        return (
+            f'{file_prefix}-'
+            f'{ctime.replace(" ", "-").replace(":", "")}'
+            f'{config.snapshot_format}'
+        )
+
+    def queue_alert(file_prefix: str, ctime: str, img, subject: str,
+                    body: str):
+        """Encodes an alert's image once in memory and queues it to be
+        saved to the capture folder and emailed in the background.
+        """
+
+        img_file_name = snapshot_name(file_prefix, ctime)
+        with metrics.timer('encode'):
+            snapshot = encode_snapshot(
+                img, config.snapshot_format,
+                config.snapshot_quality, config.snapshot_scale
+            )
+        metrics.inc('alerts')
+        retention.save(img_file_name, snapshot)
+        outbox.send(
+            subject=subject,
+            body=body,
+            images=[(img_file_name, snapshot)]
+        )
+        # The oldest images are removed in the background to keep the
+        # folder from being overloaded, and the email goes out with
+        # the same encoded bytes.
+
+    def sensor_alert(trigger: str, file_prefix: str, ctime: str, event,
+                     frame, subject: str, body: str):
+        """Raises an alert for a sensor trigger. With the frame ring on,
+        the alert is queued from the background once the frames after
+        the trigger are in, carrying a contact sheet of the frames
+        around it, otherwise it carries the frame at the trigger.
+        """
+
+        trigger_time = (event.timestamp if event is not None
+                        else time.monotonic())
+        if incidents is not None:
+            incidents.record(
+                trigger,
+                wall_time=event.wall_time if event is not None else None,
+                monotonic=trigger_time,
+                camera='cam0',
+                snapshot=os.path.join(config.capture_folder,
+                                      snapshot_name(file_prefix, ctime))
+            )
+        # Records the incident with the time the sensor changed, or now
+        # if it was already active.
+
+        img = upright.get(frame)
+        if ring is None:
+            queue_alert(file_prefix, ctime, img, subject, body)
+            return
+        img = img.copy()
+        ring.capture(trigger_time, lambda sheet: queue_alert(
+            file_prefix, ctime, sheet if sheet is not None else img,
+            subject, body
+        ))
+        # Keeps a copy of the frame at the trigger in case the ring has
+        # no frames to make a sheet from.
+
+    def person_alert(name: str, img, detected, timed_bool: TimedBool):
+        """Raises an alert for a person seen by a camera, with the
+        detected objects boxed on a copy of its upright frame.
+        """
+
+        timed_bool.switch_for(bool_switch_time * human_multiplier)
+        # Sets the camera's human_detected to true for
+        # bool_switch_time * human_multiplier seconds.
+
+        ctime = time.strftime('%b %d %Y %H:%M:%S')
+        # Gets the current time in
+        # 'Month Date Year Hour:Minute:Second' format.
+
+        if incidents is not None:
+            incidents.record(
+                'person', camera=name, detected=detected,
+                snapshot=os.path.join(
+                    config.capture_folder,
+                    snapshot_name(f'person-detected-{name}', ctime)
+                )
+            )
+        queue_alert(
+            f'person-detected-{name}', ctime,
+            draw_detections(img.copy(), detected),
+            f'Security Alert: Human Detected on {name}',
+            'SEVERE ALERT: A humanoid figure has been detected.\n'
+            f'The figure was detected by camera {name} on {ctime}.\n'
+            'Please see the image attached.'
+        )
+        log.info(
+            f' Humanoid figure detected by {name} on '
+            f'{ctime}, trigger will be active for '
+            f'{bool_switch_time * human_multiplier / 60}'
+            ' minutes.'
+        )
+
     door_opened = TimedBool(logger=log)
     motion_detected = TimedBool(logger=log)
     human_detected = TimedBool(logger=log)
@@ -409,36 +737,96 @@ def main():
     # amount of time passes. Log is passed through as logger to allow
     # for logging.
 
+    armed_after = startup.elapsed()
+    metrics.observe('startup', armed_after)
+    log.info(f' Armed after {armed_after:.2f} seconds, startup phases:\n'
+             f'{startup.report()}')
+    print(f'Turret armed after {armed_after:.2f} seconds.\n'
+          f'{startup.report()}')
+    # Shows where the startup time went, phases on other threads run
+    # alongside the main one.
+
     try:
         # If an exception occurs the program will execute the
         # exception code and continue out of the try loop.
         while True:
             # Causes the code to indefinitely loop.
 
-            success, img = cap.read()
-            if not success:
+            loop_start = time.perf_counter()
+            frame = camera.read()
+            if frame is None:
                 raise RuntimeError(
-                    'Unable to read from webcam.'
+                    'Unable to read from webcam. '
                     'Please verify your webcam in config.py.'
                 )
-            # Stores if the camera was successfully accessed and the
-            # current visual feed of the camera. If the camera
-            # couldn't be accessed it will cause a RuntimeError and
-            # the program would stop.
-
-            img = cv2.flip(img, -1)
-            if counter % detector_scan_step == 0:
-                img = detector.find_object(img)
-                lm_dict = detector.find_position()
-            # Firstly flips the image both horizontally and
-            # vertically, then checks if the counter is a multiple of
-            # detector_scan_step and if so detect the image for
-            # objects and return objects.
+            # Gets the newest frame from the camera stream. If the
+            # camera couldn't be accessed it will cause a RuntimeError
+            # and the program would stop.
+
+            if ring is not None:
+                ring.add(frame.img, frame.timestamp, flip=True)
+            scheduler.tick(frame.timestamp)
+            metrics.observe('frame_wait', time.perf_counter() - loop_start)
+            tracking = 'person' in detected
+            metrics.inc('frames', camera='cam0')
+            if (scheduler.due(tracking, frame.timestamp)
+                    and motion_gate.check(frame.img, force=tracking)):
+                pool.submit('cam0', frame.img, frame.timestamp, frame.seq)
+                scheduler.scheduled(frame.timestamp)
+            result = pool.latest('cam0', max_result_age)
+            detected = (result.detected if result is not None
+                        else EMPTY_DETECTIONS)
+            new_result = (result is not None
+                          and result.seq != last_result_seq)
+            if new_result:
+                last_result_seq = result.seq
+                metrics.inc('scans')
+                metrics.inc('detections', len(detected))
+                settled_at = actuator.settled_since('x', 'y')
+                if settled_at is None or settled_at != view_settled:
+                    tracker.view_moved()
+                    if (settled_at is not None
+                            and result.timestamp >= settled_at):
+                        view_settled = settled_at
+                tracker.update(detected, result.timestamp)
+                scheduler.record_result('person' in detected, result.latency)
+                log.debug(' Detection cadence %.1f frames, %.2f seconds.',
+                          scheduler.cadence, scheduler.interval,
+                          extra={'rate_key': 'cadence'})
+            # Hands the frame, still upside down, to the detector
+            # pool if a scan is due and the scene changed or a
+            # person is being tracked, and uses the newest detection
+            # result.
+            # new_result is only True the first time a result is seen
+            # so the tracker and the scheduler learn from each scan once.
+            # While the turret turns, and on the first frame after it
+            # stops, the tracks take their measured positions as they
+            # are, as the camera turns with the turret and the view
+            # shifting would otherwise be learnt as the target moving.
 
             counter += 1
             # A counter for both fps and detection calculations.
 
-            if (GPIO.input(22) == 0
+            stage_start = time.perf_counter()
+            door_event = None
+            motion_event = None
+            for event in inputs.drain():
+                if event.active and event.name == 'door':
+                    door_event = door_event or event
+                elif event.active and event.name == 'motion':
+                    motion_event = motion_event or event
+                metrics.observe('input_latency',
+                                time.monotonic() - event.timestamp)
+            door_input = door_event is not None or inputs.active('door')
+            motion_input = (motion_event is not None
+                            or inputs.active('motion'))
+            metrics.observe('gpio', time.perf_counter() - stage_start)
+            # Takes the sensor changes queued since the last frame,
+            # keeping the first time each became active, and otherwise
+            # whether they're still active, so a door left open raises
+            # another alert once the last one's timer runs out.
+
+            if (door_input
                     and door_opened() is False):
                 # A door opening has been detected, now on alert for
                 # additional triggers, to prevent false alarms.
@@ -448,49 +836,29 @@ def main():
                 door_opened.switch_for(bool_switch_time)
                 # Sets door_opened to true for bool_switch_time seconds.
 
-                ctime = time.strftime('%b %d %Y %H:%M:%S')
-                # Gets the current time in
+                ctime = time.strftime('%b %d %Y %H:%M:%S', time.localtime(
+                    door_event.wall_time if door_event is not None else None
+                ))
+                # Gets the time the sensor changed, or the current time
+                # if it was already active, in
                 # 'Month Date Year Hour:Minute:Second' format.
 
-                time.sleep(3)
-                # Lets the entity get more in frame before the image is taken
-
-                img_file_name = (
-                    'door-opened-'
-                    f'{ctime.replace(" ", "-").replace(":", "")}'
-                    '.png'
-                )
-                temp_folder_cleaner('.png', config.capture_folder)
-                cv2.imwrite(f'{config.capture_folder}/{img_file_name}', img)
-                # Sets the output file's name then calls
-                # temp_folder_cleaner to ensure the folder is not
-                # being overloaded then writes the image to the folder.
-
-                subject = 'Security Alert: Door Opened'
-                body = (
+                sensor_alert(
+                    'door', 'door-opened', ctime, door_event, frame,
+                    'Security Alert: Door Opened',
                     f'ALERT: A door opening has been detected on {ctime}.\n'
                     'Please see the image attached.'
                 )
-                send_email(
-                    email_address=config.email_addr,
-                    email_password=config.email_passwd,
-                    email_receiver=config.email_receiver,
-                    subject=subject,
-                    body=body,
-                    image_path=f'{config.capture_folder}/{img_file_name}',
-                    logger=log
-                )
                 log.info(
                     f' Door opening detected on {ctime}'
                     ', trigger will be active for '
                     f'{bool_switch_time / 60} minutes.'
                 )
-                # Sets the subject and body of the email and then
-                # passes it through to the send_email function with
-                # the image's path and the email account's credentials
-                # to send.
+                # Sets the subject and body of the email, which is
+                # queued in the outbox once the frames after the
+                # trigger are in, without pausing the turret.
 
-            if (GPIO.input(18) == 1
+            if (motion_input
                     and motion_detected() is False):
                 # Motion detected, now on alert for additional
                 # triggers, to prevent false alarms.
@@ -501,209 +869,120 @@ def main():
                 # Sets motion_detected to true for bool_switch_time
                 # seconds.
 
-                ctime = time.strftime('%b %d %Y %H:%M:%S')
-                # Gets the current time in
+                ctime = time.strftime('%b %d %Y %H:%M:%S', time.localtime(
+                    motion_event.wall_time if motion_event is not None
+                    else None
+                ))
+                # Gets the time the sensor changed, or the current time
+                # if it was already active, in
                 # 'Month Date Year Hour:Minute:Second' format.
 
-                time.stop(3)
-                # Lets the entity get more in frame before the image is taken
-
-                img_file_name = (
-                    'motion-detected-'
-                    f'{ctime.replace(" ", "-").replace(":", "")}'
-                    '.png'
-                )
-                temp_folder_cleaner('.png', config.capture_folder)
-                cv2.imwrite(f'{config.capture_folder}/{img_file_name}', img)
-                # Sets the output file's name then calls
-                # temp_folder_cleaner to ensure the folder is not
-                # being overloaded then writes the image to the folder.
-
-                subject = 'Security Alert: Motion Detected'
-                body = (
+                sensor_alert(
+                    'motion', 'motion-detected', ctime, motion_event, frame,
+                    'Security Alert: Motion Detected',
                     f'ALERT: Motion has been detected on {ctime}.\n'
                     'Please see the image attached.'
                 )
-                send_email(
-                    email_address=config.email_addr,
-                    email_password=config.email_passwd,
-                    email_receiver=config.email_receiver,
-                    subject=subject,
-                    body=body,
-                    image_path=f'{config.capture_folder}/{img_file_name}',
-                    logger=log
-                )
                 log.info(
                     f' Motion detected on {ctime}'
                     ', trigger will be active for '
                     f'{bool_switch_time / 60} minutes.'
                 )
-                # Sets the subject and body of the email and then
-                # passes it through to the send_email function with
-                # the image's path and the email account's credentials
-                # to send.
+                # Sets the subject and body of the email, which is
+                # queued in the outbox once the frames after the
+                # trigger are in, without pausing the turret.
 
-            if ('person' in lm_dict
+            if ('person' in detected
                     and human_detected() is False):
                 # A human has been detected, now on alert for
                 # additional triggers, to prevent false alarms.
                 # An extended timer has now been set till this trigger
                 # is deactivated.
-
-                human_detected.switch_for(
-                    bool_switch_time
-                    * human_multiplier
+                person_alert('cam0', upright.get(frame), detected,
+                             human_detected)
+
+            for channel in list(channels):
+                try:
+                    channel.poll(pool, max_result_age, metrics)
+                except RuntimeError:
+                    log.exception(f' Camera {channel.name} failed, '
+                                  'carrying on without it.')
+                    channel.stream.stop()
+                    channels.remove(channel)
+                    continue
+                if ('person' in channel.detected
+                        and channel.human_detected() is False):
+                    person_alert(channel.name,
+                                 channel.upright.get(channel.frame),
+                                 channel.detected, channel.human_detected)
+            # Checks the other cameras for new frames and results, each
+            # raising its own alerts tagged with its name. A camera
+            # that stops working, such as one unplugged, is dropped so
+            # the turret's own camera keeps going.
+
+            target = tracker.primary('person')
+            aim_settled = actuator.settled_since('x', 'y')
+            if (target is not None
+                    and aim_settled is not None
+                    and target.updated_at >= aim_settled
+                    and config.turret_active):
+                # Targets the followed person's predicted centre point,
+                # if the turret not disabled and if the person was
+                # last seen on a frame taken after the turret stopped
+                # moving, as positions from before a move no longer
+                # line up with the frame.
+                target_x, target_y = target.predict(frame.timestamp)
+                log.debug(
+                    ' Targeting track %s X: %.0f Y: %.0f',
+                    target.track_id, target_x, target_y,
+                    extra={'rate_key': 'targeting'}
                 )
-                # Sets human_detected to true for
-                # bool_switch_time * human_multiplier seconds.
-
-                ctime = time.strftime('%b %d %Y %H:%M:%S')
-                # Gets the current time in
-                # 'Month Date Year Hour:Minute:Second' format.
 
-                img_file_name = (
-                    'person-detected-'
-                    f'{ctime.replace(" ", "-").replace(":", "")}'
-                    '.png'
-                )
-                temp_folder_cleaner('.png', config.capture_folder)
-                cv2.imwrite(f'{config.capture_folder}/{img_file_name}', img)
-                # Sets the output file's name then calls
-                # temp_folder_cleaner to ensure the folder is not
-                # being overloaded then writes the image to the folder.
-
-                subject = 'Security Alert: Human Detected'
-                body = (
-                    'SEVERE ALERT: A humanoid figure has been detected.\n'
-                    f'The figure was detected on {ctime}.\n'
-                    'Please see the image attached.'
-                )
-                send_email(
-                    email_address=config.email_addr,
-                    email_password=config.email_passwd,
-                    email_receiver=config.email_receiver,
-                    subject=subject,
-                    body=body,
-                    image_path=f'{config.capture_folder}/{img_file_name}',
-                    logger=log
-                )
-                log.info(
-                    ' Humanoid figure detected on '
-                    f'{ctime}, trigger will be active for '
-                    f'{bool_switch_time * human_multiplier / 60}'
-                    ' minutes.'
-                )
-                # Sets the subject and body of the email and then
-                # passes it through to the send_email function with
-                # the image's path and the email account's credentials
-                # to send.
+                x_leeway = target.width / 2
+                # The leeway sets how large the target centre box is
+                # on the x-axis, the width of the target.
 
-            if ('person' in lm_dict
-                    and counter % detector_scan_step == 0
-                    and config.turret_active):
-                # lm_dict['person'][0] should always have a centre
-                # point. Now targeting the centre point, if the turret
-                # not disabled and if a scan has occurred.
-                log.info(
-                    'Targeting'
-                    f'X: {lm_dict["person"]["centre_x"]} '
-                    f'Y: {lm_dict["person"]["centre_y"]}'
+                aim_dt = (frame.timestamp - last_aim_time
+                          if last_aim_time is not None else 0.0)
+                last_aim_time = frame.timestamp
+                xpulsewidth, ypulsewidth, _, _ = aimer.aim(
+                    x_centre - target_x, y_centre - target_y, aim_dt,
+                    x_leeway, y_leeway
                 )
-
-                x_leeway = lm_dict['person']['width'] / 2
-                x_margins = {
-                    'left': int(
-                        (img_w / 2)
-                        - x_leeway
-                    ),
-                    'right': int(
-                        (img_w / 2)
-                        + x_leeway
-                        + 1
-                    )
-                }
-                # Stores the x margins calculated by getting the centre
-                # point of the image, and then applying the leeways.
-
-                x_in_range = range(x_margins['left'], x_margins['right'])
-                y_in_range = range(y_margins['up'], y_margins['down'])
-                # The ranges are used to create an area where the
-                # turret will stop trying to centre its target.
-
-                x_out_range = {
-                    'left': range(-1, x_margins['left']),
-                    'right': range(x_margins['right'], img_w + 1)
-                }
-                y_out_range = {
-                    'up': range(-1, y_margins['up']),
-                    'down': range(y_margins['down'], img_h + 1)
-                }
-                # Used to find where the target is and what side is
-                # it more to for later aiming.
-
-                target_pos = {
-                    'x': lm_dict['person']['centre_x'],
-                    'y': lm_dict['person']['centre_y']
-                }
-                # Gets the centre point of the target.
-
-                if target_pos['x'] not in x_in_range:
-                    # Checks if the target x position is not within the
-                    # turret's crosshair, if not set entity_in_xrange
-                    # to True.
-
-                    entity_in_xrange = False
-                    # Target not in x range makes sure not to shoot.
-
-                    if target_pos['x'] in x_out_range['left']:
-                        log.debug(' Under the range moving into range.')
-                        xpulsewidth += xpw_jumps
-                        x_servo.set_servo_pw(xpulsewidth)
-                    elif target_pos['x'] in x_out_range['right']:
-                        log.debug(' Over the range moving into range.')
-                        xpulsewidth -= xpw_jumps
-                        x_servo.set_servo_pw(xpulsewidth)
-                    # Checks if the target is out of range towards the
-                    # left or right and inch towards the target, by
-                    # increasing or reducing the xpulsewidth.
-                else:
-                    entity_in_xrange = True
-
-                if target_pos['y'] not in y_in_range:
-                    # Checks if the target y position is not within the
-                    # turret's crosshair, if not set entity_in_xrange
-                    # to True.
-
-                    entity_in_yrange = False
-                    # Target not in y range makes sure not to shoot.
-
-                    if target_pos['y'] in y_out_range['up']:
-                        log.debug(' Under the range moving into range.')
-                        ypulsewidth += ypw_jumps
-                        y_servo.set_servo_pw(ypulsewidth)
-                    elif target_pos['y'] in y_out_range['down']:
-                        log.debug(' Over the range moving into range.')
-                        ypulsewidth -= ypw_jumps
-                        y_servo.set_servo_pw(ypulsewidth)
-                    # Checks if the target is out of range being too up
-                    # or too down and inch towards the target, by
-                    # increasing or reducing the ypulsewidth.
-                else:
-                    entity_in_yrange = True
+                actuator.set_target('x', xpulsewidth)
+                actuator.set_target('y', ypulsewidth)
+                # Moves the servos by however much the aim controller
+                # works out from the pixel error, left/up raising the
+                # pulse width. Within the leeway the pulse widths don't
+                # change and the actuator skips the writes.
+
+                on_target = bool(detected.select('person').in_zone(
+                    x_centre - x_leeway, y_centre - y_leeway,
+                    x_centre + x_leeway, y_centre + y_leeway
+                ).any())
+                # Checks if a person seen on the newest scan is centred
+                # within the leeway box around the crosshair.
+            elif target is None and last_aim_time is not None:
+                aimer.reset()
+                last_aim_time = None
+                on_target = False
+                # Forgets the controllers' built up error once the
+                # target is lost, and makes sure not to shoot.
 
                 # clockwise == right/down == 500-1500
                 # anti == left/up == 1500-2500
 
             if (config.turret_active
-                    and entity_in_xrange
-                    and entity_in_yrange
+                    and on_target
                     and (door_opened()
                          or motion_detected())):
                 # Checks if the turret is centred and if the turret
                 # is not disabled and if so shoot, else stop.
-                f_servo.set_servo_pw(fpulsewidth)
+                actuator.set_target('fire', fpulsewidth)
             else:
-                f_servo.set_servo_pw(0)
+                actuator.set_target('fire', 0)
+            # The actuator ignores the repeated commands, so the servo
+            # is only written to when firing starts or stops.
 
             if counter % fps_avg_frame_count == 0:
                 end_time = time.time()
@@ -713,26 +992,82 @@ def main():
             # since the previous fps_avg_frame_count (10) frames,
             # while resetting the start time.
 
-            text_location = (left_margin, row_size)
-            cv2.putText(
-                img, f'FPS = {fps}',
-                text_location, cv2.FONT_HERSHEY_PLAIN,
-                font_size, text_color,
-                font_thickness
-            )
-            # Adds a small fps counter found within the image
-
-            cv2.imshow('Camera', img)
-            cv2.waitKey(1)
-            # Shows the image output and waits 1 millisecond for
-            # input to prevent running the thread infinitely for
-            # keyboard inputs.
+            if not config.headless:
+                stage_start = time.perf_counter()
+                view = upright.get(frame)
+                metrics.observe('flip', time.perf_counter() - stage_start)
+                if result is not None:
+                    draw_detections(view, detected)
+                text_location = (left_margin, row_size)
+                cv2.putText(
+                    view, f'FPS = {fps:.1f} Scan every '
+                          f'{scheduler.cadence:.1f} frames',
+                    text_location, cv2.FONT_HERSHEY_PLAIN,
+                    font_size, text_color,
+                    font_thickness
+                )
+                # Turns the frame upright then draws the detected
+                # objects and a small fps and detection cadence counter
+                # straight onto it, as the detector pool reads the
+                # frame as captured rather than this buffer.
+
+                display_start = time.perf_counter()
+                metrics.observe('draw', display_start - stage_start)
+                cv2.imshow('Camera', view)
+                for channel in channels:
+                    if channel.frame is not None:
+                        cv2.imshow(
+                            f'Camera {channel.name}',
+                            draw_detections(
+                                channel.upright.get(channel.frame).copy(),
+                                channel.detected
+                            )
+                        )
+                cv2.waitKey(1)
+                metrics.observe('display',
+                                time.perf_counter() - display_start)
+                # Shows the image output and waits 1 millisecond for
+                # input to prevent running the thread infinitely for
+                # keyboard inputs.
+            # Without a monitor none of the window's drawing is done.
+
+            metrics.observe('loop', time.perf_counter() - loop_start)
     except KeyboardInterrupt:
         # When the program is stopped, by ctrl+c it will execute the
         # commands below to stop the servos, reset all GPIO pins, and
         # log the exit.
+        pool.stop()
+        if ring is not None:
+            ring.stop()
+        if incidents is not None:
+            incidents.stop()
+        camera.stop()
+        for channel in channels:
+            channel.stream.stop()
+        actuator.stop()
+        outbox.stop()
+        retention.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if metrics_file is not None:
+            metrics_file.stop()
+        inputs.stop()
         pwm.stop()
         GPIO.cleanup()
+        log.info(f' Camera stream stats: {camera.stats()}.')
+        log.info(f' Alert outbox stats: {outbox.stats()}.')
+        log.info(f' Sensor input stats: {inputs.stats()}.')
+        if ring is not None:
+            log.info(f' Frame ring stats: {ring.stats()}.')
+        if incidents is not None:
+            log.info(f' Incident store stats: {incidents.stats()}.')
+        log.info(f' Motion gate stats: {motion_gate.stats()}.')
+        log.info(f' Detection scheduler stats: {scheduler.stats()}.')
+        log.info(f' Detector pool stats: {pool.stats()}.')
+        log.info(f' Preprocessor stats: '
+                 f'{[d.preprocessor.stats() for d in pool.detectors]}.')
+        log.info(f' Stage timings in ms and counters: '
+                 f'{metrics.summary()}.')
         log.exception(' Closing program due to keyboard interrupt.')
 
 
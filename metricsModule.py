@@ -0,0 +1,508 @@
+"""This module's purpose is to time each stage of the turret's pipeline
+and count what it does, exposing it all in the Prometheus text format
+either over a small http server on localhost or as a file rewritten
+every so often.
+"""
+
+import os  # To replace the metrics file in one go.
+import time  # To time stages.
+import threading  # To serve and write the metrics in the background.
+from bisect import bisect_left  # To find a timing's bucket.
+from contextlib import contextmanager  # For the stage timer.
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+# For serving the metrics.
+# imports the necessary code.
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# The upper bounds in seconds of the histogram buckets, covering a
+# single GPIO read up to a slow smtp send.
+
+
+class Histogram:
+    """Counts timings into buckets, keeping their total and amount.
+
+    :param buckets: The sorted upper bounds of the buckets
+    :type buckets: tuple
+    """
+
+    __slots__ = ('buckets', 'counts', 'total', 'count', '_lock')
+
+    def __init__(self, buckets: tuple):
+        """Constructs the class"""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+        # One count per bucket, the last one for timings above every
+        # bound. The counts aren't cumulative until rendered.
+
+    def observe(self, value: float):
+        """Counts a timing.
+
+        :param value: The timing in seconds
+        :type value: float
+        """
+
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+
+class Metrics:
+    """Holds the pipeline's stage timings and counters. Histograms and
+    counters are made the first time they're used, and values already
+    kept elsewhere, such as a camera's dropped frames, can be watched
+    so they're only read when the metrics are rendered. Timings and
+    counters can be labelled with the camera they belong to, keeping a
+    series per camera.
+
+    :param prefix: The start of every metric's name, defaults to
+        `turret`
+    :type prefix: str, optional
+    :param buckets: The upper bounds in seconds of the stage histogram
+        buckets, defaults to DEFAULT_BUCKETS
+    :type buckets: tuple, optional
+    """
+
+    def __init__(self, prefix: str = 'turret',
+                 buckets: tuple = DEFAULT_BUCKETS):
+        """Constructs the class"""
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+
+        self.stages = {}
+        self.counters = {}
+        self.watched = {}
+        self._lock = threading.Lock()
+        # The histogram of each stage and the value of each counter,
+        # keyed by their name and camera, and the function and kind of
+        # each watched value.
+
+    def observe(self, stage: str, seconds: float, camera: str = None):
+        """Records how long a stage took.
+
+        :param stage: The name of the stage
+        :type stage: str
+        :param seconds: How long it took
+        :type seconds: float
+        :param camera: The camera the timing belongs to, defaults to
+            None for the turret's pipeline as a whole
+        :type camera: str, optional
+        """
+
+        key = (stage, camera)
+        histogram = self.stages.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(
+                    key, Histogram(self.buckets)
+                )
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, camera: str = None):
+        """Times the code run within the with statement as a stage.
+
+        :param stage: The name of the stage
+        :type stage: str
+        :param camera: The camera the timing belongs to, defaults to
+            None
+        :type camera: str, optional
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time, camera)
+
+    def inc(self, name: str, amount: float = 1, camera: str = None):
+        """Adds to a counter.
+
+        :param name: The name of the counter, without the prefix or
+            `_total`
+        :type name: str
+        :param amount: The amount added, defaults to 1
+        :type amount: float, optional
+        :param camera: The camera the count belongs to, defaults to
+            None
+        :type camera: str, optional
+        """
+
+        key = (name, camera)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def watch(self, name: str, func, kind: str = 'gauge'):
+        """Reads a value kept elsewhere whenever the metrics are
+        rendered.
+
+        :param name: The name of the value, without the prefix
+        :type name: str
+        :param func: Returns the value
+        :type func: function
+        :param kind: Either `gauge` or `counter`, defaults to `gauge`
+        :type kind: str, optional
+        """
+
+        self.watched[name] = (func, kind)
+
+    def render(self):
+        """Renders every metric in the Prometheus text format.
+
+        :return: The metrics
+        :rtype: str
+        """
+
+        lines = []
+        name = f'{self.prefix}_stage_seconds'
+        lines.append(f'# HELP {name} How long each pipeline stage took.')
+        lines.append(f'# TYPE {name} histogram')
+        with self._lock:
+            stages = sorted(self.stages.items(), key=_sort_key)
+        for (stage, camera), histogram in stages:
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total = histogram.total
+                count = histogram.count
+            labels = _labels(stage=stage, camera=camera)
+            running = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                running += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} '
+                             f'{running}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+        # Prometheus buckets count every timing at or below their
+        # bound, so the counts are added up as they go.
+
+        with self._lock:
+            counters = sorted(self.counters.items(), key=_sort_key)
+        typed = set()
+        for (counter, camera), value in counters:
+            if counter not in typed:
+                lines.append(f'# TYPE {self.prefix}_{counter}_total counter')
+                typed.add(counter)
+            labels = _labels(camera=camera)
+            labels = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.prefix}_{counter}_total{labels} {value}')
+        # A counter kept per camera is one metric with a series per
+        # camera, so its type is only given once.
+
+        for watched, (func, kind) in sorted(self.watched.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            suffix = '_total' if kind == 'counter' else ''
+            lines.append(f'# TYPE {self.prefix}_{watched}{suffix} {kind}')
+            lines.append(f'{self.prefix}_{watched}{suffix} {value}')
+        # Skips any watched value that can't be read right now.
+
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Returns the average and count of each stage and every
+        counter, used for logging.
+
+        :return: Each stage's average in milliseconds and count, and
+            each counter's value
+        :rtype: dict
+        """
+
+        summary = {}
+        with self._lock:
+            stages = sorted(self.stages.items(), key=_sort_key)
+            counters = sorted(self.counters.items(), key=_sort_key)
+        for (stage, camera), histogram in stages:
+            if histogram.count:
+                summary[_summary_name(stage, camera)] = (
+                    round(histogram.total / histogram.count * 1000, 2),
+                    histogram.count
+                )
+        for (counter, camera), value in counters:
+            summary[_summary_name(counter, camera)] = value
+        return summary
+
+
+def _sort_key(item):
+    """Sorts metrics by name, then those without a camera first, then
+    by camera.
+    """
+
+    (name, camera), _ = item
+    return name, camera is not None, camera or ''
+
+
+def _labels(**labels):
+    """Renders the labels that are set in the Prometheus text format.
+
+    :return: The labels without their braces
+    :rtype: str
+    """
+
+    return ','.join(f'{key}="{value}"' for key, value in labels.items()
+                    if value is not None)
+
+
+def _summary_name(name: str, camera: str = None):
+    """Names a metric in the summary, adding its camera if it has one.
+
+    :return: The name
+    :rtype: str
+    """
+
+    return name if camera is None else f'{name}[{camera}]'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Answers scrapes of /metrics."""
+
+    def do_GET(self):
+        """Sends the rendered metrics."""
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type',
+                         'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keeps scrapes out of the console."""
+
+
+class MetricsServer:
+    """Serves the metrics over http on its own thread, so they can be
+    scraped by Prometheus or read with curl.
+
+    :param metrics: The metrics to be served
+    :type metrics: class`Metrics`
+    :param port: The port to listen on, defaults to 0 which picks any
+        free port
+    :type port: int, optional
+    :param host: The address to listen on, defaults to localhost only
+    :type host: str, optional
+    :param logger: An optional logger addon to log the server, defaults
+        to None
+    :type logger: class`logging.logger`, optional
+    """
+
+    def __init__(self, metrics: Metrics, port: int = 0,
+                 host: str = '127.0.0.1', logger=None):
+        """Constructs the class"""
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.logger = logger
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Starts serving. If the port can't be listened on, such as
+        when another exporter already uses it, the error is logged and
+        nothing is served, so the turret still starts.
+
+        :return: The server itself, so it can be started on creation
+        :rtype: class`MetricsServer`
+        """
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port),
+                                               _MetricsHandler)
+        except OSError:
+            if self.logger is not None:
+                self.logger.exception(
+                    f' Unable to serve metrics on {self.host}:{self.port}, '
+                    'carrying on without them.'
+                )
+            return self
+        self._server.daemon_threads = True
+        self._server.metrics = self.metrics
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='metrics',
+            daemon=True
+        )
+        self._thread.start()
+        if self.logger is not None:
+            self.logger.info(f' Metrics served on '
+                             f'http://{self.host}:{self.port}/metrics.')
+        return self
+
+    def stop(self):
+        """Stops serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class MetricsFile:
+    """Rewrites the metrics to a file every so often on its own thread,
+    for a node exporter's textfile collector or for reading by hand.
+
+    :param metrics: The metrics to be written
+    :type metrics: class`Metrics`
+    :param path: The path of the file
+    :type path: str
+    :param interval: The seconds between two writes, defaults to 10
+    :type interval: float, optional
+    :param logger: An optional logger addon to log failed writes,
+        defaults to None
+    :type logger: class`logging.logger`, optional
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 10,
+                 logger=None):
+        """Constructs the class"""
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.logger = logger
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts writing.
+
+        :return: The writer itself, so it can be started on creation
+        :rtype: class`MetricsFile`
+        """
+
+        self._thread = threading.Thread(
+            target=self._run, name='metrics-file', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """Writes the file every interval until stopped."""
+        while not self._stopped.wait(self.interval):
+            self.write()
+        self.write()
+
+    def write(self):
+        """Writes the file, replacing it in one go so a reader never
+        sees half of it.
+        """
+
+        temp_path = f'{self.path}.tmp'
+        try:
+            with open(temp_path, 'w') as outfile:
+                outfile.write(self.metrics.render())
+            os.replace(temp_path, self.path)
+        except OSError:
+            if self.logger is not None:
+                self.logger.warning(f' Unable to write {self.path}.',
+                                    exc_info=True)
+
+    def stop(self):
+        """Writes the file one last time and stops the thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+class StartupTimer:
+    """Times each phase of the turret starting up, including phases run
+    at the same time on other threads, so a slow start can be pinned
+    on the phase holding it up.
+    """
+
+    def __init__(self):
+        """Constructs the class"""
+        self.started = time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+        # When the startup began, and the name, thread, start and
+        # duration of each phase in seconds since then.
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the code run within the with statement as a phase.
+
+        :param name: The name of the phase
+        :type name: str
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            end_time = time.perf_counter()
+            with self._lock:
+                self.phases.append((
+                    name, threading.current_thread().name,
+                    start_time - self.started, end_time - start_time
+                ))
+
+    def elapsed(self):
+        """Gets the seconds since the startup began.
+
+        :return: The seconds
+        :rtype: float
+        """
+
+        return time.perf_counter() - self.started
+
+    def report(self):
+        """Describes every phase in the order they started.
+
+        :return: A line per phase with when it started, how long it
+            took and the thread it ran on, then the total
+        :rtype: str
+        """
+
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[2])
+        lines = [f'  {name:<16}+{start:6.2f}s {duration:6.2f}s  {thread}'
+                 for name, thread, start, duration in phases]
+        lines.append(f'  {"total":<16} {self.elapsed():7.2f}s')
+        return '\n'.join(lines)
+
+
+def main():
+    """Starts some module tests, measuring how much recording a timing
+    costs and printing a sample of the rendered metrics.
+    """
+
+    metrics = Metrics()
+    rounds = 200000
+    start_time = time.perf_counter()
+    for i in range(rounds):
+        metrics.observe('flip', (i % 100) / 10000)
+    per_call = (time.perf_counter() - start_time) / rounds
+    print(f'observe: {per_call * 1e6:.2f} us per call')
+
+    start_time = time.perf_counter()
+    for i in range(rounds):
+        metrics.inc('detections')
+    per_call = (time.perf_counter() - start_time) / rounds
+    print(f'inc: {per_call * 1e6:.2f} us per call')
+
+    metrics.watch('frames_dropped', lambda: 3, 'counter')
+    metrics.inc('frames', camera='cam0')
+    metrics.inc('frames', camera='cam1')
+    metrics.observe('scan', 0.12, camera='cam1')
+    server = MetricsServer(metrics, port=0).start()
+    from urllib.request import urlopen
+    with urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+        print(response.read().decode()[:600])
+    server.stop()
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
@@ -0,0 +1,136 @@
+"""This module's purpose is to cheaply tell when the camera's scene has
+changed, so the far more expensive object detector only needs to run
+when something is actually happening.
+"""
+
+import cv2  # For image processing.
+import time  # To time keep-alive scans.
+# imports the necessary code.
+
+
+class MotionGate:
+    """Compares a small greyscale copy of each frame against a slowly
+    updated background, waking the object detector only when enough of
+    the scene has changed or when a keep-alive scan is due.
+
+    :param size: The width and height frames are shrunk to before being
+        compared, defaults to (80, 60)
+    :type size: tuple, optional
+    :param threshold: How much a pixel's brightness has to change, out
+        of 255, for it to count as changed, defaults to 25
+    :type threshold: int, optional
+    :param min_changed: The fraction of pixels that have to change to
+        wake the detector, defaults to 0.01
+    :type min_changed: float, optional
+    :param learning_rate: How quickly the background takes in the
+        scene, from 0 to 1, defaults to 0.05
+    :type learning_rate: float, optional
+    :param keep_alive: The maximum amount of seconds between two
+        detector scans even when nothing changes, 0 for none, defaults
+        to 30
+    :type keep_alive: float, optional
+    """
+
+    def __init__(self,
+                 size: tuple = (80, 60),
+                 threshold: int = 25,
+                 min_changed: float = 0.01,
+                 learning_rate: float = 0.05,
+                 keep_alive: float = 30):
+        """Constructs the class"""
+        self.size = size
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.keep_alive = keep_alive
+
+        self.checked = 0
+        self.woken = 0
+        self.keep_alives = 0
+        self.skipped = 0
+        self.changed = 0.0
+        # Counters of frames checked, detector scans woken by a change
+        # or a keep-alive and scans skipped, and the fraction of the
+        # last frame that changed.
+
+        self._background = None
+        self._small = None
+        self._grey = None
+        self._reference = None
+        self._diff = None
+        self._last_wake = 0.0
+        # The background and the buffers reused for every frame.
+
+    def check(self, img, force: bool = False):
+        """Checks a frame for changes, updating the background.
+
+        :param img: The frame to be checked
+        :type img: class`numpy.ndarray`
+        :param force: Wakes the detector no matter what changed, used
+            while a target is being tracked, defaults to False
+        :type force: bool, optional
+
+        :return: True if the detector should scan the frame
+        :rtype: bool
+        """
+
+        self.checked += 1
+        self._small = cv2.resize(img, self.size, dst=self._small,
+                                 interpolation=cv2.INTER_AREA)
+        self._grey = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY,
+                                  dst=self._grey)
+        # Shrinks the frame first so the colour conversion is done on
+        # as few pixels as possible.
+
+        if self._background is None:
+            self._background = self._grey.astype('float32')
+            self.changed = 1.0
+        else:
+            self._reference = cv2.convertScaleAbs(self._background,
+                                                  dst=self._reference)
+            self._diff = cv2.absdiff(self._grey, self._reference,
+                                     dst=self._diff)
+            cv2.threshold(self._diff, self.threshold, 255,
+                          cv2.THRESH_BINARY, dst=self._diff)
+            self.changed = (cv2.countNonZero(self._diff)
+                            / (self.size[0] * self.size[1]))
+            cv2.accumulateWeighted(self._grey, self._background,
+                                   self.learning_rate)
+        # Finds the fraction of pixels that differ from the background
+        # then blends the frame into the background, the first frame
+        # always counts as changed.
+
+        now = time.monotonic()
+        if force or self.changed >= self.min_changed:
+            wake = True
+        elif self.keep_alive and now - self._last_wake >= self.keep_alive:
+            wake = True
+            self.keep_alives += 1
+        else:
+            wake = False
+        # Wakes the detector on a change, when forced or when no scan
+        # has happened for keep_alive seconds.
+
+        if wake:
+            self.woken += 1
+            self._last_wake = now
+        else:
+            self.skipped += 1
+        return wake
+
+    def stats(self):
+        """Returns the gate's counters.
+
+        :return: The checked, woken, keep-alive and skipped counts and
+            the fraction of scans skipped
+        :rtype: dict
+        """
+
+        return {
+            'checked': self.checked,
+            'woken': self.woken,
+            'keep_alives': self.keep_alives,
+            'skipped': self.skipped,
+            'skipped_ratio': (self.skipped / self.checked
+                              if self.checked else 0.0)
+        }
@@ -4,10 +4,256 @@ minimising the code needed to be used within other programs.
 
 import cv2
 import time
-from tflite_support.task import core
-from tflite_support.task import processor
-from tflite_support.task import vision
-# imports the necessary code.
+import threading
+import numpy as np
+from cameraModule import CameraStream
+from schedulerModule import DetectionScheduler
+from preprocessModule import Preprocessor
+# imports the necessary code. tflite_support is only imported when a
+# detector is made, so it can load on a background thread while the
+# rest of the turret starts up.
+
+
+class DetectionSet:
+    """Holds every detection of a scan in a few arrays instead of a
+    dictionary per object, with helpers that work on every detection
+    at once. Boxes are x, y, width and height in full frame pixels.
+
+    :param class_ids: The model's class id of each detection
+    :type class_ids: class`numpy.ndarray`
+    :param labels: The category name of each detection
+    :type labels: class`numpy.ndarray`
+    :param scores: The score of each detection
+    :type scores: class`numpy.ndarray`
+    :param boxes: The box of each detection, one row each
+    :type boxes: class`numpy.ndarray`
+    """
+
+    __slots__ = ('class_ids', 'labels', 'scores', 'boxes')
+
+    def __init__(self, class_ids, labels, scores, boxes):
+        """Constructs the class"""
+        self.class_ids = class_ids
+        self.labels = labels
+        self.scores = scores
+        self.boxes = boxes
+
+    @classmethod
+    def from_detections(cls, detections: list):
+        """Packs TFLite detections into a set, with the boxes as found
+        on the image given to the model.
+
+        :param detections: The detections of a TFLite detection result
+        :type detections: list
+
+        :return: The packed detections
+        :rtype: class`DetectionSet`
+        """
+
+        count = len(detections)
+        if not count:
+            return EMPTY_DETECTIONS
+        class_ids = np.empty(count, dtype=np.int16)
+        scores = np.empty(count, dtype=np.float32)
+        boxes = np.empty((count, 4), dtype=np.int32)
+        labels = []
+        for i, detection in enumerate(detections):
+            category = detection.categories[0]
+            bbox = detection.bounding_box
+            class_ids[i] = category.index
+            scores[i] = category.score
+            boxes[i] = (bbox.origin_x, bbox.origin_y,
+                        bbox.width, bbox.height)
+            labels.append(category.category_name)
+        return cls(class_ids, np.array(labels), scores, boxes)
+
+    def __len__(self):
+        """Gets the amount of detections."""
+        return len(self.scores)
+
+    def __contains__(self, label: str):
+        """Checks if any detection is of a category."""
+        return bool(np.any(self.labels == label))
+
+    def select(self, selection):
+        """Gets a set of only some of the detections.
+
+        :param selection: A category name, or a mask or indices of the
+            detections to keep
+        :type selection: str
+
+        :return: The selected detections
+        :rtype: class`DetectionSet`
+        """
+
+        if isinstance(selection, str):
+            selection = self.labels == selection
+        return DetectionSet(
+            self.class_ids[selection], self.labels[selection],
+            self.scores[selection], self.boxes[selection]
+        )
+
+    def centres(self):
+        """Gets the centre point of every box.
+
+        :return: The x and y of each centre, one row each
+        :rtype: class`numpy.ndarray`
+        """
+
+        return self.boxes[:, :2] + self.boxes[:, 2:] / 2
+
+    def areas(self):
+        """Gets the area of every box.
+
+        :return: The area of each box in pixels
+        :rtype: class`numpy.ndarray`
+        """
+
+        return self.boxes[:, 2] * self.boxes[:, 3]
+
+    def in_zone(self, left: float, top: float, right: float, bottom: float):
+        """Checks which boxes have their centre within a zone.
+
+        :param left: The left edge of the zone
+        :type left: float
+        :param top: The top edge of the zone
+        :type top: float
+        :param right: The right edge of the zone
+        :type right: float
+        :param bottom: The bottom edge of the zone
+        :type bottom: float
+
+        :return: True for each box centred within the zone
+        :rtype: class`numpy.ndarray`
+        """
+
+        centres = self.centres()
+        return ((centres[:, 0] >= left) & (centres[:, 0] <= right)
+                & (centres[:, 1] >= top) & (centres[:, 1] <= bottom))
+
+    def largest(self, label: str = None):
+        """Finds the detection with the largest box.
+
+        :param label: Only looks at detections of this category,
+            defaults to every category
+        :type label: str, optional
+
+        :return: The index of the detection, or None if there are none
+        :rtype: int
+        """
+
+        areas = self.areas()
+        if label is not None:
+            areas = np.where(self.labels == label, areas, -1)
+        if not len(areas) or areas.max() < 0:
+            return None
+        return int(areas.argmax())
+
+
+EMPTY_DETECTIONS = DetectionSet(
+    np.empty(0, dtype=np.int16), np.empty(0, dtype='<U1'),
+    np.empty(0, dtype=np.float32), np.empty((0, 4), dtype=np.int32)
+)
+# Shared by every scan that finds nothing, so those cost nothing.
+
+
+def draw_detections(img, detected: DetectionSet):
+    """Draws a box and label around each detected object.
+
+    :param img: The image to be drawn onto
+    :type img: class`numpy.ndarray`
+    :param detected: The detections to be drawn
+    :type detected: class`DetectionSet`
+
+    :return: The image with the boxes drawn
+    :rtype: class`numpy.ndarray`
+    """
+
+    _MARGIN = 10  # pixels
+    _ROW_SIZE = 10  # pixels
+    _FONT_SIZE = 1
+    _FONT_THICKNESS = 1
+    _TEXT_COLOR = (0, 0, 255)  # red
+    # Sets variables for adding the box surrounding detected
+    # objects.
+
+    for box, label, score in zip(detected.boxes.tolist(),
+                                 detected.labels, detected.scores):
+        # Draw bounding_box
+        origin_x, origin_y, width, height = box
+        start_point = (
+            origin_x,
+            origin_y
+        )
+        end_point = (
+            origin_x + width,
+            origin_y + height
+        )
+        # Stores the dimensions of the box.
+
+        cv2.rectangle(
+            img, start_point,
+            end_point, _TEXT_COLOR,
+            3
+        )
+        # Adds the box surrounding the object.
+
+        probability = round(float(score), 2)
+        result_text = f'{label} ({str(probability)}'
+        text_location = (
+            _MARGIN + origin_x,
+            _MARGIN + _ROW_SIZE + origin_y
+        )
+        # Draw label and score
+
+        cv2.putText(
+            img, result_text,
+            text_location, cv2.FONT_HERSHEY_PLAIN,
+            _FONT_SIZE, _TEXT_COLOR,
+            _FONT_THICKNESS
+        )
+
+    return img
+
+
+class ModelVariant:
+    """A detection model the turret can run, with the input size it
+    was exported for, so frames are shrunk to exactly what the model
+    takes in and its boxes are scaled back up to the full frame.
+
+    :param path: The path of the TFLite model
+    :type path: str
+    :param input_size: The width and height the model takes in
+    :type input_size: tuple
+    :param quantized: If the model's weights are int8, which runs
+        faster on the Pi's CPU for a little accuracy, defaults to False
+    :type quantized: bool, optional
+    """
+
+    __slots__ = ('path', 'input_size', 'quantized')
+
+    def __init__(self, path: str, input_size: tuple,
+                 quantized: bool = False):
+        """Constructs the class"""
+        self.path = path
+        self.input_size = input_size
+        self.quantized = quantized
+
+
+MODEL_VARIANTS = {
+    'efficientdet_lite0': ModelVariant(
+        './models/efficientdet_lite0.tflite', (320, 320)
+    ),
+    'efficientdet_lite0_int8': ModelVariant(
+        './models/efficientdet_lite0_int8.tflite', (320, 320), True
+    ),
+    'ssd_mobilenet_v1_int8': ModelVariant(
+        './models/ssd_mobilenet_v1_int8.tflite', (300, 300), True
+    )
+}
+# The models the turret knows by name, placed in the models folder.
+# Other exports, such as an efficientdet_lite0 trained at a smaller
+# input size, can be added here or passed to the detector by path.
 
 
 class ObjectDetector:
@@ -16,23 +262,55 @@ class ObjectDetector:
                  size: tuple = (640, 480),
                  num_threads: int = 4,
                  max_results: int = 3,
-                 score_threshold: float = 0.5):
+                 score_threshold: float = 0.5,
+                 input_size: tuple = None,
+                 flip: bool = False,
+                 metrics=None):
         """Continuously run inference on images acquired from the camera.
 
-        :param model: Path location of the TFLite object detection model.
+        :param model: Path location of the TFLite object detection model,
+            or the name of one of MODEL_VARIANTS.
         :type model: str, defaults to `./models/efficientdet_lite0.tflite`
             size: The width and height of the frame captured from the camera.
             num_threads: The number of CPU threads to run the model.
             draw_image: To show the capture with additional information.
+        :param input_size: The width and height the model takes in,
+            frames are shrunk to it into reused buffers before being
+            handed over, defaults to None which uses the variant's own
+            input size, or hands frames over as they are for a model
+            given by path
+        :type input_size: tuple, optional
+        :param flip: If frames are upside down as captured and only the
+            model's input should be turned upright, defaults to False
+        :type flip: bool, optional
+        :param metrics: Optional metrics to time the preprocessing and
+            inference into, defaults to None
+        :type metrics: class`metricsModule.Metrics`, optional
         """
 
+        variant = MODEL_VARIANTS.get(model)
+        if variant is not None:
+            model = variant.path
+            input_size = input_size or variant.input_size
+        self.variant = variant
+        # A named variant brings its path and input size, anything
+        # else is taken as a path.
+
         self.model = model
         self.size = size
         self.num_threads = num_threads
         self.max_results = max_results
         self.score_threshold = score_threshold
+        self.metrics = metrics
+        self.preprocessor = Preprocessor(input_size, flip)
         # Sets the variables for the class.
 
+        from tflite_support.task import core
+        from tflite_support.task import processor
+        from tflite_support.task import vision
+        self._tensor_image = vision.TensorImage
+        # Imports the TFLite task library on first use.
+
         base_options = core.BaseOptions(
             file_name=self.model,
             num_threads=self.num_threads
@@ -53,113 +331,527 @@ class ObjectDetector:
         self.detector = vision.ObjectDetector.create_from_options(options)
         # Initialises the detector from the object model.
 
-    def find_object(self, img, draw=True):
+        self.offset = (0, 0)
+        self.detected = EMPTY_DETECTIONS
+        # Where the last scanned region sits within the full frame,
+        # and what was found there.
+
+    def warm_up(self, runs: int = 1):
+        """Runs the model over a blank image, as the first inference
+        after loading is far slower than the rest while memory is set
+        up, so it is paid before the turret is armed rather than on the
+        first real frame. Nothing is counted or timed.
+
+        :param runs: The amount of inferences run, defaults to 1
+        :type runs: int, optional
+
+        :return: The seconds the warm-up took
+        :rtype: float
+        """
+
+        start_time = time.perf_counter()
+        width, height = self.preprocessor.input_size or self.size
+        blank = np.zeros((height, width, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.detector.detect(self._tensor_image.create_from_array(blank))
+        return time.perf_counter() - start_time
+
+    def find_object(self, img, draw=False, roi=None, flip=None):
+        """Runs the detector over the image, or only a region of it.
+
+        :param img: The image to be scanned
+        :type img: class`numpy.ndarray`
+        :param draw: Draws the detected objects onto the image, only
+            wanted for previews of upright images as the boxes can be
+            drawn onto a copy with `draw` later, defaults to False
+        :type draw: bool, optional
+        :param roi: The x, y, width and height of the region to be
+            scanned within the upright image, defaults to None which
+            scans the whole image
+        :type roi: tuple, optional
+        :param flip: If the image is upside down, defaults to None which
+            uses the detector's own setting
+        :type flip: bool, optional
+
+        :return: The image
+        :rtype: class`numpy.ndarray`
+        """
+
         self.img = img
         # Allows other classes to access img.
 
-        rgb_img = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)
-        # Convert the image from BGR to RGB as required by the TFLite model.
+        prepare_start = time.perf_counter()
+        rgb_img = self.preprocessor.prepare(img, roi, flip)
+        self.offset = self.preprocessor.offset
+        # Crops the image down to the region, shrinks it to the model's
+        # input, turns it upright if needed and converts it from BGR to
+        # RGB as required by the TFLite model, all into reused buffers.
 
-        input_tensor = vision.TensorImage.create_from_array(rgb_img)
+        detect_start = time.perf_counter()
+        input_tensor = self._tensor_image.create_from_array(rgb_img)
         # Create a TensorImage object from the RGB image.
 
         self.results = self.detector.detect(input_tensor)
         # Run object detection estimation using the model.
 
-        if self.results.detections:
-            # Checks if anything was detected.
-            if draw:
-                _MARGIN = 10  # pixels
-                _ROW_SIZE = 10  # pixels
-                _FONT_SIZE = 1
-                _FONT_THICKNESS = 1
-                _TEXT_COLOR = (0, 0, 255)  # red
-                # Sets variables for adding the box surrounding detected
-                # objects.
-
-                for detection in self.results.detections:
-                    # Draw bounding_box
-                    bbox = detection.bounding_box
-                    start_point = (
-                        bbox.origin_x,
-                        bbox.origin_y
-                    )
-                    end_point = (
-                        bbox.origin_x + bbox.width,
-                        bbox.origin_y + bbox.height
-                    )
-                    # Stores the dimensions of the box.
+        if self.metrics is not None:
+            detect_end = time.perf_counter()
+            self.metrics.observe('preprocess', detect_start - prepare_start)
+            self.metrics.observe('detect', detect_end - detect_start)
+        # Times the preprocessing and the inference separately.
 
-                    cv2.rectangle(
-                        img, start_point,
-                        end_point, _TEXT_COLOR,
-                        3
-                    )
-                    # Adds the box surrounding the object.
-
-                    category = detection.categories[0]
-                    category_name = category.category_name
-                    probability = round(category.score, 2)
-                    result_text = f'{category_name} ({str(probability)}'
-                    text_location = (
-                        _MARGIN + bbox.origin_x,
-                        _MARGIN + _ROW_SIZE + bbox.origin_y
-                    )
-                    # Draw label and score
+        self.detected = DetectionSet.from_detections(self.results.detections)
+        self.preprocessor.remap(self.detected.boxes)
+        # Packs the detections, scaling their boxes from the model's
+        # input back up and moving them into place in the full frame.
 
-                    cv2.putText(
-                        img, result_text,
-                        text_location, cv2.FONT_HERSHEY_PLAIN,
-                        _FONT_SIZE, _TEXT_COLOR,
-                        _FONT_THICKNESS
-                    )
+        if draw:
+            self.draw(img)
+        # Adds the boxes surrounding detected objects if wanted.
 
         return img
 
+    def draw(self, img, detected: DetectionSet = None):
+        """Draws a box and label around each detected object.
+
+        :param img: The image to be drawn onto
+        :type img: class`numpy.ndarray`
+        :param detected: The detections to be drawn, defaults to the
+            detections of the last `find_object` call
+        :type detected: class`DetectionSet`, optional
+
+        :return: The image with the boxes drawn
+        :rtype: class`numpy.ndarray`
+        """
+
+        if detected is None:
+            detected = self.detected
+        return draw_detections(img, detected)
+
     def find_position(self):
         """Finds the position of the detected objects and returns a
-        dictionary of relevant information.
+        dictionary of relevant information. Only one object is kept
+        per category, `detected` holds every object.
 
         :return: A dictionary of points of objects detected
         :rtype: dict
         """
 
         lm_dict = {}
-        if self.results.detections:
-            # Checks if anything was detected.
-            for obj_id, obj_info in enumerate(self.results.detections):
-                obj_box = obj_info.bounding_box
-
-                cx = int((obj_box.width/2)+obj_box.origin_x)
-                cy = int((obj_box.height/2)+obj_box.origin_y)
-                # Gets the centre points of the object.
-
-                lm_dict[obj_info.categories[0].category_name] = {
-                    'obj_id': obj_id,
-                    'origin_x': obj_box.origin_x,
-                    'origin_y': obj_box.origin_y,
-                    'width': obj_box.width,
-                    'height': obj_box.height,
-                    'centre_x': cx,
-                    'centre_y': cy
-                }
-                # Adds the category and its object id's positional
-                # information.
+        detected = self.detected
+        centres = detected.centres().astype(int).tolist()
+        for obj_id, (box, label) in enumerate(zip(detected.boxes.tolist(),
+                                                  detected.labels)):
+            lm_dict[str(label)] = {
+                'obj_id': obj_id,
+                'origin_x': box[0],
+                'origin_y': box[1],
+                'width': box[2],
+                'height': box[3],
+                'centre_x': centres[obj_id][0],
+                'centre_y': centres[obj_id][1]
+            }
+            # Adds the category and its object id's positional
+            # information.
 
         return lm_dict
         # Stops the function and returns what is lm_dict.
 
 
+class RoiSelector:
+    """Picks the region of the frame the detector should scan. While a
+    target is being followed only an expanded window around where it
+    was last seen is scanned, falling back to a full frame scan every
+    `full_scan_every` scans or as soon as the target is lost.
+
+    :param frame_size: The width and height of the full frame, defaults
+        to (640, 480)
+    :type frame_size: tuple, optional
+    :param target: The category name of the target, defaults to
+        `person`
+    :type target: str, optional
+    :param expand: How many times larger than the target's box the
+        window is, defaults to 2.0
+    :type expand: float, optional
+    :param min_size: The smallest width and height of the window,
+        defaults to (192, 192)
+    :type min_size: tuple, optional
+    :param full_scan_every: The maximum amount of window scans in a row
+        before a full frame scan, defaults to 5
+    :type full_scan_every: int, optional
+    """
+
+    def __init__(self,
+                 frame_size: tuple = (640, 480),
+                 target: str = 'person',
+                 expand: float = 2.0,
+                 min_size: tuple = (192, 192),
+                 full_scan_every: int = 5):
+        """Constructs the class"""
+        self.frame_size = frame_size
+        self.target = target
+        self.expand = expand
+        self.min_size = min_size
+        self.full_scan_every = full_scan_every
+
+        self.roi_scans = 0
+        self.full_scans = 0
+        # Counters of window and full frame scans.
+
+        self._box = None
+        self._since_full = 0
+
+    def next(self):
+        """Gets the region for the next scan.
+
+        :return: The x, y, width and height of the region, or None for
+            a full frame scan
+        :rtype: tuple
+        """
+
+        if self._box is None or self._since_full >= self.full_scan_every:
+            self._since_full = 0
+            self.full_scans += 1
+            return None
+        # Scans the full frame when there's no target or one is due.
+
+        origin_x, origin_y, width, height = self._box
+        frame_w, frame_h = self.frame_size
+        w = min(max(int(width * self.expand), self.min_size[0]), frame_w)
+        h = min(max(int(height * self.expand), self.min_size[1]), frame_h)
+        x = min(max(int(origin_x + width / 2 - w / 2), 0), frame_w - w)
+        y = min(max(int(origin_y + height / 2 - h / 2), 0), frame_h - h)
+        # Grows the box around its centre, then slides it to keep it
+        # inside the frame.
+
+        self._since_full += 1
+        self.roi_scans += 1
+        return (x, y, w, h)
+
+    def update(self, detected: DetectionSet):
+        """Takes in the objects found by a scan, following the largest
+        target if one was found and dropping it if not.
+
+        :param detected: The objects found by the scan
+        :type detected: class`DetectionSet`
+        """
+
+        index = detected.largest(self.target)
+        if index is None:
+            self._box = None
+            return
+        self._box = tuple(detected.boxes[index].tolist())
+
+
+class DetectionResult:
+    """Holds the outcome of one detection run and which frame it came
+    from.
+
+    :param detected: Every object found
+    :type detected: class`DetectionSet`
+    :param timestamp: The capture time of the frame that was scanned
+    :type timestamp: float
+    :param seq: The sequence number of the frame that was scanned
+    :type seq: int
+    :param latency: How long the detection took in seconds
+    :type latency: float
+    :param roi: The region that was scanned, None for the full frame,
+        defaults to None
+    :type roi: tuple, optional
+    :param camera: The name of the camera the frame came from, defaults
+        to None
+    :type camera: str, optional
+    """
+
+    __slots__ = ('detected', 'timestamp', 'seq', 'latency', 'roi',
+                 'camera')
+
+    def __init__(self, detected: DetectionSet, timestamp: float, seq: int,
+                 latency: float, roi: tuple = None, camera: str = None):
+        """Constructs the class"""
+        self.detected = detected
+        self.timestamp = timestamp
+        self.seq = seq
+        self.latency = latency
+        self.roi = roi
+        self.camera = camera
+
+
+class _PoolCamera:
+    """The detector pool's state for one camera."""
+
+    __slots__ = ('name', 'roi_selector', 'flip', 'pending', 'result',
+                 'scanning', 'submitted', 'completed', 'dropped',
+                 'total_latency')
+
+    def __init__(self, name: str, roi_selector, flip: bool):
+        """Constructs the class"""
+        self.name = name
+        self.roi_selector = roi_selector
+        self.flip = flip
+        self.pending = None
+        self.result = None
+        self.scanning = False
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+
+
+class DetectorPool:
+    """Shares a few `ObjectDetector`s between any amount of cameras,
+    each detector running on its own thread so the program feeding
+    them frames never waits on inference. Every camera keeps only its
+    newest frame waiting, and idle detectors take the cameras in turn
+    so a busy camera can't starve the others. A camera is only ever
+    scanned by one detector at a time, keeping its results in order.
+
+    :param detectors: The initialised object detectors, one per thread
+    :type detectors: list
+    :param logger: An optional logger addon to log the pool, defaults
+        to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time each camera's scans into,
+        defaults to None
+    :type metrics: class`metricsModule.Metrics`, optional
+    """
+
+    def __init__(self, detectors: list, logger=None, metrics=None):
+        """Constructs the class"""
+        self.detectors = list(detectors)
+        self.logger = logger
+        self.metrics = metrics
+
+        self._cameras = {}
+        self._order = []
+        self._turn = 0
+        self._running = False
+        self._threads = []
+        self._cond = threading.Condition()
+        # Each camera's waiting frame, newest result and counters, the
+        # order cameras take turns in and whose turn is next, all
+        # guarded by the condition.
+
+    def add_camera(self, name: str, roi_selector: RoiSelector = None,
+                   flip: bool = False):
+        """Adds a camera to be scanned.
+
+        :param name: The name the camera's frames and results are
+            tagged with
+        :type name: str
+        :param roi_selector: An optional selector of the region to
+            scan, defaults to None which always scans the full frame
+        :type roi_selector: class`RoiSelector`, optional
+        :param flip: If the camera's frames are upside down, defaults
+            to False
+        :type flip: bool, optional
+        """
+
+        with self._cond:
+            self._cameras[name] = _PoolCamera(name, roi_selector, flip)
+            self._order.append(name)
+
+    def start(self):
+        """Starts a thread per detector.
+
+        :return: The pool itself, so it can be started on creation
+        :rtype: class`DetectorPool`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        for index, detector in enumerate(self.detectors):
+            thread = threading.Thread(
+                target=self._run, args=(detector,),
+                name=f'detection-{index}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self.logger is not None:
+            self.logger.info(f' Detector pool started with '
+                             f'{len(self.detectors)} detectors.')
+        return self
+
+    def submit(self, name: str, img, timestamp: float, seq: int):
+        """Hands a camera's frame to the pool without waiting, replacing
+        any of its frames that have not been scanned yet. The image
+        must not be changed afterwards as a detector reads it later.
+
+        :param name: The camera's name
+        :type name: str
+        :param img: The image to be scanned
+        :type img: class`numpy.ndarray`
+        :param timestamp: The capture time of the image
+        :type timestamp: float
+        :param seq: The sequence number of the image
+        :type seq: int
+        """
+
+        with self._cond:
+            camera = self._cameras[name]
+            if camera.pending is not None:
+                camera.dropped += 1
+            camera.pending = (img, timestamp, seq, time.monotonic())
+            camera.submitted += 1
+            self._cond.notify()
+
+    def busy(self, name: str):
+        """Checks if a camera has a frame waiting or being scanned.
+
+        :param name: The camera's name
+        :type name: str
+
+        :return: True if the camera is busy
+        :rtype: bool
+        """
+
+        camera = self._cameras[name]
+        return camera.pending is not None or camera.scanning
+
+    def latest(self, name: str, max_age: float = None):
+        """Returns a camera's newest detection result.
+
+        :param name: The camera's name
+        :type name: str
+        :param max_age: The maximum age in seconds, measured from the
+            capture of the scanned frame, for a result to be returned,
+            defaults to None which returns any age
+        :type max_age: float, optional
+
+        :return: The newest result, or None if there isn't a fresh one
+        :rtype: class`DetectionResult`
+        """
+
+        result = self._cameras[name].result
+        if (result is not None and max_age is not None
+                and time.monotonic() - result.timestamp > max_age):
+            return None
+        return result
+
+    def _take(self):
+        """Finds the next camera in turn with a frame waiting that
+        isn't already being scanned, call with the condition held.
+
+        :return: The camera, or None if there isn't one
+        :rtype: class`_PoolCamera`
+        """
+
+        count = len(self._order)
+        for offset in range(count):
+            camera = self._cameras[self._order[(self._turn + offset)
+                                               % count]]
+            if camera.pending is not None and not camera.scanning:
+                self._turn = (self._turn + offset + 1) % count
+                return camera
+        return None
+
+    def _run(self, detector: ObjectDetector):
+        """Scans the cameras' waiting frames in turn for as long as the
+        pool is running, publishing each result.
+
+        :param detector: The detector used by this thread
+        :type detector: class`ObjectDetector`
+        """
+
+        while True:
+            with self._cond:
+                camera = None
+                while self._running:
+                    camera = self._take()
+                    if camera is not None:
+                        break
+                    self._cond.wait()
+                if camera is None:
+                    break
+                img, timestamp, seq, submitted_at = camera.pending
+                camera.pending = None
+                camera.scanning = True
+            # Takes the next camera's newest frame, leaving room for
+            # its next one.
+
+            roi = (camera.roi_selector.next()
+                   if camera.roi_selector is not None else None)
+            start_time = time.monotonic()
+            try:
+                detector.find_object(img, roi=roi, flip=camera.flip)
+                detected = detector.detected
+                if camera.roi_selector is not None:
+                    camera.roi_selector.update(detected)
+            except Exception:
+                detected = None
+                if self.logger is not None:
+                    self.logger.exception(
+                        f' Detection failed on camera {camera.name}.'
+                    )
+            latency = time.monotonic() - start_time
+            # Runs the detector without drawing, as the frame still
+            # belongs to the caller, over the region around the last
+            # target if there is one.
+
+            with self._cond:
+                camera.scanning = False
+                if detected is not None:
+                    camera.result = DetectionResult(
+                        detected, timestamp, seq, latency, roi,
+                        camera.name
+                    )
+                    camera.completed += 1
+                    camera.total_latency += latency
+                self._cond.notify()
+            # Publishes the result tagged with the camera and frame it
+            # came from, and lets another detector take the camera's
+            # next frame.
+
+            if self.metrics is not None and detected is not None:
+                self.metrics.observe('scan_wait', start_time - submitted_at,
+                                     camera=camera.name)
+                self.metrics.observe('scan', latency, camera=camera.name)
+
+    def stats(self):
+        """Returns each camera's counters.
+
+        :return: For each camera, the frames submitted, scanned and
+            dropped and the average scan latency in seconds
+        :rtype: dict
+        """
+
+        with self._cond:
+            return {
+                camera.name: {
+                    'submitted': camera.submitted,
+                    'completed': camera.completed,
+                    'dropped': camera.dropped,
+                    'avg_latency': (camera.total_latency / camera.completed
+                                    if camera.completed else None)
+                }
+                for camera in self._cameras.values()
+            }
+
+    @property
+    def dropped(self):
+        """The frames dropped across every camera."""
+        return sum(camera.dropped for camera in self._cameras.values())
+
+    def stop(self):
+        """Stops the detection threads."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+
 def main():
     """Starts some module tests, to check if this module works."""
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    # Sets the camera up for opencv, limits the camera resolution for
-    # resource usage.
+    camera = CameraStream(0, (640, 480)).start()
+    # Starts reading the camera on its own thread, limits the camera
+    # resolution for resource usage.
 
     detector = ObjectDetector()
-    # Initiates the object detection module.
+    scheduler = DetectionScheduler()
+    # Initiates the object detection module, and the scheduler which
+    # picks how often it runs.
 
     counter, fps = 0, 0
     start_time = time.time()
@@ -171,20 +863,27 @@ def main():
     fps_avg_frame_count = 10
     # Variables for setting up the fps view in opencv.imshow.
 
-    while cap.isOpened():
-        # While the camera is being accessed the code within the while loop
-        # will loop.
-
-        success, img = cap.read()
-        img = cv2.flip(img, -1)
-        # Stores if the camera was successfully accessed and the current
-        # visual feed of the camera.
-
-        if counter % 12 == 0:
-            img = detector.find_object(img)
+    lm_dict = {}
+    while True:
+        # Loops until the camera stops working.
+
+        frame = camera.read()
+        if frame is None:
+            break
+        img = cv2.flip(frame.img, -1)
+        # Gets the newest frame from the camera stream and flips it.
+
+        scheduler.tick(frame.timestamp)
+        if scheduler.due('person' in lm_dict):
+            scheduler.scheduled()
+            detect_start = time.monotonic()
+            img = detector.find_object(img, draw=True)
             lm_dict = detector.find_position()
-            # Checks if the counter is a multiple of 12 and
-            # if so detect the image for objects and return objects.
+            scheduler.record_result(
+                'person' in lm_dict, time.monotonic() - detect_start
+            )
+            # Checks if the scheduler wants a scan and if so detect the
+            # image for objects and return objects, timing the scan.
 
         counter += 1
         # A counter for both fps and detection calculations.
@@ -197,7 +896,9 @@ def main():
             # the previous fps_avg_frame_count (10) frames, while resetting
             # the start time.
 
-        fps_text = 'FPS = {:.1f}'.format(fps)
+        fps_text = 'FPS = {:.1f} Scan every {:.1f} frames'.format(
+            fps, scheduler.cadence
+        )
         text_location = (left_margin, row_size)
         cv2.putText(
             img, fps_text,
@@ -0,0 +1,197 @@
+"""This module's purpose is to turn camera frames into the detector's
+input, shrinking, flipping and colour converting them into buffers
+that are reused for every frame, so no new image is made per scan.
+"""
+
+import cv2  # For image processing.
+import time  # To time preprocessing.
+import numpy as np  # For the reused buffers.
+# imports the necessary code.
+
+
+class Preprocessor:
+    """Prepares a frame, or a region of it, for the detector. The
+    region is shrunk to the model's input size first, so flipping and
+    converting to RGB only touch the model's pixels, and every step
+    writes into a buffer made once. Boxes found on the prepared image
+    are mapped back onto the upright full frame with `remap`.
+
+    :param input_size: The width and height the model takes in, None
+        to hand the region over at its own size, defaults to (320, 320)
+    :type input_size: tuple, optional
+    :param flip: If frames are upside down, as captured by the
+        turret's camera, and are turned upright here, defaults to False
+    :type flip: bool, optional
+    :param interpolation: The opencv resize interpolation, defaults to
+        bilinear which matches what the model would do itself
+    :type interpolation: int, optional
+    """
+
+    def __init__(self,
+                 input_size: tuple = (320, 320),
+                 flip: bool = False,
+                 interpolation: int = cv2.INTER_LINEAR):
+        """Constructs the class"""
+        self.input_size = tuple(input_size) if input_size else None
+        self.flip = flip
+        self.interpolation = interpolation
+
+        self.scale = (1.0, 1.0)
+        self.offset = (0, 0)
+        # How much the last prepared region was shrunk by and where it
+        # sits within the upright frame.
+
+        self.frames = 0
+        self.allocations = 0
+        self.total_time = 0.0
+        # Counters of frames prepared, buffers made and the seconds
+        # spent preparing.
+
+        self._resized = None
+        self._rgb = None
+
+    def _buffer(self, buffer, shape: tuple):
+        """Gets a buffer of a shape, only making a new one when the
+        shape has changed.
+
+        :return: The buffer
+        :rtype: class`numpy.ndarray`
+        """
+
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.allocations += 1
+        return buffer
+
+    def prepare(self, img, roi: tuple = None, flip: bool = None):
+        """Prepares a frame for the detector.
+
+        :param img: The frame as captured
+        :type img: class`numpy.ndarray`
+        :param roi: The x, y, width and height of the region to be
+            prepared within the upright frame, defaults to None which
+            prepares the whole frame
+        :type roi: tuple, optional
+        :param flip: If the frame is upside down, defaults to None which
+            uses the preprocessor's own setting
+        :type flip: bool, optional
+
+        :return: The prepared RGB image, which is overwritten by the
+            next call
+        :rtype: class`numpy.ndarray`
+        """
+
+        start_time = time.perf_counter()
+        flip = self.flip if flip is None else flip
+        frame_h, frame_w = img.shape[:2]
+        x, y, w, h = roi if roi is not None else (0, 0, frame_w, frame_h)
+        if flip:
+            crop = img[frame_h - y - h:frame_h - y,
+                       frame_w - x - w:frame_w - x]
+        else:
+            crop = img[y:y + h, x:x + w]
+        self.offset = (x, y)
+        # Crops the region straight out of the frame as captured, an
+        # upside down frame holds it mirrored on both axes.
+
+        if self.input_size is not None:
+            out_w, out_h = self.input_size
+            self._resized = self._buffer(self._resized, (out_h, out_w, 3))
+            cv2.resize(crop, self.input_size, dst=self._resized,
+                       interpolation=self.interpolation)
+            source = self._resized
+        else:
+            out_w, out_h = w, h
+            source = crop
+        self.scale = (w / out_w, h / out_h)
+        # Shrinks the region to the model's input before anything else
+        # so the remaining steps work on as few pixels as possible.
+
+        self._rgb = self._buffer(self._rgb, (out_h, out_w, 3))
+        if flip:
+            cv2.flip(source, -1, dst=self._rgb)
+            cv2.cvtColor(self._rgb, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        else:
+            cv2.cvtColor(source, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        # Turns the image upright and converts it from BGR to RGB as
+        # required by the TFLite model, converting in place.
+
+        self.frames += 1
+        self.total_time += time.perf_counter() - start_time
+        return self._rgb
+
+    def remap(self, boxes):
+        """Maps boxes found on the last prepared image back onto the
+        upright full frame, in place.
+
+        :param boxes: The x, y, width and height of each box, one row
+            each
+        :type boxes: class`numpy.ndarray`
+
+        :return: The boxes
+        :rtype: class`numpy.ndarray`
+        """
+
+        if self.scale != (1.0, 1.0):
+            scaled = boxes * np.array(self.scale * 2)
+            np.rint(scaled, out=scaled)
+            boxes[:] = scaled
+        boxes[:, 0] += self.offset[0]
+        boxes[:, 1] += self.offset[1]
+        return boxes
+
+    def stats(self):
+        """Returns the preprocessor's counters.
+
+        :return: The frames prepared, the buffers made, the buffers
+            made per frame and the average milliseconds per frame
+        :rtype: dict
+        """
+
+        return {
+            'frames': self.frames,
+            'allocations': self.allocations,
+            'allocations_per_frame': (self.allocations / self.frames
+                                      if self.frames else 0.0),
+            'avg_ms': (self.total_time / self.frames * 1000
+                       if self.frames else 0.0)
+        }
+
+
+class UprightFrame:
+    """Turns the turret's upside down frames upright into one reused
+    buffer, at most once per frame and only when something needs it,
+    such as an alert snapshot or the camera window.
+
+    :param flip: If frames are upside down, defaults to True
+    :type flip: bool, optional
+    """
+
+    def __init__(self, flip: bool = True):
+        """Constructs the class"""
+        self.flip = flip
+        self.flipped = 0
+        self._buffer = None
+        self._seq = None
+
+    def get(self, frame):
+        """Gets a frame upright. The image is overwritten by the next
+        frame, so anything kept longer must be a copy.
+
+        :param frame: The frame as captured
+        :type frame: class`cameraModule.Frame`
+
+        :return: The upright image
+        :rtype: class`numpy.ndarray`
+        """
+
+        if not self.flip:
+            return frame.img
+        if frame.seq != self._seq:
+            self._buffer = cv2.flip(frame.img, -1, dst=(
+                self._buffer if self._buffer is not None
+                and self._buffer.shape == frame.img.shape else None
+            ))
+            self._seq = frame.seq
+            self.flipped += 1
+        return self._buffer
@@ -0,0 +1,736 @@
+"""This module's purpose is to run the turret's real control loop off
+the Pi, replaying a video or a folder of images in place of the camera
+with fake GPIO and pigpio backends, a scripted door and motion sensor
+timeline and a local smtp server catching the alert emails. It reports
+the frames per second, how long servo commands take to follow the
+frame they were aimed from and how long alerts take to arrive, so
+performance can be measured the same way on any Linux box.
+
+Run from the project folder, for example:
+`python replayModule.py footage.mp4 --door 5:20 --pir 3:8`
+"""
+
+import os  # For listing image folders.
+import sys  # To put the fake backends in place of the real ones.
+import json  # For the json report.
+import time  # To pace the replay and time everything.
+import types  # For the fake modules.
+import email  # To read the caught alert emails.
+import argparse  # For the command line options.
+import tempfile  # For the throwaway capture and log folders.
+import threading  # To play the footage in the background.
+import socketserver  # For the local smtp server.
+import cv2  # For reading the footage.
+
+import inputModule
+from cameraModule import Frame
+# imports the necessary code.
+
+
+class ReplayStream:
+    """Plays a video file or a folder of images as if it were the
+    camera, with the same methods as `cameraModule.CameraStream`. In
+    real time frames arrive at the footage's frame rate and frames the
+    loop is too slow for are dropped, like a real camera. Otherwise
+    every frame is handed out as fast as the loop asks for them. Once
+    the footage runs out `read` raises KeyboardInterrupt, stopping the
+    loop the same way ctrl+c does.
+
+    :param source: The path of a video file or of a folder of images
+    :type source: str
+    :param size: The width and height frames are resized to, defaults
+        to (640, 480)
+    :type size: tuple, optional
+    :param fps: The frame rate of the footage, defaults to the video's
+        own or 15 for a folder
+    :type fps: float, optional
+    :param realtime: If frames are paced at the frame rate, defaults to
+        True
+    :type realtime: bool, optional
+    :param upright: If the footage is already the right way up, so it
+        is turned over to match the upside down camera, defaults to
+        False
+    :type upright: bool, optional
+    """
+
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+    def __init__(self,
+                 source: str,
+                 size: tuple = (640, 480),
+                 fps: float = None,
+                 realtime: bool = True,
+                 upright: bool = False):
+        """Constructs the class"""
+        self.camera_id = source
+        self.size = size
+        self.realtime = realtime
+        self.upright = upright
+
+        self.captured = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.overruns = 0
+        self.failed_reads = 0
+        self.first_read = None
+        self.last_read = None
+        # The same counters as the camera stream, and when the first
+        # and last frames were read.
+
+        if os.path.isdir(source):
+            self._images = sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith(self.image_extensions)
+            )
+            self.cap = None
+            self.fps = fps or 15.0
+        else:
+            self._images = None
+            self.cap = cv2.VideoCapture(source)
+            if not self.cap.isOpened():
+                raise RuntimeError(f'Unable to open the footage {source}.')
+            self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 15.0
+        # Reads a folder's images in name order, or the video.
+
+        self._index = 0
+        self._frame = None
+        self._last_seq = 0
+        self._finished = False
+        self._started_at = None
+        self._running = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def _next_image(self):
+        """Reads the next frame of the footage.
+
+        :return: The frame's image, or None once the footage has run
+            out
+        :rtype: class`numpy.ndarray`
+        """
+
+        if self._images is None:
+            success, img = self.cap.read()
+            if not success:
+                return None
+        else:
+            img = None
+            while img is None and self._index < len(self._images):
+                img = cv2.imread(self._images[self._index])
+                if img is None:
+                    self.failed_reads += 1
+                    self._index += 1
+            if img is None:
+                return None
+        self._index += 1
+
+        if (img.shape[1], img.shape[0]) != tuple(self.size):
+            img = cv2.resize(img, self.size)
+        if self.upright:
+            img = cv2.flip(img, -1)
+        return img
+
+    def start(self):
+        """Starts the replay, playing the footage on a background
+        thread when in real time.
+
+        :return: The stream itself, so it can be started on creation
+        :rtype: class`ReplayStream`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        self._started_at = time.monotonic()
+        if self.realtime:
+            self._thread = threading.Thread(
+                target=self._update, name='replay', daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def _update(self):
+        """Plays the footage at its frame rate, replacing the held
+        frame every time.
+        """
+
+        while self._running:
+            due = self._started_at + self.captured / self.fps
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            img = self._next_image()
+            # Waits until the frame is due, measured from the start so
+            # small delays don't add up.
+
+            with self._cond:
+                if img is None:
+                    self._finished = True
+                    self._cond.notify_all()
+                    break
+                self.captured += 1
+                if (self._frame is not None
+                        and self._frame.seq > self._last_seq):
+                    self.dropped += 1
+                self._frame = Frame(img, time.monotonic(), self.captured)
+                self._cond.notify_all()
+
+    def read(self, timeout: float = 2.0):
+        """Returns the next frame of the footage.
+
+        :param timeout: The maximum amount of seconds to wait for a new
+            frame, defaults to 2.0
+        :type timeout: float, optional
+
+        :raises KeyboardInterrupt: Once the footage has run out
+        :return: The newest frame, or None if none arrived in time
+        :rtype: class`cameraModule.Frame`
+        """
+
+        if self.realtime:
+            with self._cond:
+                if not self._cond.wait_for(
+                        lambda: (self._finished
+                                 or (self._frame is not None
+                                     and self._frame.seq > self._last_seq)),
+                        timeout):
+                    return None
+                if self._frame is None or self._frame.seq == self._last_seq:
+                    raise KeyboardInterrupt('Replay finished.')
+                frame = self._frame
+                if frame.seq - self._last_seq > 1 and self._last_seq != 0:
+                    self.overruns += 1
+                self._last_seq = frame.seq
+        else:
+            img = self._next_image()
+            if img is None:
+                self._finished = True
+                raise KeyboardInterrupt('Replay finished.')
+            self.captured += 1
+            frame = Frame(img, time.monotonic(), self.captured)
+        # Hands out the newest frame in real time, otherwise reads the
+        # next frame straight from the footage.
+
+        self.consumed += 1
+        self.last_read = frame.timestamp
+        if self.first_read is None:
+            self.first_read = frame.timestamp
+        return frame
+
+    def clock(self):
+        """Gets how far into the footage the replay is.
+
+        :return: The footage time in seconds
+        :rtype: float
+        """
+
+        if self.realtime:
+            if self._started_at is None:
+                return 0.0
+            return time.monotonic() - self._started_at
+        return self.captured / self.fps
+
+    def stats(self):
+        """Returns the stream's counters.
+
+        :return: The captured, consumed, dropped, overrun and failed
+            read counts
+        :rtype: dict
+        """
+
+        return {
+            'captured': self.captured,
+            'consumed': self.consumed,
+            'dropped': self.dropped,
+            'overruns': self.overruns,
+            'failed_reads': self.failed_reads
+        }
+
+    def stop(self):
+        """Stops the replay and closes the footage."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.cap is not None:
+            self.cap.release()
+
+
+class FakeGPIO(inputModule.FakeGPIO):
+    """Stands in for `RPi.GPIO`, with input pins following a scripted
+    timeline against the footage's clock. Changes are applied on a
+    background thread as they fall due, calling back watched pins like
+    the real module.
+
+    :param clock: Returns how far into the footage the replay is
+    :type clock: function
+    :param levels: The starting level of each input pin, defaults to
+        the door closed on pin 22 and no motion on pin 18
+    :type levels: dict, optional
+    :param timeline: The footage time, pin and level of every change,
+        defaults to none
+    :type timeline: list, optional
+    """
+
+    def __init__(self, clock, levels: dict = None, timeline: list = ()):
+        """Constructs the class"""
+        super().__init__(levels or {22: 1, 18: 0})
+        self.clock = clock
+        self.timeline = sorted(timeline)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts applying the timeline.
+
+        :return: The fake itself, so it can be started on creation
+        :rtype: class`FakeGPIO`
+        """
+
+        self._thread = threading.Thread(
+            target=self._run, name='fake-gpio', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """Applies every change that's due, every couple of
+        milliseconds, until stopped.
+        """
+
+        while not self._stopped.wait(0.002):
+            now = self.clock()
+            while self.timeline and self.timeline[0][0] <= now:
+                _, pin, level = self.timeline.pop(0)
+                self.set_input(pin, level)
+
+    def changed_to(self, pin: int, level: int):
+        """Gets when a pin last changed to a level.
+
+        :return: The monotonic time, or None if it never has
+        :rtype: float
+        """
+
+        return max((changed_at for changed_at, changed_pin, changed_level
+                    in self.history
+                    if changed_pin == pin and changed_level == level),
+                   default=None)
+
+    def stop(self):
+        """Stops applying the timeline."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+class FakePi:
+    """Stands in for `pigpio.pi`, recording every servo command and
+    how long after the capture of the frame it was aimed from it was
+    sent.
+
+    :param frame_time: Returns the capture time of the frame the loop
+        is currently aiming from, None before there is one
+    :type frame_time: function
+    :param servo_pins: The pins of the aiming servos, defaults to
+        (18, 27)
+    :type servo_pins: tuple, optional
+    """
+
+    connected = True
+
+    def __init__(self, frame_time, servo_pins: tuple = (18, 27)):
+        """Constructs the class"""
+        self.frame_time = frame_time
+        self.servo_pins = servo_pins
+        self.pulsewidths = {}
+        self.commands = 0
+        self.latencies = []
+
+    def set_mode(self, pin, mode):
+        """Does nothing, any pin can be written."""
+
+    def set_PWM_frequency(self, pin, frequency):
+        """Does nothing, there's no PWM to set up."""
+        return frequency
+
+    def set_servo_pulsewidth(self, pin, pulsewidth):
+        """Records a servo command and its latency."""
+        self.pulsewidths[pin] = pulsewidth
+        self.commands += 1
+        frame_time = self.frame_time()
+        if pin in self.servo_pins and frame_time is not None:
+            self.latencies.append(time.monotonic() - frame_time)
+        # Only aiming commands sent after a detection count, not the
+        # homing done at startup.
+
+    def get_servo_pulsewidth(self, pin):
+        """Gets the last pulse width sent to a pin."""
+        return self.pulsewidths.get(pin, 0)
+
+    def stop(self):
+        """Does nothing, there's no connection to close."""
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough smtp to take in emails."""
+
+    def reply(self, line: str):
+        """Sends a reply line."""
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        """Answers commands until the client quits."""
+        self.reply('220 replay smtp sink')
+        for raw in self.rfile:
+            command = raw.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 replay')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                lines = []
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(line[1:] if line.startswith(b'..')
+                                 else line)
+                self.server.caught(b''.join(lines))
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                break
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 ok')
+            else:
+                self.reply('502 not implemented')
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """A local smtp server that keeps every email it's sent alongside
+    when it arrived.
+
+    :param port: The port to listen on, defaults to any free port
+    :type port: int, optional
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        """Constructs the class"""
+        super().__init__(('localhost', port), _SmtpHandler)
+        self.port = self.server_address[1]
+        self.received = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def caught(self, data: bytes):
+        """Keeps an email and the monotonic time it arrived."""
+        with self._lock:
+            self.received.append(
+                (time.monotonic(), email.message_from_bytes(data))
+            )
+
+    def start(self):
+        """Starts serving on a background thread.
+
+        :return: The sink itself, so it can be started on creation
+        :rtype: class`SmtpSink`
+        """
+
+        self._thread = threading.Thread(
+            target=self.serve_forever, name='smtp-sink', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving."""
+        self.shutdown()
+        self.server_close()
+
+
+def percentiles(values: list, points: tuple = (50, 95, 99)):
+    """Works out percentiles of a list of values, by nearest rank.
+
+    :param values: The values
+    :type values: list
+    :param points: The percentiles wanted, defaults to (50, 95, 99)
+    :type points: tuple, optional
+
+    :return: Each percentile and the maximum, all None when there are
+        no values
+    :rtype: dict
+    """
+
+    ordered = sorted(values)
+    summary = {}
+    for point in points:
+        summary[f'p{point}'] = (
+            ordered[max(int(round(point / 100 * len(ordered))) - 1, 0)]
+            if ordered else None
+        )
+    summary['max'] = ordered[-1] if ordered else None
+    return summary
+
+
+def parse_intervals(intervals: list, pin: int, active: int, idle: int):
+    """Turns `start:end` strings, in footage seconds, into timeline
+    changes of a pin.
+
+    :param intervals: The strings, an end may be left off
+    :type intervals: list
+    :param pin: The pin that changes
+    :type pin: int
+    :param active: The pin's level during an interval
+    :type active: int
+    :param idle: The pin's level outside of an interval
+    :type idle: int
+
+    :return: The footage time, pin and level of every change
+    :rtype: list
+    """
+
+    timeline = []
+    for interval in intervals:
+        start, _, end = interval.partition(':')
+        timeline.append((float(start), pin, active))
+        if end:
+            timeline.append((float(end), pin, idle))
+    return timeline
+
+
+def run(source: str, timeline: list = (), fps: float = None,
+        realtime: bool = True, upright: bool = False, show: bool = False,
+        coalesce_window: float = None):
+    """Replays footage through the real control loop in `main.main`.
+
+    :param source: The path of a video file or of a folder of images
+    :type source: str
+    :param timeline: The footage time, pin and level of every sensor
+        change, defaults to none
+    :type timeline: list, optional
+    :param fps: The frame rate of the footage, defaults to the video's
+        own or 15 for a folder
+    :type fps: float, optional
+    :param realtime: If frames are paced at the frame rate, defaults to
+        True
+    :type realtime: bool, optional
+    :param upright: If the footage is already the right way up,
+        defaults to False
+    :type upright: bool, optional
+    :param show: If the camera window is shown, defaults to False
+    :type show: bool, optional
+    :param coalesce_window: Overrides how long alerts wait to be merged,
+        defaults to the config's
+    :type coalesce_window: float, optional
+
+    :return: The report
+    :rtype: dict
+    """
+
+    stream = ReplayStream(source, fps=fps, realtime=realtime,
+                          upright=upright)
+    gpio = FakeGPIO(stream.clock, timeline=timeline).start()
+    aimed = {'frame_time': None, 'person': False, 'person_at': None}
+    pi = FakePi(lambda: aimed['frame_time'])
+
+    rpi = types.ModuleType('RPi')
+    rpi.GPIO = gpio
+    fake_pigpio = types.ModuleType('pigpio')
+    fake_pigpio.OUTPUT = 1
+    fake_pigpio.INPUT = 0
+    fake_pigpio.pi = lambda *args, **kwargs: pi
+    sys.modules.update({'RPi': rpi, 'RPi.GPIO': gpio,
+                        'pigpio': fake_pigpio})
+    # Puts the fakes in place before main is imported, as it imports
+    # the hardware modules at the top.
+
+    import config
+    import main as turret
+    # Only importable once the fakes are in place.
+
+    workspace = tempfile.mkdtemp(prefix='turret-replay-')
+    sink = SmtpSink().start()
+    config.capture_folder = os.path.join(workspace, 'captures')
+    config.log_folder = os.path.join(workspace, 'logs')
+    config.incident_db = os.path.join(workspace, 'incidents.db')
+    config.smtp_domain = 'localhost'
+    config.smtp_port = sink.port
+    config.smtp_ssl = False
+    config.email_passwd = ''
+    config.metrics_port = 0
+    config.headless = not show
+    config.extra_cameras = []
+    if coalesce_window is not None:
+        config.alert_coalesce_window = coalesce_window
+    # Keeps the replay's captures, logs and incidents out of the real
+    # ones, sends the alerts to the local server and leaves the metrics
+    # port free, the stage timings are added to the report instead. The
+    # window is only opened when asked for, and only the footage is
+    # watched.
+
+    class RecordingPool(turret.DetectorPool):
+        """Remembers the frame the loop is aiming from."""
+
+        def latest(self, name: str, max_age: float = None):
+            """Returns a camera's newest detection result, remembering
+            the capture time of the turret camera's frame and when a
+            person first showed.
+            """
+            result = super().latest(name, max_age)
+            if result is not None and name == 'cam0':
+                aimed['frame_time'] = result.timestamp
+                person = 'person' in result.detected
+                if person and not aimed['person']:
+                    aimed['person_at'] = result.timestamp
+                aimed['person'] = person
+            return result
+
+    made = []
+
+    class RecordingMetrics(turret.Metrics):
+        """Remembers the metrics made by the loop."""
+
+        def __init__(self, *args, **kwargs):
+            """Constructs the class"""
+            super().__init__(*args, **kwargs)
+            made.append(self)
+
+    alerts = []
+
+    class RecordingOutbox(turret.AlertOutbox):
+        """Remembers what set off each alert and when."""
+
+        def send(self, subject: str, body: str, images: list = ()):
+            """Queues an alert, remembering when its trigger was
+            first seen.
+            """
+            if 'Door' in subject:
+                triggered_at = gpio.changed_to(22, 0)
+            elif 'Motion' in subject:
+                triggered_at = gpio.changed_to(18, 1)
+            else:
+                triggered_at = aimed['person_at']
+            alerts.append((subject, triggered_at or time.monotonic()))
+            super().send(subject, body, images)
+
+    turret.CameraStream = lambda *args, **kwargs: stream
+    turret.DetectorPool = RecordingPool
+    turret.AlertOutbox = RecordingOutbox
+    turret.Metrics = RecordingMetrics
+    # Swaps the camera for the footage and records what the loop does,
+    # everything else runs as it would on the turret.
+
+    try:
+        turret.main()
+    finally:
+        stream.stop()
+        gpio.stop()
+        sink.stop()
+
+    elapsed = ((stream.last_read - stream.first_read)
+               if stream.consumed > 1 else 0.0)
+    delivered = []
+    pending = list(alerts)
+    for arrived_at, message in sink.received:
+        subject = message['Subject'] or ''
+        merged = 1
+        if subject.endswith('more)'):
+            merged += int(subject.rsplit('(+', 1)[1].split()[0])
+        for alert_subject, triggered_at in pending[:merged]:
+            delivered.append({'subject': alert_subject,
+                              'latency': arrived_at - triggered_at})
+        del pending[:merged]
+    # Emails arrive in the order the alerts were queued, a merged email
+    # carrying as many alerts as its subject says.
+
+    return {
+        'source': source,
+        'realtime': realtime,
+        'frames': stream.consumed,
+        'dropped': stream.dropped,
+        'seconds': elapsed,
+        'fps': (stream.consumed - 1) / elapsed if elapsed else 0.0,
+        'servo_commands': pi.commands,
+        'frame_to_servo': percentiles(pi.latencies),
+        'alerts': delivered,
+        'alert_latency': percentiles(
+            [alert['latency'] for alert in delivered]
+        ),
+        'alerts_lost': len(pending),
+        'stages': made[0].summary() if made else {},
+        'workspace': workspace
+    }
+
+
+def print_report(report: dict):
+    """Prints a report in a readable form.
+
+    :param report: The report made by `run`
+    :type report: dict
+    """
+
+    def millis(value):
+        """Formats seconds as milliseconds."""
+        return '-' if value is None else f'{value * 1000:.1f}ms'
+
+    print(f'Replayed {report["frames"]} frames of {report["source"]} in '
+          f'{report["seconds"]:.1f}s, {report["fps"]:.1f} fps, '
+          f'{report["dropped"]} dropped.')
+    for name in ('frame_to_servo', 'alert_latency'):
+        summary = report[name]
+        print(f'{name:<15}' + '  '.join(
+            f'{point} {millis(value)}' for point, value in summary.items()
+        ))
+    for name, value in report['stages'].items():
+        if isinstance(value, tuple):
+            print(f'  {name:<18}{value[0]:>9.2f}ms avg  x{value[1]}')
+    print(f'{report["servo_commands"]} servo commands, '
+          f'{len(report["alerts"])} alerts delivered, '
+          f'{report["alerts_lost"]} lost.')
+    for alert in report['alerts']:
+        print(f'  {alert["subject"]}: {millis(alert["latency"])}')
+    print(f'Captures and logs kept in {report["workspace"]}.')
+
+
+def main():
+    """Replays footage from the command line and prints the report."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('source',
+                        help='a video file or a folder of images')
+    parser.add_argument('--fps', type=float,
+                        help='the frame rate of the footage')
+    parser.add_argument('--fast', action='store_true',
+                        help='replay every frame as fast as possible')
+    parser.add_argument('--upright', action='store_true',
+                        help='the footage is already the right way up')
+    parser.add_argument('--door', action='append', default=[],
+                        metavar='START:END',
+                        help='seconds into the footage the door is open')
+    parser.add_argument('--pir', action='append', default=[],
+                        metavar='START:END',
+                        help='seconds into the footage motion is sensed')
+    parser.add_argument('--coalesce', type=float,
+                        help='seconds alerts wait to be merged')
+    parser.add_argument('--show', action='store_true',
+                        help='show the camera window')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as json')
+    args = parser.parse_args()
+
+    timeline = (parse_intervals(args.door, 22, 0, 1)
+                + parse_intervals(args.pir, 18, 1, 0))
+    # The door pin drops low when opened, the motion sensor goes high.
+
+    report = run(args.source, timeline, fps=args.fps,
+                 realtime=not args.fast, upright=args.upright,
+                 show=args.show, coalesce_window=args.coalesce)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()
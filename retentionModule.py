@@ -0,0 +1,241 @@
+"""This module's purpose is to keep the capture folder from filling up,
+indexing its files once by age and then deleting the oldest ones in
+the background whenever a limit is passed.
+"""
+
+import os  # For manipulating the operating system.
+import time  # To get the age of files.
+import heapq  # To keep the files ordered by age.
+import queue  # To hold files waiting to be written.
+import threading  # To write and delete files in the background.
+# imports the necessary code.
+
+
+class RetentionManager:
+    """Keeps a folder within a file count, a total size and a maximum
+    file age. The folder is scanned once when constructed, after which
+    an in-memory index ordered by age is kept up to date, so adding a
+    file and deleting the oldest file both take O(log n). Writing and
+    deleting happen on a background thread.
+
+    :param folder: The path to the folder to be kept in check
+    :type folder: str
+    :param extensions: The extensions of the files to be kept in check,
+        done like this to avoid the accidental deletions of misplaced
+        files, defaults to `.jpg`, `.png` and `.webp`
+    :type extensions: tuple, optional
+    :param max_files: The maximum amount of files allowed, 0 for no
+        limit, defaults to 20
+    :type max_files: int, optional
+    :param max_bytes: The maximum total size of the files in bytes, 0
+        for no limit, defaults to 0
+    :type max_bytes: int, optional
+    :param max_age: The maximum age of a file in seconds, 0 for no
+        limit, defaults to 0
+    :type max_age: float, optional
+    :param logger: An optional logger addon to log deletions, defaults
+        to None
+    :type logger: class`logging.logger`, optional
+    :param metrics: Optional metrics to time file writes into, defaults
+        to None
+    :type metrics: class`metricsModule.Metrics`, optional
+    """
+
+    def __init__(self,
+                 folder: str,
+                 extensions: tuple = ('.jpg', '.png', '.webp'),
+                 max_files: int = 20,
+                 max_bytes: int = 0,
+                 max_age: float = 0,
+                 logger=None,
+                 metrics=None):
+        """Constructs the class"""
+        self.folder = folder
+        self.extensions = tuple(i.lower() for i in extensions)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.logger = logger
+        self.metrics = metrics
+
+        self.total_bytes = 0
+        self.evicted = 0
+        # The size of every indexed file, and the amount of files
+        # deleted.
+
+        self._heap = []
+        self._files = {}
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._running = False
+        self._thread = None
+        # The heap holds (modified time, name) ordered oldest first,
+        # and _files maps each name to its (modified time, size). A
+        # heap entry whose time doesn't match _files is stale and is
+        # skipped when popped.
+
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+        self._scan()
+
+    def _scan(self):
+        """Indexes every matching file in the folder."""
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if (entry.is_file()
+                        and entry.name.lower().endswith(self.extensions)):
+                    stat = entry.stat()
+                    self._heap.append(
+                        self._index(entry.name, stat.st_mtime, stat.st_size)
+                    )
+        heapq.heapify(self._heap)
+        if self.logger is not None:
+            self.logger.debug(
+                f' Indexed {len(self._files)} files in {self.folder}, '
+                f'{self.total_bytes} bytes.'
+            )
+
+    def _index(self, name: str, mtime: float, size: int):
+        """Adds or replaces a file in the index, leaving the caller to put
+        the returned entry on the heap.
+
+        :param name: The name of the file
+        :type name: str
+        :param mtime: The modified time of the file
+        :type mtime: float
+        :param size: The size of the file in bytes
+        :type size: int
+
+        :return: The file's heap entry, to be added to the heap
+        :rtype: tuple
+        """
+
+        previous = self._files.get(name)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+        self._files[name] = (mtime, size)
+        self.total_bytes += size
+        return mtime, name
+
+    def __len__(self):
+        """Gets the amount of indexed files."""
+        return len(self._files)
+
+    def start(self):
+        """Starts the background thread, which also removes anything
+        already over the limits.
+
+        :return: The manager itself, so it can be started on creation
+        :rtype: class`RetentionManager`
+        """
+
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='retention', daemon=True
+        )
+        self._thread.start()
+        self._jobs.put(None)
+        return self
+
+    def save(self, name: str, data: bytes):
+        """Queues a file to be written into the folder, returning
+        straight away.
+
+        :param name: The name of the file
+        :type name: str
+        :param data: The contents of the file
+        :type data: bytes
+        """
+
+        self._jobs.put((name, data))
+
+    def _run(self):
+        """Writes queued files and enforces the limits for as long as
+        the manager is running.
+        """
+
+        while True:
+            try:
+                job = self._jobs.get(
+                    timeout=min(self.max_age, 60) if self.max_age else None
+                )
+            except queue.Empty:
+                job = None
+            if job is False:
+                break
+            # Wakes up at least every minute when there is an age
+            # limit, so old files are removed even when nothing new
+            # is saved. False is queued last when stopping.
+
+            if job is not None:
+                name, data = job
+                path = os.path.join(self.folder, name)
+                try:
+                    write_start = time.perf_counter()
+                    with open(path, 'wb') as outfile:
+                        outfile.write(data)
+                    if self.metrics is not None:
+                        self.metrics.observe(
+                            'imwrite', time.perf_counter() - write_start
+                        )
+                    stat = os.stat(path)
+                except OSError:
+                    if self.logger is not None:
+                        self.logger.exception(f' Unable to save {path}.')
+                    continue
+                with self._lock:
+                    heapq.heappush(
+                        self._heap,
+                        self._index(name, stat.st_mtime, stat.st_size)
+                    )
+            # Writes the file and adds it to the index.
+
+            self.enforce()
+
+    def enforce(self):
+        """Deletes the oldest files until the folder is within every
+        limit.
+        """
+
+        now = time.time()
+        while True:
+            with self._lock:
+                if not self._heap:
+                    return
+                mtime, name = self._heap[0]
+                if self._files.get(name, (None,))[0] != mtime:
+                    heapq.heappop(self._heap)
+                    continue
+                # Throws away heap entries of files that have since
+                # been replaced or deleted.
+
+                over = (
+                    (self.max_files and len(self._files) > self.max_files)
+                    or (self.max_bytes
+                        and self.total_bytes > self.max_bytes)
+                    or (self.max_age and now - mtime > self.max_age)
+                )
+                if not over:
+                    return
+                heapq.heappop(self._heap)
+                self.total_bytes -= self._files.pop(name)[1]
+            # Takes the oldest file out of the index if any limit is
+            # passed.
+
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+            self.evicted += 1
+            if self.logger is not None:
+                self.logger.debug(f' Removed old capture {name}.')
+
+    def stop(self):
+        """Finishes writing queued files then stops the thread."""
+        if self._thread is None:
+            return
+        self._running = False
+        self._jobs.put(False)
+        self._thread.join(timeout=5)
@@ -0,0 +1,162 @@
+"""This module's purpose is to decide how often the object detector
+should run, from how long inference and the control loop actually
+take, instead of scanning every fixed amount of frames.
+"""
+
+import time  # To time the loop and the detector.
+# imports the necessary code.
+
+
+class DetectionScheduler:
+    """Picks when the next detector scan should happen. While a target
+    is being tracked scans happen every `latency_budget` seconds, or as
+    fast as inference allows if it's slower than that. When nothing is
+    found the wait between scans grows by `backoff` each time, up to
+    `max_interval`.
+
+    :param latency_budget: The target amount of seconds between two
+        scans while tracking, defaults to 0.2
+    :type latency_budget: float, optional
+    :param max_interval: The longest amount of seconds between two
+        scans when nothing is present, defaults to 2.0
+    :type max_interval: float, optional
+    :param backoff: How much the wait grows after each empty scan,
+        defaults to 1.5
+    :type backoff: float, optional
+    :param smoothing: How much each new timing counts towards the
+        running averages, from 0 to 1, defaults to 0.2
+    :type smoothing: float, optional
+    """
+
+    def __init__(self,
+                 latency_budget: float = 0.2,
+                 max_interval: float = 2.0,
+                 backoff: float = 1.5,
+                 smoothing: float = 0.2):
+        """Constructs the class"""
+        self.latency_budget = latency_budget
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.smoothing = smoothing
+
+        self.loop_time = None
+        self.inference_time = None
+        self.interval = latency_budget
+        self.tracking = False
+        # The running averages of the loop and inference times in
+        # seconds, and the current wait between scans.
+
+        self._last_tick = None
+        self._last_scan = 0.0
+
+    def _average(self, average: float, value: float):
+        """Blends a new timing into a running average.
+
+        :param average: The current average, None if there is none
+        :type average: float
+        :param value: The new timing
+        :type value: float
+
+        :return: The new average
+        :rtype: float
+        """
+
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def tick(self, now: float = None):
+        """Marks the start of a loop iteration, timing the loop.
+
+        :param now: The current `time.monotonic` time, defaults to now
+        :type now: float, optional
+        """
+
+        now = time.monotonic() if now is None else now
+        if self._last_tick is not None:
+            self.loop_time = self._average(self.loop_time,
+                                           now - self._last_tick)
+        self._last_tick = now
+
+    def due(self, tracking: bool, now: float = None):
+        """Checks if a scan should happen, call `scheduled` if one is
+        then started.
+
+        :param tracking: If a target is currently being tracked
+        :type tracking: bool
+        :param now: The current `time.monotonic` time, defaults to now
+        :type now: float, optional
+
+        :return: True if a scan is due
+        :rtype: bool
+        """
+
+        if tracking and not self.tracking:
+            self.interval = self._tracking_interval()
+        self.tracking = tracking
+        # Snaps straight back to the fastest cadence when a target
+        # appears.
+
+        now = time.monotonic() if now is None else now
+        return now - self._last_scan >= self.interval
+
+    def scheduled(self, now: float = None):
+        """Marks that a scan has been started.
+
+        :param now: The current `time.monotonic` time, defaults to now
+        :type now: float, optional
+        """
+
+        self._last_scan = time.monotonic() if now is None else now
+
+    def record_result(self, found: bool, latency: float):
+        """Takes in the outcome of a finished scan, adjusting the wait
+        between scans.
+
+        :param found: If a target was found
+        :type found: bool
+        :param latency: How long the scan took in seconds
+        :type latency: float
+        """
+
+        self.inference_time = self._average(self.inference_time, latency)
+        if found:
+            self.interval = self._tracking_interval()
+        else:
+            self.interval = min(self.interval * self.backoff,
+                                self.max_interval)
+        # Scans as often as allowed while something is found, backing
+        # off after every empty scan.
+
+    def _tracking_interval(self):
+        """Gets the wait between scans while tracking, which can't be
+        shorter than inference takes.
+
+        :return: The wait in seconds
+        :rtype: float
+        """
+
+        return max(self.latency_budget, self.inference_time or 0.0)
+
+    @property
+    def cadence(self):
+        """The current amount of loop iterations between two scans."""
+        if not self.loop_time:
+            return 1.0
+        return max(self.interval / self.loop_time, 1.0)
+
+    def stats(self):
+        """Returns the scheduler's timings.
+
+        :return: The scan interval, the cadence in frames and the
+            average loop and inference times, all in seconds
+        :rtype: dict
+        """
+
+        return {
+            'interval': self.interval,
+            'cadence': self.cadence,
+            'loop_time': self.loop_time,
+            'inference_time': self.inference_time,
+            'tracking': self.tracking
+        }
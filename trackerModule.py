@@ -0,0 +1,337 @@
+"""This module's purpose is to follow detected objects between detector
+scans, giving each one a stable id, a velocity and a predicted
+position for any moment in time.
+"""
+
+import itertools  # For handing out track ids.
+import numpy as np  # For comparing a box against many at once.
+# imports the necessary code.
+
+
+def box_iou(box: tuple, boxes):
+    """Works out how much a box overlaps each of many boxes, as the
+    intersection over union of their areas.
+
+    :param box: The x, y, width and height of the box
+    :type box: tuple
+    :param boxes: The x, y, width and height of each box, one row each
+    :type boxes: class`numpy.ndarray`
+
+    :return: The overlap with each box from 0, not touching, to 1, the
+        same box
+    :rtype: class`numpy.ndarray`
+    """
+
+    x, y, w, h = box
+    overlap_w = np.clip(
+        np.minimum(x + w, boxes[:, 0] + boxes[:, 2])
+        - np.maximum(x, boxes[:, 0]), 0, None
+    )
+    overlap_h = np.clip(
+        np.minimum(y + h, boxes[:, 1] + boxes[:, 3])
+        - np.maximum(y, boxes[:, 1]), 0, None
+    )
+    overlap = overlap_w * overlap_h
+    union = w * h + boxes[:, 2] * boxes[:, 3] - overlap
+    return np.divide(overlap, union, out=np.zeros(len(boxes)),
+                     where=union > 0)
+
+
+class Track:
+    """A single object being followed, its centre moved along with a
+    constant velocity between measurements by an alpha-beta filter.
+
+    :param track_id: The id of the track
+    :type track_id: int
+    :param category: The category name of the object
+    :type category: str
+    :param score: The detection score of the object
+    :type score: float
+    :param box: The x, y, width and height of the object
+    :type box: tuple
+    :param timestamp: The capture time of the frame it was found in
+    :type timestamp: float
+    """
+
+    __slots__ = ('track_id', 'category', 'score', 'centre_x', 'centre_y',
+                 'width', 'height', 'velocity_x', 'velocity_y',
+                 'updated_at', 'created_at', 'hits', 'misses', 'moved')
+
+    def __init__(self, track_id: int, category: str, score: float,
+                 box: tuple, timestamp: float):
+        """Constructs the class"""
+        origin_x, origin_y, width, height = box
+        self.track_id = track_id
+        self.category = category
+        self.score = score
+        self.centre_x = origin_x + width / 2
+        self.centre_y = origin_y + height / 2
+        self.width = width
+        self.height = height
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+        self.updated_at = timestamp
+        self.created_at = timestamp
+        self.hits = 1
+        self.misses = 0
+        self.moved = False
+        # The centre is kept as a float so small movements add up,
+        # the velocity is in pixels per second. moved is set when the
+        # camera has turned since the last measurement.
+
+    def box(self, timestamp: float = None):
+        """Gets the track's box, predicted forward to a moment in time.
+
+        :param timestamp: The time to predict to, defaults to the last
+            measurement
+        :type timestamp: float, optional
+
+        :return: The x, y, width and height of the box
+        :rtype: tuple
+        """
+
+        centre_x, centre_y = self.predict(timestamp)
+        return (centre_x - self.width / 2, centre_y - self.height / 2,
+                self.width, self.height)
+
+    def predict(self, timestamp: float = None):
+        """Gets the track's centre, predicted forward to a moment in
+        time.
+
+        :param timestamp: The time to predict to, defaults to the last
+            measurement
+        :type timestamp: float, optional
+
+        :return: The x and y of the centre
+        :rtype: tuple
+        """
+
+        if timestamp is None:
+            return self.centre_x, self.centre_y
+        dt = timestamp - self.updated_at
+        return (self.centre_x + self.velocity_x * dt,
+                self.centre_y + self.velocity_y * dt)
+
+    def correct(self, score: float, box: tuple, timestamp: float,
+                alpha: float, beta: float):
+        """Blends a new measurement into the track.
+
+        :param score: The detection score of the matched object
+        :type score: float
+        :param box: The x, y, width and height of the matched object
+        :type box: tuple
+        :param timestamp: The capture time of the frame it was found in
+        :type timestamp: float
+        :param alpha: How much the measured position is trusted
+        :type alpha: float
+        :param beta: How much the measured change in velocity is
+            trusted
+        :type beta: float
+        """
+
+        origin_x, origin_y, width, height = box
+        dt = timestamp - self.updated_at
+        predicted_x, predicted_y = self.predict(timestamp)
+        residual_x = origin_x + width / 2 - predicted_x
+        residual_y = origin_y + height / 2 - predicted_y
+        # How far the measurement is from where the track expected.
+
+        if self.moved:
+            self.centre_x = predicted_x + residual_x
+            self.centre_y = predicted_y + residual_y
+            self.moved = False
+        else:
+            self.centre_x = predicted_x + alpha * residual_x
+            self.centre_y = predicted_y + alpha * residual_y
+            if dt > 0:
+                self.velocity_x += beta * residual_x / dt
+                self.velocity_y += beta * residual_y / dt
+        # Moves the centre part way to the measurement and nudges the
+        # velocity by the error. After the camera has turned the error
+        # is mostly the view shifting, so the track takes the new
+        # position as it is and learns nothing from it.
+
+        self.width = width
+        self.height = height
+        self.score = score
+        self.updated_at = timestamp
+        self.hits += 1
+        self.misses = 0
+
+
+class ObjectTracker:
+    """Matches each scan's objects to the tracks of the previous scans
+    by box overlap, so every object keeps the same id and a velocity,
+    and positions can be predicted on frames that weren't scanned.
+
+    :param min_iou: The least overlap between a predicted track box and
+        a detection for them to match, defaults to 0.2
+    :type min_iou: float, optional
+    :param max_misses: The amount of scans in a row a track can go
+        unmatched before it's dropped, defaults to 2
+    :type max_misses: int, optional
+    :param max_age: The amount of seconds a track can go without a
+        match before it's dropped, defaults to 2.0
+    :type max_age: float, optional
+    :param alpha: How much each measured position is trusted, from 0
+        to 1, defaults to 0.85
+    :type alpha: float, optional
+    :param beta: How much each measured change in velocity is trusted,
+        from 0 to 1, defaults to 0.3
+    :type beta: float, optional
+    """
+
+    def __init__(self,
+                 min_iou: float = 0.2,
+                 max_misses: int = 2,
+                 max_age: float = 2.0,
+                 alpha: float = 0.85,
+                 beta: float = 0.3):
+        """Constructs the class"""
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.max_age = max_age
+        self.alpha = alpha
+        self.beta = beta
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, detected, timestamp: float):
+        """Matches a scan's objects to the tracks, starting tracks for
+        new objects and dropping tracks that have been lost.
+
+        :param detected: The objects found by the scan
+        :type detected: class`objectDetectionModule.DetectionSet`
+        :param timestamp: The capture time of the scanned frame
+        :type timestamp: float
+
+        :return: The current tracks
+        :rtype: list
+        """
+
+        pairs = []
+        if len(detected):
+            for track_index, track in enumerate(self.tracks):
+                ious = box_iou(track.box(timestamp), detected.boxes)
+                ious[detected.labels != track.category] = 0
+                for obj_index in np.flatnonzero(ious >= self.min_iou):
+                    pairs.append((ious[obj_index], track_index,
+                                  int(obj_index)))
+        pairs.sort(reverse=True)
+        # Scores every track against every object of the same
+        # category, comparing against where the track should be now.
+
+        matched_tracks = set()
+        matched_objects = set()
+        for _, track_index, obj_index in pairs:
+            if track_index in matched_tracks or obj_index in matched_objects:
+                continue
+            self.tracks[track_index].correct(
+                float(detected.scores[obj_index]),
+                tuple(detected.boxes[obj_index].tolist()),
+                timestamp, self.alpha, self.beta
+            )
+            matched_tracks.add(track_index)
+            matched_objects.add(obj_index)
+        # Greedily matches the best overlapping pairs first.
+
+        kept = []
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in matched_tracks:
+                track.misses += 1
+                if (track.misses > self.max_misses
+                        or timestamp - track.updated_at > self.max_age):
+                    continue
+            kept.append(track)
+        for obj_index in range(len(detected)):
+            if obj_index not in matched_objects:
+                kept.append(Track(
+                    next(self._ids), str(detected.labels[obj_index]),
+                    float(detected.scores[obj_index]),
+                    tuple(detected.boxes[obj_index].tolist()), timestamp
+                ))
+        self.tracks = kept
+        # Drops lost tracks and starts a track for every new object.
+
+        return self.tracks
+
+    def primary(self, category: str = 'person'):
+        """Picks the track that should be followed, the one that has
+        been matched the most so the choice stays stable.
+
+        :param category: The category of the track, defaults to
+            `person`
+        :type category: str, optional
+
+        :return: The track, or None if there are none
+        :rtype: class`Track`
+        """
+
+        best = None
+        for track in self.tracks:
+            if track.category != category or track.misses:
+                continue
+            if best is None or (track.hits, -track.created_at) > (
+                    best.hits, -best.created_at):
+                best = track
+        return best
+
+    def view_moved(self):
+        """Tells the tracks the camera has turned, so old positions no
+        longer line up with the frame. Their velocities are forgotten
+        and each takes its next measured position as it is, instead of
+        mistaking the view shifting for the object moving.
+        """
+
+        for track in self.tracks:
+            track.velocity_x = 0.0
+            track.velocity_y = 0.0
+            track.moved = True
+
+
+def main():
+    """Starts some module tests, following a person standing still
+    while the turret turns twice, each turn shifting them 30 pixels
+    across the frame, with and without the tracker being told.
+    """
+
+    from types import SimpleNamespace
+    # Stands in for the detector's detections.
+
+    class Scan(SimpleNamespace):
+        """A scan with a length, as the detector's has."""
+
+        def __len__(self):
+            """Gets the amount of detections."""
+            return len(self.boxes)
+
+    def person(x: float):
+        """A scan finding a person at x."""
+        return Scan(boxes=np.array([[x, 100, 60, 180]]),
+                    labels=np.array(['person']), scores=np.array([0.9]))
+
+    for told in (False, True):
+        tracker = ObjectTracker()
+        timestamp = 0.0
+        for x, turned in ((300, False), (300, False), (270, True),
+                          (240, True), (240, False)):
+            if turned and told:
+                tracker.view_moved()
+            tracker.update(person(x), timestamp)
+            timestamp += 0.2
+        # The person never moves, only the view does.
+
+        track = tracker.primary()
+        predicted_x, _ = track.predict(timestamp + 1)
+        print(f'{"Told of turns" if told else "Not told":<14}'
+              f'track {track.track_id}, velocity '
+              f'{track.velocity_x:+6.1f} px/s, seen at x '
+              f'{track.centre_x:.0f}, predicted 1s on at x '
+              f'{predicted_x:.0f}')
+
+
+if __name__ == '__main__':
+    # Used to test the module and makes sure the test won't be performed when
+    # importing this module.
+    main()